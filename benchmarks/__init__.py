@@ -0,0 +1,21 @@
+# benchmarks/__init__.py
+
+"""
+Офлайн-бенчмарки бота: хендлеры, функции БД и сборка отчёта.
+
+Работают без сети и без Telegram/Google: синтетические БД с историей
+поездок (benchmarks/dataset.py), фейковые листы gspread со счётчиком
+вызовов и фейковые Update (benchmarks/fakes.py). Для каждого случая
+(benchmarks/cases.py) меряется время, пиковая память (tracemalloc) и
+число обращений к Google Sheets, результат сравнивается с baseline.json.
+
+    python -m benchmarks                    # 1k и 100k поездок
+    python -m benchmarks --sizes 1k,100k,1m
+    python -m benchmarks --save-baseline    # принять текущие цифры за эталон
+
+Нагрузочный стенд (benchmarks/load.py) гоняет настоящего бота против
+локального фейка Bot API (benchmarks/botapi.py) и меряет задержку
+ответов при сотнях одновременных сотрудников:
+
+    python -m benchmarks.load --users 50,100,200 --sheets-latency 300
+"""
@@ -0,0 +1,215 @@
+# benchmarks/__main__.py
+#
+#   python -m benchmarks [--sizes 1k,100k] [--cases end_trip,generate_report]
+#                        [--repeat 3] [--warmup 1] [--baseline benchmarks/baseline.json]
+#                        [--save-baseline] [--time-tolerance 1.0] [--mem-tolerance 0.25]
+#
+# Для каждого размера БД и случая печатает время (лучшее из --repeat,
+# после --warmup незамеряемых прогонов: ленивые импорты вроде pandas и
+# холодные кэши в счёт не идут), пиковую память (отдельный прогон под
+# tracemalloc) и число обращений к Google Sheets (сам случай + доставка
+# outbox).
+#
+# Время зависит от машины, поэтому в начале прогона замеряется
+# калибровочная нагрузка (calibrate: Python + SQLite в памяти), и время
+# случая сравнивается с эталоном с поправкой на отношение калибровок.
+# Код выхода 1, если обращений к Sheets стало больше, память выросла
+# больше --mem-tolerance или время с поправкой — больше --time-tolerance.
+# Эталон без calibration_ms (записан до калибровки) время не проверяет.
+
+import argparse
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+import tracemalloc
+
+# рабочее время не должно зависеть от момента запуска
+os.environ.setdefault("DEBUG_MODE", "1")
+
+from benchmarks import cases as bench_cases
+from benchmarks.dataset import SIZES, remove_db, working_copy
+from benchmarks.fakes import FakeBot, install_sheets, spreadsheet_for
+from core import outbox
+from core.report import clear_report_cache
+from utils import db
+from utils.employees import directory
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), "baseline.json")
+
+
+def use_database(path: str):
+    """Переключает соединения бота (все потоки) и справочник на файл path."""
+    db.DB_PATH = path
+    directory.close()
+    directory.load()
+    clear_report_cache()
+
+
+def drain_outbox():
+    while outbox.drain_once():
+        pass
+
+
+_runs = 0
+
+
+def run_once(case, size: str, workdir: str, trace: bool) -> dict:
+    global _runs
+    _runs += 1
+    # новое имя на каждый прогон: соединения потоков бота переоткрываются
+    # при смене DB_PATH, а не продолжают писать в прежний файл
+    path = working_copy(size, os.path.join(workdir, f"bench_{size}_{_runs}.db"))
+    use_database(path)
+    book = spreadsheet_for(db.get_connection())
+    install_sheets(book)
+    env = bench_cases.Env(bot=FakeBot(), book=book)
+
+    if trace:
+        tracemalloc.start()
+    start = time.perf_counter()
+    ops = asyncio.run(case(env))
+    wall = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1] if trace else 0
+    if trace:
+        tracemalloc.stop()
+
+    start = time.perf_counter()
+    drain_outbox()
+    drain = time.perf_counter() - start
+    remove_db(path)
+    return {
+        "ops": ops,
+        "wall_ms": wall * 1000,
+        "drain_ms": drain * 1000,
+        "peak_mib": peak / 2**20,
+        "sheets_calls": book.total_calls(),
+    }
+
+
+def calibrate(rounds: int = 5) -> float:
+    """
+    Калибровочная нагрузка этой машины, мс (лучшее из rounds): тот же род
+    работы, что у случаев, — цикл Python, JSON, хэши и SQLite в памяти.
+    """
+    best = float("inf")
+    for _ in range(rounds):
+        start = time.perf_counter()
+        conn = sqlite3.connect(":memory:")
+        conn.execute("CREATE TABLE t (id INTEGER PRIMARY KEY, v TEXT)")
+        conn.executemany("INSERT INTO t (v) VALUES (?)", (
+            (json.dumps({"i": i, "s": str(i) * 3}),) for i in range(20_000)
+        ))
+        conn.execute("SELECT COUNT(*), SUM(LENGTH(v)) FROM t WHERE v LIKE '%7%'").fetchone()
+        sorted(hashlib.sha1(str(i).encode()).hexdigest() for i in range(20_000))
+        conn.close()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def measure(case, size: str, workdir: str, repeat: int, warmup: int) -> dict:
+    for _ in range(warmup):
+        run_once(case, size, workdir, trace=False)
+    runs = [run_once(case, size, workdir, trace=False) for _ in range(repeat)]
+    best = min(runs, key=lambda r: r["wall_ms"])
+    traced = run_once(case, size, workdir, trace=True)
+    return {
+        "ops": best["ops"],
+        "wall_ms": round(best["wall_ms"], 2),
+        "per_op_ms": round(best["wall_ms"] / max(best["ops"], 1), 3),
+        "drain_ms": round(best["drain_ms"], 2),
+        "peak_mib": round(traced["peak_mib"], 2),
+        "sheets_calls": best["sheets_calls"],
+    }
+
+
+def check(result: dict, base: dict | None, speed: float | None,
+          time_tol: float, mem_tol: float) -> list[str]:
+    """speed — калибровка этого прогона / калибровка эталона; None — время не проверяем."""
+    if not base:
+        return []
+    problems = []
+    if speed is not None:
+        # эталонное время, пересчитанное на скорость этой машины
+        expected = base["wall_ms"] * speed
+        if result["wall_ms"] > expected * (1 + time_tol):
+            problems.append(f"время {result['wall_ms']:.1f} мс > {expected:.1f} мс "
+                            f"(эталон {base['wall_ms']:.1f} мс × {speed:.2f}) +{time_tol:.0%}")
+    if result["peak_mib"] > base["peak_mib"] * (1 + mem_tol) + 1:
+        problems.append(f"память {result['peak_mib']:.1f} MiB > {base['peak_mib']:.1f} MiB +{mem_tol:.0%}")
+    if result["sheets_calls"] > base["sheets_calls"]:
+        problems.append(f"обращений к Sheets {result['sheets_calls']} > {base['sheets_calls']}")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m benchmarks")
+    parser.add_argument("--sizes", default="1k,100k", help=f"из {', '.join(SIZES)}")
+    parser.add_argument("--cases", default=",".join(bench_cases.CASES))
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--warmup", type=int, default=1,
+                        help="незамеряемых прогонов перед замером")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true",
+                        help="записать результаты как новый эталон")
+    parser.add_argument("--time-tolerance", type=float, default=1.0)
+    parser.add_argument("--mem-tolerance", type=float, default=0.25)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    calibration = round(calibrate(), 2)
+    speed = None
+    if baseline.get("calibration_ms"):
+        speed = calibration / baseline["calibration_ms"]
+        print(f"калибровка: {calibration:.1f} мс (эталон {baseline['calibration_ms']:.1f} мс, "
+              f"×{speed:.2f})")
+    else:
+        print(f"калибровка: {calibration:.1f} мс; в эталоне её нет — время не проверяется "
+              f"(перезапишите эталон с --save-baseline)")
+
+    results, failures = {}, []
+    with tempfile.TemporaryDirectory() as workdir:
+        for size in args.sizes.split(","):
+            print(f"== {size} поездок")
+            print(f"{'случай':<22}{'опер.':>6}{'всего, мс':>12}{'на опер., мс':>14}"
+                  f"{'outbox, мс':>12}{'пик, MiB':>10}{'Sheets':>8}")
+            for name in args.cases.split(","):
+                result = measure(bench_cases.CASES[name], size, workdir,
+                                 args.repeat, args.warmup)
+                results.setdefault(size, {})[name] = result
+                problems = check(result, baseline.get(size, {}).get(name), speed,
+                                 args.time_tolerance, args.mem_tolerance)
+                print(f"{name:<22}{result['ops']:>6}{result['wall_ms']:>12.1f}"
+                      f"{result['per_op_ms']:>14.3f}{result['drain_ms']:>12.1f}"
+                      f"{result['peak_mib']:>10.1f}{result['sheets_calls']:>8}"
+                      + ("  ✗ " + "; ".join(problems) if problems else ""))
+                failures += [f"{size}/{name}: {p}" for p in problems]
+        db.close_connection()
+        directory.close()
+
+    if args.save_baseline:
+        baseline["calibration_ms"] = calibration
+        for size, by_case in results.items():
+            baseline.setdefault(size, {}).update(by_case)
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(baseline, f, ensure_ascii=False, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"Эталон записан: {args.baseline}")
+
+    if failures:
+        print("\nРегрессии:\n  " + "\n  ".join(failures))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,209 @@
+# benchmarks/botapi.py
+
+"""
+Локальный фейк Telegram Bot API для нагрузочного стенда (benchmarks/load.py).
+
+Бот ходит к нему через TELEGRAM_BASE_URL (base_url в PTB), как к
+api.telegram.org: getMe, getUpdates (long polling), sendMessage,
+editMessageText, answerCallbackQuery и т.п. Сервер — webserver.WebServer,
+но в своём потоке и своём event loop: выдача обновлений и отметки
+времени не ждут, пока освободится loop бота.
+
+Обновления выдаются через issue_message/issue_callback. Они встают в
+очередь getUpdates, а возвращённый future завершается первым ответом
+бота в этот чат (sendMessage или editMessageText): Reply со временем от
+выдачи обновления до ответа. Файлы (multipart) не поддерживаются.
+"""
+
+import asyncio
+import concurrent.futures
+import itertools
+import json
+import threading
+import time
+from collections import Counter, deque
+from dataclasses import dataclass
+from urllib.parse import parse_qsl
+
+from webserver import WebServer
+
+BOT_USER = {"id": 100_000, "is_bot": True, "first_name": "Load", "username": "load_test_bot"}
+
+# методы, на которые достаточно ответить true
+TRUE_METHODS = (
+    "deleteWebhook", "setWebhook", "answerCallbackQuery", "sendChatAction",
+    "setMyCommands", "deleteMessage", "close", "logOut",
+)
+
+
+@dataclass
+class Reply:
+    method: str
+    text: str
+    message_id: int
+    latency: float      # сек. от выдачи обновления до ответа бота
+
+
+def _user(user_id: int) -> dict:
+    return {"id": user_id, "is_bot": False, "first_name": f"U{user_id}"}
+
+
+def _chat(chat_id: int) -> dict:
+    return {"id": chat_id, "type": "private"}
+
+
+def _params(headers: dict, body: bytes) -> dict:
+    """Параметры метода: PTB шлёт форму, но JSON тоже принимаем."""
+    if not body:
+        return {}
+    if headers.get("content-type", "").startswith("application/json"):
+        return json.loads(body)
+    return dict(parse_qsl(body.decode("utf-8")))
+
+
+class FakeBotAPI:
+    def __init__(self, token: str, host: str, port: int, api_latency: float = 0.0):
+        self.token = token
+        self.host = host
+        self.port = port
+        self.api_latency = api_latency      # сек. на каждый запрос, как сеть до Telegram
+        self.calls: Counter[str] = Counter()
+        self._server = WebServer(host, port)
+        methods = {
+            "getMe":           self._get_me,
+            "getUpdates":      self._get_updates,
+            "sendMessage":     self._send_message,
+            "editMessageText": self._edit_message_text,
+        }
+        methods.update({name: self._true for name in TRUE_METHODS})
+        for name, func in methods.items():
+            self._server.route(f"/bot{token}/{name}", self._endpoint(name, func),
+                               methods=("GET", "POST"))
+        self._updates: deque[dict] = deque()
+        self._waiting: dict[int, tuple[float, asyncio.Future]] = {}
+        self._update_ids = itertools.count(1)
+        self._message_ids = itertools.count(1)
+        self._query_ids = itertools.count(1)
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._thread: threading.Thread | None = None
+        self._ready = threading.Event()
+        self._arrived: asyncio.Event | None = None
+        self._stop: asyncio.Event | None = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    # --- поток сервера -------------------------------------------------------
+
+    def start(self):
+        self._thread = threading.Thread(
+            target=asyncio.run, args=(self._main(),), daemon=True, name="FakeBotAPI"
+        )
+        self._thread.start()
+        if not self._ready.wait(10):
+            raise RuntimeError("фейковый Bot API не запустился")
+
+    async def _main(self):
+        self._loop = asyncio.get_running_loop()
+        self._arrived = asyncio.Event()
+        self._stop = asyncio.Event()
+        await self._server.start()
+        self._ready.set()
+        await self._stop.wait()
+        self._arrived.set()             # отпускаем висящий long polling
+        await self._server.stop()
+
+    def stop(self):
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._stop.set)
+            self._thread.join()
+
+    def submit(self, coro) -> concurrent.futures.Future:
+        """Запускает корутину (генератор нагрузки) в loop сервера."""
+        return asyncio.run_coroutine_threadsafe(coro, self._loop)
+
+    # --- выдача обновлений (только из loop сервера) ---------------------------
+
+    def reset(self):
+        self._updates.clear()
+        self._waiting.clear()
+        self.calls.clear()
+
+    def issue_message(self, user_id: int, text: str) -> asyncio.Future:
+        return self._issue(user_id, {"message": {
+            "message_id": next(self._message_ids), "date": int(time.time()), "text": text,
+            "chat": _chat(user_id), "from": _user(user_id),
+        }})
+
+    def issue_callback(self, user_id: int, message_id: int, data: str) -> asyncio.Future:
+        """Нажатие inline-кнопки под сообщением бота message_id."""
+        return self._issue(user_id, {"callback_query": {
+            "id": str(next(self._query_ids)), "chat_instance": str(user_id),
+            "data": data, "from": _user(user_id),
+            "message": {
+                "message_id": message_id, "date": int(time.time()), "text": "…",
+                "chat": _chat(user_id), "from": BOT_USER,
+            },
+        }})
+
+    def forget(self, chat_id: int):
+        """Больше не ждём ответа в чат (таймаут)."""
+        self._waiting.pop(chat_id, None)
+
+    def _issue(self, chat_id: int, payload: dict) -> asyncio.Future:
+        if chat_id in self._waiting:
+            raise RuntimeError(f"чат {chat_id}: предыдущее обновление ещё без ответа")
+        future = self._loop.create_future()
+        self._waiting[chat_id] = (time.perf_counter(), future)
+        self._updates.append({"update_id": next(self._update_ids), **payload})
+        self._arrived.set()
+        return future
+
+    # --- методы Bot API ------------------------------------------------------
+
+    def _endpoint(self, name: str, func):
+        async def handle(method: str, headers: dict, body: bytes):
+            self.calls[name] += 1
+            if self.api_latency:
+                await asyncio.sleep(self.api_latency)
+            result = await func(_params(headers, body))
+            return 200, json.dumps({"ok": True, "result": result}), "application/json"
+        return handle
+
+    async def _true(self, params: dict):
+        return True
+
+    async def _get_me(self, params: dict):
+        return BOT_USER
+
+    async def _get_updates(self, params: dict):
+        offset = int(params.get("offset") or 0)
+        while self._updates and self._updates[0]["update_id"] < offset:
+            self._updates.popleft()
+        timeout = float(params.get("timeout") or 0)
+        if not self._updates and timeout and not self._stop.is_set():
+            self._arrived.clear()
+            try:
+                await asyncio.wait_for(self._arrived.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        limit = int(params.get("limit") or 100)
+        return list(itertools.islice(self._updates, limit))
+
+    async def _send_message(self, params: dict):
+        return self._reply("sendMessage", params, next(self._message_ids))
+
+    async def _edit_message_text(self, params: dict):
+        return self._reply("editMessageText", params, int(params["message_id"]))
+
+    def _reply(self, method: str, params: dict, message_id: int) -> dict:
+        chat_id = int(params["chat_id"])
+        text = params.get("text", "")
+        issued, future = self._waiting.pop(chat_id, (None, None))
+        if future is not None and not future.done():
+            future.set_result(Reply(method, text, message_id, time.perf_counter() - issued))
+        return {
+            "message_id": message_id, "date": int(time.time()), "text": text,
+            "chat": _chat(chat_id), "from": BOT_USER,
+        }
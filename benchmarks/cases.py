@@ -0,0 +1,100 @@
+# benchmarks/cases.py
+
+"""
+Случаи бенчмарка. Каждый — корутина run(env) -> число операций: она
+выполняет замеряемую работу на свежей копии БД. Доставка накопленного
+outbox в (фейковый) Google Sheets делается раннером отдельно и входит
+в счёт обращений к Sheets, но не во время случая.
+
+Пользователи берутся из синтетической БД (benchmarks/dataset.py):
+у каждого OPEN_EVERY-го есть открытая поездка, у остальных — нет.
+"""
+
+import random
+from dataclasses import dataclass
+from datetime import date, timedelta
+
+from core import outbox
+from core.report import ADMIN_IDS, clear_report_cache, generate_report
+from core.trip import end_trip
+from utils.database import close_expired_trips, end_trip_local, save_plan, save_trip_start
+from utils.db import get_connection
+
+from benchmarks.fakes import FakeBot, FakeContext, FakeSpreadsheet, callback_update, message_update
+
+PLANS_PER_RUN = 50
+
+
+@dataclass
+class Env:
+    bot: FakeBot
+    book: FakeSpreadsheet
+
+    def users(self, with_open_trip: bool) -> list[int]:
+        """Сотрудники с открытой поездкой (или без неё) в текущей БД."""
+        op = "IN" if with_open_trip else "NOT IN"
+        return [r[0] for r in get_connection().execute(
+            f"SELECT user_id FROM employees WHERE user_id {op} "
+            "(SELECT user_id FROM trips WHERE status = 'in_progress') ORDER BY user_id"
+        )]
+
+
+async def bench_save_trip_start(env: Env) -> int:
+    users = env.users(with_open_trip=False)
+    for uid in users:
+        save_trip_start(uid, "org0", "Мосгорсуд")
+    return len(users)
+
+
+async def bench_end_trip_local(env: Env) -> int:
+    users = env.users(with_open_trip=True)
+    for uid in users:
+        end_trip_local(uid)
+    return len(users)
+
+
+async def bench_close_expired_trips(env: Env) -> int:
+    count = len(env.users(with_open_trip=True))
+    await close_expired_trips()
+    return count
+
+
+async def bench_end_trip_handler(env: Env) -> int:
+    users = env.users(with_open_trip=True)
+    for i, uid in enumerate(users, start=1):
+        await end_trip(callback_update(env.bot, uid, "end_trip", i), FakeContext(env.bot))
+    return len(users)
+
+
+async def bench_generate_report(env: Env) -> int:
+    # холодная сборка за весь период: кэш готовых отчётов сбрасываем
+    clear_report_cache()
+    admin = ADMIN_IDS[0]
+    await generate_report(message_update(env.bot, admin, "/report"), FakeContext(env.bot))
+    return 1
+
+
+async def bench_add_plan(env: Env) -> int:
+    """
+    План в календарь: save_plan + доставка из outbox сразу после него,
+    как это делает воркер (прежний core.sheets.add_plan писал в лист
+    синхронно — теперь это core.plans.project_plans).
+    """
+    rng = random.Random(1)
+    users = env.users(with_open_trip=False)
+    first = date(2024, 1, 1)
+    for i in range(PLANS_PER_RUN):
+        day = first + timedelta(days=rng.randrange(365))
+        save_plan(users[i % len(users)], "Мосгорсуд", day, "10:00")
+        outbox.drain_once()
+    return PLANS_PER_RUN
+
+
+CASES = {
+    "save_trip_start":     bench_save_trip_start,
+    "end_trip_local":      bench_end_trip_local,
+    "close_expired_trips": bench_close_expired_trips,
+    "end_trip":            bench_end_trip_handler,
+    "generate_report":     bench_generate_report,
+    "add_plan":            bench_add_plan,
+}
@@ -0,0 +1,119 @@
+# benchmarks/dataset.py
+
+"""
+Синтетические court_tracking.db для бенчмарков.
+
+Схема — настоящая (utils.migrations.migrate), данные — детерминированные
+(фиксированный seed): USERS сотрудников, n поездок за HISTORY_DAYS дней,
+открытая поездка у каждого OPEN_EVERY-го сотрудника, планы в календаре.
+Готовые файлы кэшируются в каталоге BENCH_CACHE (по умолчанию — во
+временной папке) и пересобираются, только если поменялась схема.
+"""
+
+import os
+import random
+import shutil
+import tempfile
+from datetime import datetime, timedelta
+
+from utils.db import connect
+from utils.migrations import MIGRATIONS, migrate
+
+USERS        = 300
+OPEN_EVERY   = 3        # открытая поездка у каждого третьего сотрудника
+HISTORY_DAYS = 5 * 365
+PLANS_RATIO  = 20       # один план на столько поездок
+MAX_PLANS    = 20_000
+SEED         = 20240701
+OPEN_SINCE   = datetime(2024, 6, 3, 9, 0)   # начало открытых поездок
+
+SIZES = {"1k": 1_000, "10k": 10_000, "100k": 100_000, "1m": 1_000_000}
+
+CACHE_DIR = os.getenv("BENCH_CACHE") or os.path.join(tempfile.gettempdir(), "court_trip_bench")
+
+ORGS = ["Мосгорсуд", "Арбитражный суд", "Нагатинский районный суд", "Тверской районный суд"]
+FMT = "%Y-%m-%d %H:%M:%S"
+
+
+def _trips(n: int, rng: random.Random):
+    first = datetime(2020, 1, 1)
+    for i in range(n):
+        day = first + timedelta(days=i * HISTORY_DAYS // n)
+        start = day + timedelta(hours=rng.randint(9, 15), minutes=rng.randrange(0, 60, 5))
+        end = start + timedelta(minutes=rng.randint(20, 180))
+        org = rng.randrange(len(ORGS))
+        yield (rng.randint(1, USERS), f"org{org}", ORGS[org],
+               start.strftime(FMT), end.strftime(FMT), "completed")
+
+
+def _plans(n: int, rng: random.Random):
+    first = datetime(2024, 1, 1)
+    for _ in range(n):
+        day = first + timedelta(days=rng.randrange(365))
+        user = rng.randint(1, USERS)
+        yield (user, day.strftime("%Y-%m-%d"), f"Сотрудник {user}",
+               ORGS[rng.randrange(len(ORGS))], f"{rng.randint(9, 16)}:00")
+
+
+def build_db(path: str, n_trips: int):
+    """Создаёт БД по пути path (файл перезаписывается)."""
+    if os.path.exists(path):
+        os.remove(path)
+    rng = random.Random(SEED)
+    conn = connect(path)
+    migrate(conn)
+    with conn:
+        conn.executemany(
+            "INSERT INTO employees (user_id, full_name) VALUES (?, ?)",
+            [(uid, f"Сотрудник {uid}") for uid in range(1, USERS + 1)]
+        )
+        conn.executemany(
+            "INSERT INTO trips (user_id, organization_id, organization_name, "
+            "start_datetime, end_datetime, status) VALUES (?, ?, ?, ?, ?, ?)",
+            _trips(n_trips, rng)
+        )
+        # открытые поездки; их строки в листе «Поездки» идут подряд
+        # со второй (см. fakes.spreadsheet_for)
+        conn.executemany(
+            "INSERT INTO trips (user_id, organization_id, organization_name, "
+            "start_datetime, status, sheet_row) VALUES (?, 'org0', ?, ?, 'in_progress', ?)",
+            [
+                (uid, ORGS[0], OPEN_SINCE.strftime(FMT), row)
+                for row, uid in enumerate(range(1, USERS + 1, OPEN_EVERY), start=2)
+            ]
+        )
+        conn.executemany(
+            "INSERT INTO plans (user_id, plan_date, full_name, org_name, plan_time, in_sheet) "
+            "VALUES (?, ?, ?, ?, ?, 1)",
+            sorted(_plans(min(n_trips // PLANS_RATIO, MAX_PLANS), rng), key=lambda p: p[1])
+        )
+        conn.executemany(
+            "INSERT OR REPLACE INTO config (key, value) VALUES (?, ?)",
+            [("PLANS_IMPORTED", "1"), ("DEBUG_MODE", "false")]
+        )
+    conn.execute("ANALYZE")
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    conn.close()
+
+
+def cached_db(size: str) -> str:
+    """Путь к готовой БД размера size ("1k", "100k", "1m"), собирает при необходимости."""
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    path = os.path.join(CACHE_DIR, f"trips_{size}_v{MIGRATIONS[-1][0]}.db")
+    if not os.path.exists(path):
+        tmp = path + ".tmp"
+        build_db(tmp, SIZES[size])
+        os.replace(tmp, path)
+    return path
+
+
+def working_copy(size: str, path: str) -> str:
+    """Свежая копия эталонной БД для одного прогона (случаи меняют данные)."""
+    shutil.copyfile(cached_db(size), path)
+    return path
+
+
+def remove_db(path: str):
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
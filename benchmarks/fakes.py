@@ -0,0 +1,243 @@
+# benchmarks/fakes.py
+
+"""
+Фейки для офлайн-бенчмарков.
+
+FakeWorksheet/FakeSpreadsheet — листы gspread в памяти: реализуют ровно
+те методы, которыми пользуются core.sheets, core.sheet_mirror и
+sync_users.py, и считают вызовы (calls). С set_latency каждый вызов
+ещё и ждёт, как запрос к настоящему API. install_sheets подставляет их
+в core.sheets.session вместо настоящей таблицы.
+
+FakeBot принимает любые вызовы Bot API (send_message, send_document, …)
+и только запоминает их; message_update/callback_update собирают
+настоящие telegram.Update поверх него, FakeContext — минимальный
+CallbackContext для хендлеров.
+"""
+
+import random
+import re
+import time
+from collections import Counter
+
+from telegram import Update
+
+from core import sheets
+
+_CELL = re.compile(r"([A-Z]+)(\d*)")
+
+
+def _parse_cell(a1: str) -> tuple[int | None, int]:
+    """'E12' → (12, 5); 'A' → (None, 1)."""
+    letters, digits = _CELL.fullmatch(a1).groups()
+    col = 0
+    for ch in letters:
+        col = col * 26 + ord(ch) - 64
+    return (int(digits) if digits else None), col
+
+
+class FakeWorksheet:
+    def __init__(self, spreadsheet: "FakeSpreadsheet", title: str,
+                 rows: list[list[str]] | None = None, row_count: int = 1000):
+        self.spreadsheet = spreadsheet
+        self.title = title
+        self.rows = [list(r) for r in rows or []]
+        self._grid = max(row_count, len(self.rows))
+
+    def _call(self, method: str):
+        self.spreadsheet.calls[f"{self.title}.{method}"] += 1
+        self.spreadsheet.delay()
+
+    @property
+    def row_count(self) -> int:
+        return self._grid
+
+    def add_rows(self, n: int):
+        self._call("add_rows")
+        self._grid += n
+
+    def _append(self, values: list[list]) -> dict:
+        first = len(self.rows) + 1
+        self.rows.extend([str(v) for v in row] for row in values)
+        self._grid = max(self._grid, len(self.rows))
+        return {"updates": {"updatedRange": f"'{self.title}'!A{first}:F{len(self.rows)}"}}
+
+    def append_row(self, values: list, **kwargs) -> dict:
+        self._call("append_row")
+        return self._append([values])
+
+    def append_rows(self, values: list[list], **kwargs) -> dict:
+        self._call("append_rows")
+        return self._append(values)
+
+    def insert_rows(self, values: list[list], row: int = 1, **kwargs):
+        self._call("insert_rows")
+        while len(self.rows) < row - 1:
+            self.rows.append([])
+        self.rows[row - 1:row - 1] = [[str(v) for v in r] for r in values]
+        self._grid += len(values)
+
+    def get_all_values(self) -> list[list[str]]:
+        self._call("get_all_values")
+        return [list(r) for r in self.rows]
+
+    def get(self, range_name: str, **kwargs) -> list[list[str]]:
+        self._call("get")
+        first, _, last = range_name.partition(":")
+        first_row, _ = _parse_cell(first)
+        last_row, _ = _parse_cell(last) if last else (first_row, 0)
+        rows = [list(r) for r in self.rows[first_row - 1:last_row or len(self.rows)]]
+        # как API: без хвостовых пустых ячеек и строк
+        for r in rows:
+            while r and r[-1] == "":
+                r.pop()
+        while rows and not rows[-1]:
+            rows.pop()
+        return rows
+
+    def batch_update(self, data: list[dict], **kwargs):
+        self._call("batch_update")
+        for item in data:
+            row, col = _parse_cell(item["range"].split(":")[0])
+            for i, values in enumerate(item["values"]):
+                while len(self.rows) < row + i:
+                    self.rows.append([])
+                target = self.rows[row + i - 1]
+                target.extend([""] * (col - 1 + len(values) - len(target)))
+                target[col - 1:col - 1 + len(values)] = [str(v) for v in values]
+
+
+class FakeSpreadsheet:
+    def __init__(self):
+        self.calls: Counter[str] = Counter()
+        self._sheets: list[FakeWorksheet] = []
+        self._latency = 0.0
+        self._jitter = 0.0
+        self._rng = random.Random(0)
+
+    def set_latency(self, seconds: float, jitter: float = 0.0):
+        """Задержка каждого вызова: нормальное распределение, не меньше нуля."""
+        self._latency = seconds
+        self._jitter = jitter
+
+    def delay(self):
+        # вызовы идут из потоков outbox/отчётов — обычный sleep
+        if self._latency or self._jitter:
+            time.sleep(max(0.0, self._rng.gauss(self._latency, self._jitter)))
+
+    def add_worksheet(self, title: str, rows="1000", cols="26",
+                      values: list[list[str]] | None = None) -> FakeWorksheet:
+        self.calls["add_worksheet"] += 1
+        self.delay()
+        ws = FakeWorksheet(self, title, values, int(rows))
+        self._sheets.append(ws)
+        return ws
+
+    def worksheets(self) -> list[FakeWorksheet]:
+        self.calls["worksheets"] += 1
+        self.delay()
+        return list(self._sheets)
+
+    def total_calls(self) -> int:
+        return sum(self.calls.values())
+
+    def reset_calls(self):
+        self.calls.clear()
+
+
+def spreadsheet_for(conn) -> FakeSpreadsheet:
+    """
+    Таблица, согласованная с БД бенчмарка: открытые поездки стоят в листе
+    «Поездки» на своих sheet_row, «Календарь» — проекция plans.
+    """
+    book = FakeSpreadsheet()
+    trips = [["ФИО", "Организация", "Дата", "Начало поездки", "Конец поездки", "Длительность"]]
+    for row, full_name, org_name, start in conn.execute('''
+        SELECT t.sheet_row, e.full_name, t.organization_name, t.start_datetime
+        FROM trips t JOIN employees e ON e.user_id = t.user_id
+        WHERE t.status = 'in_progress' AND t.sheet_row IS NOT NULL
+        ORDER BY t.sheet_row
+    '''):
+        trips += [[] for _ in range(row - len(trips) - 1)]
+        trips.append([full_name, org_name, start.strftime("%d.%m.%Y"), start.strftime("%H:%M"), "", ""])
+    calendar = [["Дата", "ФИО", "Организация", "Время"]] + [
+        [f"{d[8:10]}.{d[5:7]}.{d[:4]}", name, org, t]
+        for d, name, org, t in conn.execute(
+            "SELECT plan_date, full_name, org_name, plan_time FROM plans "
+            "WHERE in_sheet = 1 ORDER BY plan_date, id"
+        )
+    ]
+    users = [["ФИО", "Telegram ID"]] + [
+        [name, str(uid)] for uid, name in
+        conn.execute("SELECT user_id, full_name FROM employees ORDER BY full_name")
+    ]
+    book.add_worksheet("Поездки", values=trips)
+    book.add_worksheet("Пользователи", values=users)
+    book.add_worksheet("Календарь", values=calendar)
+    book.reset_calls()
+    return book
+
+
+def install_sheets(book: FakeSpreadsheet):
+    """Подставляет book в core.sheets.session (без авторизации и сети)."""
+    sheets.session.spreadsheet = lambda: book
+    sheets.session.invalidate()
+
+
+# --- Telegram -------------------------------------------------------------------
+
+class FakeBot:
+    """Любой метод Bot API — корутина, которая только записывает вызов."""
+
+    defaults = None   # PTB смотрит bot.defaults при разборе Update
+
+    def __init__(self):
+        self.calls: Counter[str] = Counter()
+
+    def __getattr__(self, method: str):
+        if method.startswith("_"):
+            raise AttributeError(method)
+
+        async def call(*args, **kwargs):
+            self.calls[method] += 1
+            return True
+        return call
+
+
+class FakeContext:
+    def __init__(self, bot: FakeBot, args: list[str] | None = None):
+        self.bot = bot
+        self.args = args or []
+        self.user_data: dict = {}
+        self.chat_data: dict = {}
+
+
+def _user(user_id: int) -> dict:
+    return {"id": user_id, "is_bot": False, "first_name": f"U{user_id}"}
+
+
+def message_update(bot: FakeBot, user_id: int, text: str, update_id: int = 1) -> Update:
+    data = {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id, "date": 0, "text": text,
+            "chat": {"id": user_id, "type": "private"}, "from": _user(user_id),
+        },
+    }
+    if text.startswith("/"):
+        command = text.split()[0]
+        data["message"]["entities"] = [{"type": "bot_command", "offset": 0, "length": len(command)}]
+    return Update.de_json(data, bot)
+
+
+def callback_update(bot: FakeBot, user_id: int, data: str, update_id: int = 1) -> Update:
+    return Update.de_json({
+        "update_id": update_id,
+        "callback_query": {
+            "id": str(update_id), "chat_instance": "bench", "data": data, "from": _user(user_id),
+            "message": {
+                "message_id": update_id, "date": 0, "text": "…",
+                "chat": {"id": user_id, "type": "private"},
+            },
+        },
+    }, bot)
@@ -0,0 +1,269 @@
+# benchmarks/load.py
+#
+#   python -m benchmarks.load [--users 25,50,100,200] [--ramp 60] [--think 2]
+#                             [--sheets-latency 300] [--sheets-jitter 100]
+#                             [--api-latency 0] [--reply-timeout 30]
+#                             [--lag-threshold 1000] [--json results.json]
+#
+# Сквозной нагрузочный прогон: сколько сотрудников бот обслуживает в пик
+# (9:00 и 18:00), пока ответы не начинают запаздывать.
+#
+# Настоящий бот (bot.build_application: хендлеры, outbox, планировщик)
+# работает в этом процессе и ходит к локальному фейку Bot API
+# (benchmarks/botapi.py) через TELEGRAM_BASE_URL. Google Sheets заменён
+# фейком в памяти с задержкой каждого вызова (--sheets-latency/jitter, мс).
+#
+# На каждый уровень --users — своя свежая БД с этим числом сотрудников.
+# Каждый сотрудник приходит в случайный момент окна --ramp (сек.) и
+# проходит сценарий «🚀 Поездка» → выбор суда → «🏦 Возврат» с паузами
+# около --think сек. Задержка шага — от выдачи обновления в getUpdates
+# до ответа бота (sendMessage/editMessageText) в этот чат. Печатаются
+# p50/p95/p99 по шагам, пропускная способность (ответов в секунду)
+# и наибольшее число сотрудников, при котором p95 ≤ --lag-threshold мс.
+#
+# Фейк Bot API и генератор нагрузки живут в отдельном потоке со своим
+# loop, но делят с ботом процесс и GIL: абсолютные цифры — нижняя граница
+# для боевого сервера, сравнивать имеет смысл прогоны между собой.
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import socket
+import tempfile
+import time
+from collections import Counter
+
+TOKEN = "123456:LOAD-TEST"
+HOST  = "127.0.0.1"
+ORG   = "msk_city"
+STEPS = ("trip", "org", "return")
+POLL_TIMEOUT = 10       # сек. long polling getUpdates
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind((HOST, 0))
+        return s.getsockname()[1]
+
+
+def percentile(ordered: list[float], q: float) -> float:
+    """Перцентиль q (0–100) по отсортированному списку, метод ближайшего ранга."""
+    if not ordered:
+        return math.nan
+    return ordered[max(0, math.ceil(q / 100 * len(ordered)) - 1)]
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies: dict[str, list[float]] = {step: [] for step in STEPS}
+        self.errors: Counter[str] = Counter()
+        self.timeouts: Counter[str] = Counter()
+        self.started = time.perf_counter()
+        self.last_reply = self.started
+
+    def add(self, step: str, latency: float, ok: bool):
+        self.latencies[step].append(latency)
+        self.last_reply = time.perf_counter()
+        if not ok:
+            self.errors[step] += 1
+
+    @staticmethod
+    def _row(values: list[float], errors: int, timeouts: int) -> dict:
+        ordered = sorted(v * 1000 for v in values)
+        return {
+            "replies":  len(ordered),
+            "p50_ms":   round(percentile(ordered, 50), 1),
+            "p95_ms":   round(percentile(ordered, 95), 1),
+            "p99_ms":   round(percentile(ordered, 99), 1),
+            "max_ms":   round(ordered[-1], 1) if ordered else math.nan,
+            "errors":   errors,
+            "timeouts": timeouts,
+        }
+
+    def summary(self) -> dict:
+        steps = {
+            step: self._row(self.latencies[step], self.errors[step], self.timeouts[step])
+            for step in STEPS
+        }
+        everything = [v for step in STEPS for v in self.latencies[step]]
+        total = self._row(everything, sum(self.errors.values()), sum(self.timeouts.values()))
+        elapsed = self.last_reply - self.started
+        total["throughput"] = round(len(everything) / elapsed, 2) if elapsed > 0 else 0.0
+        return {"steps": steps, "total": total}
+
+
+async def _step(api, rec: Recorder, step: str, user_id: int, future, timeout: float, expect: str):
+    """Ждёт ответа бота на выданное обновление; None — ответа не дождались."""
+    try:
+        reply = await asyncio.wait_for(future, timeout)
+    except asyncio.TimeoutError:
+        api.forget(user_id)
+        rec.timeouts[step] += 1
+        return None
+    rec.add(step, reply.latency, expect in reply.text)
+    return reply
+
+
+async def employee(api, rec: Recorder, user_id: int, arrive: float, think: float, timeout: float):
+    """Один сотрудник: «🚀 Поездка» → выбор суда → «🏦 Возврат»."""
+    rng = random.Random(user_id)
+    await asyncio.sleep(arrive)
+    menu = await _step(api, rec, "trip", user_id,
+                       api.issue_message(user_id, "🚀 Поездка"), timeout, "Куда")
+    if menu is None:
+        return
+    await asyncio.sleep(think * rng.uniform(0.5, 1.5))
+    started = await _step(api, rec, "org", user_id,
+                          api.issue_callback(user_id, menu.message_id, f"org_{ORG}"),
+                          timeout, "начата")
+    if started is None:
+        return
+    await asyncio.sleep(think * rng.uniform(0.5, 1.5))
+    await _step(api, rec, "return", user_id,
+                api.issue_message(user_id, "🏦 Возврат"), timeout, "завершена")
+
+
+async def generate(api, users: int, ramp: float, think: float, timeout: float) -> dict:
+    """Генератор нагрузки; выполняется в loop фейкового Bot API."""
+    rng = random.Random(users)
+    rec = Recorder()
+    await asyncio.gather(*(
+        employee(api, rec, uid, rng.uniform(0, ramp), think, timeout)
+        for uid in range(1, users + 1)
+    ))
+    return rec.summary()
+
+
+def prepare_db(path: str, users: int):
+    """Пустая БД по текущей схеме с users зарегистрированными сотрудниками."""
+    from utils.db import connect
+    from utils.migrations import migrate
+
+    conn = connect(path)
+    migrate(conn)
+    with conn:
+        conn.executemany(
+            "INSERT INTO employees (user_id, full_name) VALUES (?, ?)",
+            [(uid, f"Сотрудник {uid}") for uid in range(1, users + 1)]
+        )
+    conn.close()
+
+
+async def run_level(bot, api, users: int, workdir: str, args) -> dict:
+    from benchmarks.fakes import install_sheets, spreadsheet_for
+    from utils import db
+    from utils.employees import directory
+
+    path = os.path.join(workdir, f"load_{users}.db")
+    prepare_db(path, users)
+    db.DB_PATH = path
+    directory.close()
+    directory.load()
+
+    book = spreadsheet_for(db.get_connection())
+    book.set_latency(args.sheets_latency / 1000, args.sheets_jitter / 1000)
+    install_sheets(book)
+    api.reset()
+
+    app = bot.build_application()
+    async with app:
+        await bot.on_startup(app)
+        await app.updater.start_polling(timeout=POLL_TIMEOUT,
+                                        allowed_updates=bot.ALLOWED_UPDATES)
+        await app.start()
+        try:
+            result = await asyncio.wrap_future(api.submit(
+                generate(api, users, args.ramp, args.think, args.reply_timeout)
+            ))
+        finally:
+            await app.updater.stop()
+            await app.stop()
+            await bot.on_shutdown(app)
+    result["sheets_calls"] = book.total_calls()
+    result["bot_api_calls"] = dict(api.calls)
+    return result
+
+
+def print_level(users: int, result: dict):
+    print(f"{'шаг':<8}{'ответов':>9}{'p50, мс':>10}{'p95, мс':>10}{'p99, мс':>10}"
+          f"{'макс, мс':>10}{'ошибок':>8}{'таймаутов':>11}")
+    for name, row in [*result["steps"].items(), ("всего", result["total"])]:
+        print(f"{name:<8}{row['replies']:>9}{row['p50_ms']:>10.1f}{row['p95_ms']:>10.1f}"
+              f"{row['p99_ms']:>10.1f}{row['max_ms']:>10.1f}{row['errors']:>8}{row['timeouts']:>11}")
+    print(f"пропускная способность: {result['total']['throughput']:.1f} ответов/с, "
+          f"обращений к Sheets: {result['sheets_calls']}\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.load")
+    parser.add_argument("--users", default="25,50,100,200",
+                        help="уровни нагрузки: число сотрудников через запятую")
+    parser.add_argument("--ramp", type=float, default=60.0,
+                        help="сек., за которые приходят все сотрудники")
+    parser.add_argument("--think", type=float, default=2.0, help="сек. между шагами")
+    parser.add_argument("--sheets-latency", type=float, default=300.0, help="мс на вызов Sheets")
+    parser.add_argument("--sheets-jitter", type=float, default=100.0)
+    parser.add_argument("--api-latency", type=float, default=0.0,
+                        help="мс на каждый запрос к Bot API")
+    parser.add_argument("--reply-timeout", type=float, default=30.0)
+    parser.add_argument("--lag-threshold", type=float, default=1000.0,
+                        help="мс; p95 выше — ответы запаздывают")
+    parser.add_argument("--json", help="записать результаты в файл")
+    args = parser.parse_args()
+
+    # bot.py читает настройки при импорте — окружение готовим до него
+    api_port = free_port()
+    os.environ.update({
+        "BOT_TOKEN":         TOKEN,
+        "BOT_MODE":          "polling",
+        "TELEGRAM_BASE_URL": f"http://{HOST}:{api_port}",
+        "HOST":              HOST,
+        "PORT":              str(free_port()),
+        # без настоящей таблицы: не авторизуемся в Google (см. install_sheets)
+        "GOOGLE_SHEETS_JSON": "",
+    })
+    # рабочее время не должно зависеть от момента запуска
+    os.environ.setdefault("DEBUG_MODE", "1")
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+    import bot
+    from benchmarks.botapi import FakeBotAPI
+    from utils import db
+    from utils.employees import directory
+
+    api = FakeBotAPI(TOKEN, HOST, api_port, api_latency=args.api_latency / 1000)
+    api.start()
+    results = {}
+    try:
+        with tempfile.TemporaryDirectory() as workdir:
+            for users in map(int, args.users.split(",")):
+                print(f"== {users} сотрудников, приход за {args.ramp:g} с, "
+                      f"Sheets {args.sheets_latency:g}±{args.sheets_jitter:g} мс")
+                results[users] = asyncio.run(run_level(bot, api, users, workdir, args))
+                print_level(users, results[users])
+            db.close_connection()
+            directory.close()
+    finally:
+        api.stop()
+
+    fine = [u for u, r in results.items()
+            if r["total"]["p95_ms"] <= args.lag_threshold and not r["total"]["timeouts"]]
+    print(f"{'сотрудников':>12}{'p95, мс':>10}{'p99, мс':>10}{'ответов/с':>11}")
+    for users, r in results.items():
+        print(f"{users:>12}{r['total']['p95_ms']:>10.1f}{r['total']['p99_ms']:>10.1f}"
+              f"{r['total']['throughput']:>11.1f}")
+    if fine:
+        print(f"\np95 ≤ {args.lag_threshold:g} мс без таймаутов: до {max(fine)} сотрудников")
+    else:
+        print(f"\np95 > {args.lag_threshold:g} мс уже на {min(results)} сотрудниках")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"args": vars(args), "levels": results}, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,12 @@
 # bot.py
 
-import os
 import time
-import logging  # добавлено для настройки логирования
+_STARTED = time.perf_counter()  # до остальных импортов — для замера холодного старта
+
+import os
+import signal
+import asyncio
+import logging
 from dotenv import load_dotenv
 from telegram.ext import (
     ApplicationBuilder,
@@ -15,7 +19,8 @@ from handlers.commands import (
     register_command,
     trip_command,
     return_command,
-    report_command
+    report_command,
+    profile_command
 )
 from handlers.callbacks import (
     organization_callback,
@@ -23,45 +28,150 @@ from handlers.callbacks import (
     plan_org_callback
 )
 from handlers.menu import handle_main_menu
-from keep_alive import keep_alive
 from scheduler import start_scheduler
+from webserver import build_server
+from utils.database import init_db
+from utils.employees import directory, start_refresher
+from core import outbox, sheets
+from utils.startup import timer as startup_timer, FirstUpdatesRequest
+from utils.log import setup_logging
+from utils.updates import PerUserUpdateProcessor
+
+startup_timer.reset(_STARTED)
+startup_timer.mark("imports")
 
 load_dotenv()
-keep_alive()
-# даём время на установку соединений
-time.sleep(3)
-
-# Настройка логирования — чтобы INFO и выше шли в bot.log
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s %(levelname)s %(name)s: %(message)s",
-    datefmt="%Y-%m-%d %H:%M:%S"
-)
+
+# Логи через очередь: вывод в отдельном потоке, уровни по модулям
+# из LOG_LEVEL/LOG_LEVELS, файл — LOG_FILE (см. utils/log.py)
+setup_logging()
+logger = logging.getLogger("bot")
 
 TOKEN = os.getenv("BOT_TOKEN")
 if not TOKEN:
-    print("❌ BOT_TOKEN is missing")
+    logger.critical("❌ BOT_TOKEN is missing")
+    exit(1)
+
+# Режим получения обновлений: polling (по умолчанию) или webhook.
+# Для webhook нужен публичный адрес WEBHOOK_URL (https://…), Telegram
+# шлёт обновления на WEBHOOK_URL + WEBHOOK_PATH, их принимает тот же
+# HTTP-сервер, что отвечает на пинги (webserver.py), на порту PORT.
+BOT_MODE       = os.getenv("BOT_MODE", "polling").lower()
+WEBHOOK_URL    = os.getenv("WEBHOOK_URL", "").rstrip("/")
+WEBHOOK_PATH   = os.getenv("WEBHOOK_PATH", "/telegram")
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET") or None
+HTTP_HOST      = os.getenv("HOST", "0.0.0.0")
+HTTP_PORT      = int(os.getenv("PORT", "8080"))
+# другой адрес Bot API — например, локальный фейк для тестов
+TELEGRAM_BASE_URL = os.getenv("TELEGRAM_BASE_URL")
+
+ALLOWED_UPDATES = ["message", "callback_query"]
+
+if BOT_MODE == "webhook" and not WEBHOOK_URL:
+    logger.critical("❌ BOT_MODE=webhook, но WEBHOOK_URL не задан")
     exit(1)
 
+def health_checks(app) -> dict[str, bool]:
+    """Для /health: живы ли получение обновлений, планировщик и outbox."""
+    if BOT_MODE == "webhook":
+        updates = app.running
+    else:
+        updates = app.running and app.updater is not None and app.updater.running
+    scheduler = app.bot_data.get("scheduler")
+    background = app.bot_data.get("background", [])
+    return {
+        "updates":   updates,
+        "scheduler": scheduler is not None and scheduler.running,
+        "outbox":    bool(background) and not background[0].done(),
+    }
+
 async def on_startup(app):
-    # Убираем webhook, чтобы разрешить polling
-    await app.bot.delete_webhook(drop_pending_updates=True)
-    print("🟢 Бот успешно запущен (вебхук удалён, polling готов)")
+    # HTTP-сервер (пинги, метрики, а в режиме webhook — и обновления) на этом же loop
+    server = build_server(
+        app, HTTP_HOST, HTTP_PORT,
+        webhook_path=WEBHOOK_PATH if BOT_MODE == "webhook" else None,
+        secret=WEBHOOK_SECRET,
+        health_checks=lambda: health_checks(app),
+    )
+    await server.start()
+    app.bot_data["webserver"] = server
+    if BOT_MODE != "webhook":
+        # Убираем webhook, чтобы разрешить polling
+        await app.bot.delete_webhook(drop_pending_updates=True)
+    app.bot_data["background"] = [
+        # фоновая доставка записей в Google Sheets
+        outbox.start_worker(),
+        # справочник сотрудников следит за правками employees извне
+        start_refresher(),
+    ]
+    # авторизация в Google — в фоне, параллельно со стартом polling;
+    # дальше токен обновляется заранее, а не посреди запроса пользователя
+    sheets.session.start_background_refresh()
+    # планировщик — в работающем loop бота
+    app.bot_data["scheduler"] = start_scheduler()
+    startup_timer.mark("post_init")
+    logger.info("🟢 Бот успешно запущен (режим: %s)", BOT_MODE)
 
-def main():
-    app = (
+async def on_shutdown(app):
+    for task in app.bot_data.pop("background", []):
+        task.cancel()
+    scheduler = app.bot_data.pop("scheduler", None)
+    if scheduler is not None:
+        scheduler.shutdown(wait=False)
+    server = app.bot_data.pop("webserver", None)
+    if server is not None:
+        await server.stop()
+
+async def run_webhook(app):
+    """
+    Режим webhook без отдельного веб-фреймворка: обновления принимает
+    webserver.py и кладёт в app.update_queue, приложение их разбирает.
+    """
+    async with app:                         # initialize() / shutdown()
+        await on_startup(app)
+        await app.bot.set_webhook(
+            WEBHOOK_URL + WEBHOOK_PATH,
+            secret_token=WEBHOOK_SECRET,
+            allowed_updates=ALLOWED_UPDATES,
+            drop_pending_updates=True,
+        )
+        await app.start()
+        startup_timer.mark("webhook_set")
+        startup_timer.report()
+
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, stop.set)
+        await stop.wait()
+
+        await app.stop()
+        await on_shutdown(app)
+
+def build_application():
+    """Приложение PTB со всеми хендлерами (бот и нагрузочный стенд)."""
+    builder = (
         ApplicationBuilder()
         .token(TOKEN)
+        # отмечает первый ответ getUpdates (utils/startup.py)
+        .get_updates_request(FirstUpdatesRequest())
         .job_queue(None)            # отключаем встроенный JobQueue PTB
+        # разные сотрудники — параллельно, один сотрудник — по порядку
+        .concurrent_updates(PerUserUpdateProcessor())
         .post_init(on_startup)
-        .build()
+        .post_shutdown(on_shutdown)
     )
+    if TELEGRAM_BASE_URL:
+        base = TELEGRAM_BASE_URL.rstrip("/")
+        builder = builder.base_url(f"{base}/bot").base_file_url(f"{base}/file/bot")
+    app = builder.build()
 
     # Регистрация CommandHandler'ов
     app.add_handler(register_command)   # /register
     app.add_handler(trip_command)       # /trip
     app.add_handler(return_command)     # /return
     app.add_handler(report_command)     # /report
+    app.add_handler(profile_command)    # /profile (админы)
 
     # Роутинг по тексту из главного меню
     app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_main_menu))
@@ -70,18 +180,27 @@ def main():
     app.add_handler(organization_callback)   # выбор суда
     app.add_handler(end_trip_callback)       # inline callback "end_trip"
     app.add_handler(plan_org_callback)       # inline callback "plan_org_*"
+    return app
+
+def main():
+    init_db()
+    directory.load()
+    startup_timer.mark("db_ready")
 
-    # Запускаем планировщик
-    start_scheduler()
+    app = build_application()
 
-    print("⏳ Запуск polling...")
-    app.run_polling(drop_pending_updates=True, allowed_updates=["message", "callback_query"])
+    if BOT_MODE == "webhook":
+        logger.info("⏳ Запуск webhook: %s%s", WEBHOOK_URL, WEBHOOK_PATH)
+        asyncio.run(run_webhook(app))
+    else:
+        logger.info("⏳ Запуск polling...")
+        app.run_polling(drop_pending_updates=True, allowed_updates=ALLOWED_UPDATES)
 
 if __name__ == "__main__":
     try:
         main()
     except KeyboardInterrupt:
-        print("🛑 Бот остановлен вручную.")
+        logger.info("🛑 Бот остановлен вручную.")
     except Exception as e:
-        print(f"🔴 Критическая ошибка: {e}")
+        logger.critical("🔴 Критическая ошибка: %s", e)
         raise
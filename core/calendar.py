@@ -1,16 +1,19 @@
 # core/calendar.py
 
+import logging
 from telegram import Update, InlineKeyboardMarkup, InlineKeyboardButton
 from telegram.ext import ContextTypes
 from datetime import datetime
-import sqlite3
-import pandas as pd
-from io import BytesIO
 
-from utils.database import is_registered
-from core.sheets import add_plan, get_calendar_dataframe
+from utils.database import is_registered, save_plan
+from utils.db import run_read, run_write
+from utils.metrics import track_handler
+from core.plans import calendar_file
 from core.trip import ORGANIZATIONS  # используем тот же список судов
 
+logger = logging.getLogger(__name__)
+
+@track_handler
 async def start_plan(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.message.from_user.id
     if not is_registered(user_id):
@@ -26,6 +29,7 @@ async def start_plan(update: Update, context: ContextTypes.DEFAULT_TYPE):
         reply_markup=reply_markup
     )
 
+@track_handler
 async def handle_plan_org(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
@@ -49,6 +53,7 @@ async def handle_plan_org(update: Update, context: ContextTypes.DEFAULT_TYPE):
         parse_mode="Markdown"
     )
 
+@track_handler
 async def handle_plan_datetime(update: Update, context: ContextTypes.DEFAULT_TYPE):
     # этап 1: ввод названия организации (для custom)
     if context.user_data.get("awaiting_custom_plan_org"):
@@ -82,17 +87,12 @@ async def handle_plan_datetime(update: Update, context: ContextTypes.DEFAULT_TYP
         )
 
     user_id = update.message.from_user.id
-    conn = sqlite3.connect("court_tracking.db")
-    full_name = conn.execute(
-        "SELECT full_name FROM employees WHERE user_id = ?", (user_id,)
-    ).fetchone()[0]
-    conn.close()
-
     org_name = context.user_data.get("plan_org_name")
     try:
-        add_plan(full_name, org_name, plan_date, plan_time)
-    except Exception as e:
-        print(f"[Google Sheets] Ошибка при записи в Календарь: {e}")
+        # план сохраняется локально, в лист «Календарь» уходит через outbox
+        await run_write(save_plan, user_id, org_name, plan_date, plan_time)
+    except Exception:
+        logger.exception("calendar: ошибка при сохранении плана")
         return await update.message.reply_text("❌ Не удалось записать в Календарь.")
 
     # сброс состояний
@@ -104,19 +104,12 @@ async def handle_plan_datetime(update: Update, context: ContextTypes.DEFAULT_TYP
         parse_mode="Markdown"
     )
 
+@track_handler
 async def show_calendar(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.message.from_user.id
     if not is_registered(user_id):
         return await update.message.reply_text("❌ Вы не зарегистрированы!")
-    df = get_calendar_dataframe()
-    if df.empty:
+    buf = await run_read(calendar_file)
+    if buf is None:
         return await update.message.reply_text("📭 Календарь пуст.")
-    buf = BytesIO()
-    with pd.ExcelWriter(buf, engine="xlsxwriter") as writer:
-        df.to_excel(writer, sheet_name="Календарь", index=False)
-        ws = writer.sheets["Календарь"]
-        for i, col in enumerate(df.columns):
-            width = max(df[col].astype(str).map(len).max(), len(col)) + 2
-            ws.set_column(i, i, width)
-    buf.seek(0)
     await update.message.reply_document(document=buf, filename="Календарь.xlsx")
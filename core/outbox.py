@@ -0,0 +1,219 @@
+# core/outbox.py
+
+"""
+Очередь записей в Google Sheets (outbox).
+
+Хендлеры не ходят в Google напрямую: изменение поездки и запись в таблицу
+sheets_outbox делаются в одной транзакции хранилища (Session.enqueue,
+utils/storage.py), а фоновый asyncio-воркер
+разгребает очередь с повторами и пакетной отправкой. Записи переживают
+перезапуск бота — пока строка не доставлена, она остаётся в БД.
+
+Разбор идёт в отдельном потоке: он читает очередь и ходит в Google, а
+пишет в БД (удаление доставленных, повторы, номера строк) через поток-
+писатель (utils.db.call_write) — как и хендлеры, одной транзакцией на
+группу операций.
+"""
+
+import asyncio
+import json
+import logging
+import time
+from datetime import datetime, timedelta
+
+from core import plans, sheets
+from utils.db import call_write
+from utils.storage import Session, storage
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE    = 50        # сколько записей забираем за один проход
+POLL_INTERVAL = 10        # сек., страховочный опрос очереди
+BASE_BACKOFF  = 10        # сек., первая пауза после ошибки
+MAX_BACKOFF   = 15 * 60   # сек., потолок паузы между повторами
+MAX_ATTEMPTS  = 50        # после стольких неудач запись помечается failed
+
+_loop: asyncio.AbstractEventLoop | None = None
+_wakeup: asyncio.Event | None = None
+_task: asyncio.Task | None = None
+
+
+def notify():
+    """Будит воркер после коммита. Безопасно вызывать из любого потока."""
+    if _loop is not None and _wakeup is not None:
+        _loop.call_soon_threadsafe(_wakeup.set)
+
+
+# --- доставка операций в Google Sheets -------------------------------------
+#
+# Обработчик получает читающую сессию, payload'ы группы и признак повтора
+# (прошлая попытка могла частично дойти до листа). Если после доставки
+# нужно что-то записать в БД, он возвращает функцию от пишущей сессии —
+# она выполнится в одной транзакции с удалением записей из очереди.
+
+def _apply_add_users(s: Session, payloads: list[dict], retry: bool):
+    sheets.add_users([(p["full_name"], p["user_id"]) for p in payloads])
+
+
+def _apply_add_trips(s: Session, payloads: list[dict], retry: bool):
+    trips = [
+        (p["full_name"], p["org_name"], datetime.fromisoformat(p["start"]))
+        for p in payloads
+    ]
+    # повтор: строки могли дописаться, а номера — не записаться; второй раз не дописываем
+    found = sheets.find_trip_rows(trips) if retry else [None] * len(trips)
+    missing = [i for i, row in enumerate(found) if row is None]
+    if len(missing) < len(trips):
+        logger.warning("outbox: add_trip — %d поездок уже в листе, не дописываем повторно",
+                       len(trips) - len(missing))
+    for i, row in zip(missing, sheets.add_trips([trips[i] for i in missing])):
+        found[i] = row
+    # запоминаем номер строки, чтобы закрытие поездки было одной записью
+    sheet_rows = [(row, p["trip_id"]) for row, p in zip(found, payloads)]
+    return lambda w: w.set_sheet_rows(sheet_rows)
+
+
+def _apply_end_trips(s: Session, payloads: list[dict], retry: bool):
+    # номера строк читаем при доставке: add_trip мог дойти позже enqueue
+    rows = s.sheet_rows([p["trip_id"] for p in payloads])
+    sheets.end_trips_in_sheet([
+        (
+            p["full_name"],
+            p["org_name"],
+            datetime.fromisoformat(p["start"]),
+            datetime.fromisoformat(p["end"]),
+            timedelta(seconds=p["duration"]),
+            rows.get(p["trip_id"]),
+        )
+        for p in payloads
+    ])
+
+
+def _apply_add_plans(s: Session, payloads: list[dict], retry: bool):
+    plans.project_plans(s, [p["plan_id"] for p in payloads])
+
+
+def _apply_import_plans(s: Session, payloads: list[dict], retry: bool):
+    plans.ensure_imported(s)
+
+
+_HANDLERS = {
+    "add_user": _apply_add_users,
+    "add_trip": _apply_add_trips,
+    "end_trip": _apply_end_trips,
+    "add_plan": _apply_add_plans,
+    "import_plans": _apply_import_plans,
+}
+
+# операции, которые можно склеивать в один запрос к API
+_BATCHABLE = {"add_user", "add_trip", "end_trip", "add_plan"}
+
+# операции, повтор которых после частичной доставки надо распознать:
+# попытка отмечается в очереди до запроса к API, а не только при ошибке
+_MARK_ATTEMPT = {"add_trip"}
+
+
+def _group(rows):
+    """Склеивает подряд идущие однотипные операции, сохраняя порядок."""
+    group = []
+    for row in rows:
+        op = row[1]
+        if group and (op != group[-1][1] or op not in _BATCHABLE):
+            yield group
+            group = []
+        group.append(row)
+    if group:
+        yield group
+
+
+def _finish(ids: list[int], after):
+    """Доставлено: запись обработчика и удаление из очереди — одной транзакцией."""
+    with storage.transaction() as w:
+        if after is not None:
+            after(w)
+        w.outbox_delete(ids)
+
+
+def _start_attempt(ids: list[int]):
+    with storage.transaction() as w:
+        w.outbox_attempt(ids)
+
+
+def _postpone(rows: list[tuple[int, float, str, int, int]]):
+    with storage.transaction() as w:
+        w.outbox_retry(rows)
+
+
+def drain_once() -> int:
+    """
+    Один проход по очереди. Операции доставляются строго по порядку:
+    при ошибке проход останавливается, а голова очереди ждёт повтора.
+    Возвращает число доставленных записей. При общей PostgreSQL очередь
+    в каждый момент разбирает только один экземпляр бота.
+    """
+    with storage.session() as s, s.outbox_lock() as locked:
+        if not locked:
+            return 0
+        rows = s.outbox_batch(BATCH_SIZE)
+        if not rows or rows[0][4] > time.time():
+            return 0
+
+        done = 0
+        for group in _group(rows):
+            ids = [r[0] for r in group]
+            op = group[0][1]
+            retry = any(r[3] for r in group)
+            if op in _MARK_ATTEMPT:
+                # процесс может упасть посреди запроса — следующий проход это увидит
+                call_write(_start_attempt, ids)
+            try:
+                after = _HANDLERS[op](s, [json.loads(r[2]) for r in group], retry)
+            except Exception as e:
+                attempts = max(r[3] for r in group) + 1
+                delay = min(BASE_BACKOFF * 2 ** (attempts - 1), MAX_BACKOFF)
+                failed = int(attempts >= MAX_ATTEMPTS)
+                call_write(_postpone, [(attempts, time.time() + delay, str(e), failed, i)
+                                       for i in ids])
+                if failed:
+                    logger.error("outbox: %s #%s отброшена после %d попыток: %s",
+                                 op, ids, attempts, e)
+                else:
+                    logger.warning("outbox: %s #%s не доставлена (попытка %d), "
+                                   "повтор через %d с: %s", op, ids, attempts, delay, e)
+                break
+            finally:
+                s.rollback()   # читающая транзакция не держится дольше группы
+
+            call_write(_finish, ids, after)
+            done += len(ids)
+        return done
+
+
+async def run_worker():
+    """Фоновый цикл: разгребает очередь, пока она не опустеет, затем ждёт."""
+    global _loop, _wakeup
+    _loop = asyncio.get_running_loop()
+    _wakeup = asyncio.Event()
+    logger.info("outbox: воркер запущен")
+
+    while True:
+        _wakeup.clear()
+        try:
+            done = await asyncio.to_thread(drain_once)
+        except Exception:
+            logger.exception("outbox: ошибка при разборе очереди")
+            done = 0
+        if done:
+            continue
+        try:
+            await asyncio.wait_for(_wakeup.wait(), POLL_INTERVAL)
+        except asyncio.TimeoutError:
+            pass
+
+
+def start_worker() -> asyncio.Task:
+    """Запускает воркер в текущем event loop (вызывается из post_init)."""
+    global _task
+    if _task is None or _task.done():
+        _task = asyncio.get_running_loop().create_task(run_worker())
+    return _task
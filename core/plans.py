@@ -0,0 +1,180 @@
+# core/plans.py
+
+"""
+Планы поездок (календарь).
+
+Источник правды — таблица plans в хранилище (utils/storage.py), лист
+«Календарь» — её проекция, отсортированная по дате. Новый план сначала
+сохраняется в plans (utils.database.save_plan), а в лист уходит через
+outbox: место строки считается бисекцией по отсортированному индексу
+выведенных планов (PlanIndex), и строка вставляется туда insert_rows —
+один запрос, без скачивания листа и без перезаписи строк ниже.
+
+Индекс и отметка импорта не кэшируются в процессе: их читает из
+хранилища каждая проекция внутри прохода outbox, который в каждый момент
+выполняет только один экземпляр бота (outbox_lock). Иначе при общей
+PostgreSQL экземпляр с устаревшим индексом вставил бы строку не на своё
+место.
+
+При первом запуске существующий лист один раз импортируется в plans
+(ensure_imported, операция outbox import_plans — её ставит init_db).
+Строки без читаемой даты (заметки) в plans не попадают, но остаются в
+листе под планами. Выгрузка календаря читает только plans.
+"""
+
+import json
+import logging
+from bisect import bisect_left, insort
+from datetime import datetime
+from io import BytesIO
+
+from core import sheets
+from utils.db import call_write
+from utils.storage import Session, storage
+
+logger = logging.getLogger(__name__)
+
+# колонки листа, если заголовок не удалось прочитать при импорте
+DEFAULT_HEADER = ["Дата", "ФИО", "Организация", "Время"]
+SHEET_DATE_FORMAT = "%d.%m.%Y"
+
+
+class PlanIndex:
+    """
+    Отсортированные ключи (plan_date, id) планов, уже выведенных в лист.
+    Позиция ключа в списке + 2 (заголовок, нумерация с 1) — номер строки.
+    """
+
+    def __init__(self, keys: list[tuple[str, int]]):
+        self._keys = sorted(keys)
+
+    def position(self, key: tuple[str, int]) -> int:
+        """Сколько выведенных планов стоит в листе раньше key."""
+        return bisect_left(self._keys, key)
+
+    def add(self, keys: list[tuple[str, int]]):
+        for key in keys:
+            insort(self._keys, key)
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+
+def _sheet_row(plan_date: str, full_name: str, org_name: str, plan_time: str) -> list[str]:
+    day = datetime.strptime(plan_date, "%Y-%m-%d").strftime(SHEET_DATE_FORMAT)
+    return [day, full_name, org_name, plan_time]
+
+
+def ensure_imported(s: Session):
+    """
+    Один раз переносит существующий лист «Календарь» в plans. Вызывается
+    из outbox (под outbox_lock): операцией import_plans и перед каждой
+    проекцией. Отметка PLANS_IMPORTED каждый раз читается из хранилища —
+    импорт мог сделать другой экземпляр.
+
+    Планы должны стоять сразу под заголовком по порядку дат, иначе
+    номера строк не совпадут с индексом. Если это не так, лист
+    переписывается: сначала планы по порядку, под ними строки без
+    читаемой даты (заметки) — из листа они не пропадают. PLANS_IMPORTED
+    ставится только после успешной записи листа; при ошибке импорт
+    повторится целиком.
+    """
+    if s.get_config("PLANS_IMPORTED"):
+        return
+
+    values = sheets.get_calendar_values()
+    header = DEFAULT_HEADER
+    if values and any(values[0]):
+        header = (values[0] + DEFAULT_HEADER[len(values[0]):])[:4]
+    parsed, notes = [], []
+    in_place, gap = True, False
+    for row in values[1:]:
+        row = (row + [""] * 4)[:4]
+        try:
+            day = datetime.strptime(row[0].strip(), SHEET_DATE_FORMAT).date()
+        except ValueError:
+            if any(cell.strip() for cell in row):
+                notes.append(row)
+            gap = True
+            continue
+        # план ниже заметки или пустой строки — номера строк уже не те
+        in_place = in_place and not gap
+        parsed.append((day.isoformat(), row[1], row[2], row[3]))
+
+    # sorted стабилен: в пределах дня сохраняется порядок листа
+    ordered = sorted(parsed, key=lambda p: p[0])
+    if ordered != parsed or not in_place:
+        sheets.write_plan_rows(
+            2, [_sheet_row(*p) for p in ordered] + notes, clear_to=len(values)
+        )
+        logger.warning("plans: лист «Календарь» переписан по порядку дат, "
+                       "строк без даты перенесено под планы: %d", len(notes))
+    call_write(_save_import, ordered, header)
+    logger.info("plans: импортировано %d планов из листа", len(ordered))
+
+
+def _save_import(ordered: list[tuple], header: list[str]):
+    with storage.transaction() as w:
+        w.import_plans(ordered)
+        w.set_config("PLANS_HEADER", json.dumps(header, ensure_ascii=False))
+        w.set_config("PLANS_IMPORTED", "1")
+
+
+def _mark_in_sheet(plan_ids: list[int]):
+    with storage.transaction() as w:
+        w.mark_plans_in_sheet(plan_ids)
+
+
+def project_plans(s: Session, plan_ids: list[int]):
+    """
+    Выводит новые планы в лист: каждый вставляется insert_rows на своё
+    место по дате, строки ниже сдвигаются самим листом. Планы с одним
+    местом вставляются одним блоком. Вызывается из outbox.
+
+    Индекс выведенных планов строится заново из хранилища: лист мог
+    пополнить другой экземпляр. После каждого блока план отмечается
+    in_sheet и попадает в индекс: если следующий блок не дошёл, повтор не
+    вставит уже вставленные.
+    """
+    ensure_imported(s)
+    new_keys = sorted(s.new_plan_keys(plan_ids))
+    if not new_keys:
+        return
+    rows = {plan_id: row for plan_id, *row in s.plan_rows([k[1] for k in new_keys])}
+    index = PlanIndex(s.sheet_plan_keys())
+
+    blocks: dict[int, list[tuple[str, int]]] = {}
+    for key in new_keys:
+        blocks.setdefault(index.position(key), []).append(key)
+    for position, keys in blocks.items():
+        # индекс уже включает блоки выше — позиция сдвинута на них
+        first_row = index.position(keys[0]) + 2
+        sheets.insert_plan_rows(first_row, [_sheet_row(*rows[k[1]]) for k in keys])
+        index.add(keys)
+        call_write(_mark_in_sheet, [k[1] for k in keys])
+
+
+def calendar_dataframe():
+    """Календарь из таблицы plans, в колонках листа (pandas.DataFrame); лист не читается."""
+    import pandas as pd  # pandas грузим только при выгрузке календаря
+    with storage.session() as s:
+        found = s.get_config("PLANS_HEADER")
+        rows = s.calendar_rows()
+    header = json.loads(found) if found else DEFAULT_HEADER
+    return pd.DataFrame([_sheet_row(*r) for r in rows], columns=header)
+
+
+def calendar_file() -> BytesIO | None:
+    """
+    Календарь в xlsx (BytesIO, с начала) или None, если планов нет.
+    Выполняется в пуле читателей целиком: импорт pandas/xlsxwriter и сборка
+    книги не должны занимать event loop.
+    """
+    from core.report_builder import write_excel  # pandas/xlsxwriter — только здесь
+    df = calendar_dataframe()
+    if df.empty:
+        return None
+    buf = BytesIO()
+    write_excel(df, buf, "Календарь")
+    buf.seek(0)
+    return buf
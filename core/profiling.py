@@ -0,0 +1,219 @@
+# core/profiling.py
+
+"""
+Профилирование по команде админа: /profile — без передеплоя.
+
+    /profile          — следующие DEFAULT_UPDATES обновлений
+    /profile 50       — следующие 50 обновлений
+    /profile 30s      — следующие 30 секунд
+    /profile stop     — закончить досрочно
+
+На время замера включаются cProfile (поток event loop — хендлеры, PTB,
+сериализация) и tracemalloc (все потоки), по окончании админу приходят
+два файла: текстовый отчёт (топ функций и топ выделений памяти) и сырой
+профиль .prof для snakeviz/pstats. Счётчик обновлений — TypeHandler,
+который добавляется в приложение только на время замера, так что без
+профилирования накладных расходов нет совсем.
+
+Работа в потоках (SQLite, Google Sheets) в CPU-профиль не попадает —
+в нём видно время ожидания этих вызовов в хендлерах; память потоков
+tracemalloc учитывает.
+"""
+
+import io
+import time
+import asyncio
+import cProfile
+import logging
+import marshal
+import pstats
+import tracemalloc
+from datetime import datetime
+
+from telegram import Update
+from telegram.ext import Application, ContextTypes, TypeHandler
+
+from core.report import ADMIN_IDS
+from utils.metrics import track_handler
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_UPDATES = 20
+MAX_UPDATES     = 10_000
+MAX_SECONDS     = 15 * 60     # потолок замера (и страховка для режима «N обновлений»)
+TOP_FUNCTIONS   = 40
+TOP_ALLOCATIONS = 25
+TRACE_FRAMES    = 10          # глубина стека tracemalloc
+
+# после всех хендлеров: обновление засчитывается, когда оно уже обработано
+COUNTER_GROUP = 1_000_000
+
+_TRACE_FILTERS = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    tracemalloc.Filter(False, "<unknown>"),
+)
+
+
+class ProfileSession:
+    """Один замер: профайлеры, счётчик обновлений и таймер остановки."""
+
+    def __init__(self, app: Application, chat_id: int, updates: int | None, seconds: float):
+        self.app = app
+        self.chat_id = chat_id
+        self.updates = updates
+        self.seconds = seconds
+        self.seen = 0
+        self.started = 0.0
+        self.profiler = cProfile.Profile()
+        self.counter = TypeHandler(Update, self._count)
+        self._timer: asyncio.Task | None = None
+        self._stopping = False
+        self._own_tracemalloc = False
+
+    def start(self):
+        self._attach_counter()
+        # если tracemalloc уже включён (PYTHONTRACEMALLOC), не трогаем его
+        self._own_tracemalloc = not tracemalloc.is_tracing()
+        if self._own_tracemalloc:
+            tracemalloc.start(TRACE_FRAMES)
+        self.started = time.perf_counter()
+        self.profiler.enable()
+        self._timer = asyncio.get_running_loop().create_task(self._expire())
+
+    async def _count(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        self.seen += 1
+        if self.updates and self.seen >= self.updates:
+            await self.stop()
+
+    async def _expire(self):
+        await asyncio.sleep(self.seconds)
+        await self.stop()
+
+    async def stop(self):
+        """Останавливает замер и отправляет результаты (один раз)."""
+        global _session
+        if self._stopping:
+            return
+        self._stopping = True
+        self.profiler.disable()
+        elapsed = time.perf_counter() - self.started
+        snapshot = tracemalloc.take_snapshot()
+        traced, peak = tracemalloc.get_traced_memory()
+        if self._own_tracemalloc:
+            tracemalloc.stop()
+        self._detach_counter()
+        if self._timer is not None and self._timer is not asyncio.current_task():
+            self._timer.cancel()
+        _session = None
+
+        try:
+            report, raw = await asyncio.to_thread(
+                self._render, snapshot, elapsed, traced, peak
+            )
+            stamp = datetime.now().strftime("%d%m%Y_%H%M")
+            await self.app.bot.send_document(
+                self.chat_id, report, filename=f"profile_{stamp}.txt",
+                caption=f"⏱ Профиль: {self.seen} обновлений за {elapsed:.1f} с",
+            )
+            await self.app.bot.send_document(self.chat_id, raw, filename=f"profile_{stamp}.prof")
+        except Exception:
+            logger.exception("profile: не удалось отправить результаты")
+
+    # Счётчик ставится и снимается из хендлера, то есть посреди обхода
+    # app.handlers в process_update. add_handler/remove_handler добавляют
+    # и удаляют группу в этом же словаре (RuntimeError «dictionary changed
+    # size during iteration» роняет приём обновлений), поэтому словарь
+    # подменяется целиком: текущий обход доходит по старому.
+
+    def _attach_counter(self):
+        handlers = {g: list(h) for g, h in self.app.handlers.items()}
+        handlers.setdefault(COUNTER_GROUP, []).append(self.counter)
+        self.app.handlers = dict(sorted(handlers.items()))
+
+    def _detach_counter(self):
+        handlers = {g: list(h) for g, h in self.app.handlers.items()}
+        group = handlers.get(COUNTER_GROUP, [])
+        if self.counter in group:
+            group.remove(self.counter)
+        self.app.handlers = {g: h for g, h in handlers.items() if h}
+
+    def _render(self, snapshot: tracemalloc.Snapshot, elapsed: float,
+                traced: int, peak: int) -> tuple[bytes, bytes]:
+        out = io.StringIO()
+        out.write(
+            f"Профиль бота {datetime.now():%Y-%m-%d %H:%M:%S}\n"
+            f"Обновлений: {self.seen}, время: {elapsed:.2f} с\n"
+            f"tracemalloc: сейчас {traced / 2**20:.1f} MiB, пик {peak / 2**20:.1f} MiB\n\n"
+        )
+
+        # сырой профиль в формате pstats — как dump_stats, но в память;
+        # снимаем до pstats.Stats, который забирает profiler.stats себе
+        self.profiler.create_stats()
+        raw = marshal.dumps(self.profiler.stats)
+
+        stats = pstats.Stats(self.profiler, stream=out)
+        stats.strip_dirs()
+        out.write(f"=== CPU: топ {TOP_FUNCTIONS} по cumulative ===\n")
+        stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(TOP_FUNCTIONS)
+        out.write(f"=== CPU: топ {TOP_FUNCTIONS} по tottime ===\n")
+        stats.sort_stats(pstats.SortKey.TIME).print_stats(TOP_FUNCTIONS)
+
+        out.write(f"=== Память: топ {TOP_ALLOCATIONS} мест выделения ===\n")
+        top = snapshot.filter_traces(_TRACE_FILTERS).statistics("lineno")
+        for stat in top[:TOP_ALLOCATIONS]:
+            frame = stat.traceback[0]
+            out.write(f"{stat.size / 1024:10.1f} KiB {stat.count:8d} блоков  "
+                      f"{frame.filename}:{frame.lineno}\n")
+        return out.getvalue().encode("utf-8"), raw
+
+
+_session: ProfileSession | None = None
+
+
+def _parse_args(args: list[str]) -> tuple[int | None, float]:
+    """'' → N по умолчанию, '50' → 50 обновлений, '30s' → 30 секунд."""
+    if not args:
+        return DEFAULT_UPDATES, MAX_SECONDS
+    arg = args[0].lower()
+    if arg.endswith("s"):
+        seconds = float(arg[:-1])
+        if not 0 < seconds <= MAX_SECONDS:
+            raise ValueError(arg)
+        return None, seconds
+    updates = int(arg)
+    if not 0 < updates <= MAX_UPDATES:
+        raise ValueError(arg)
+    return updates, MAX_SECONDS
+
+
+@track_handler
+async def profile(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    global _session
+    if update.effective_user.id not in ADMIN_IDS:
+        return await update.message.reply_text("🚫 Команда только для администраторов.")
+
+    args = context.args or []
+    if args and args[0].lower() == "stop":
+        if _session is None:
+            return await update.message.reply_text("ℹ️ Профилирование не запущено.")
+        return await _session.stop()
+
+    if _session is not None:
+        return await update.message.reply_text(
+            "⏳ Профилирование уже идёт. Остановить: /profile stop"
+        )
+
+    try:
+        updates, seconds = _parse_args(args)
+    except ValueError:
+        return await update.message.reply_text(
+            f"📌 Формат: /profile [N обновлений, до {MAX_UPDATES} | Ts, до {MAX_SECONDS}s | stop]"
+        )
+
+    _session = ProfileSession(context.application, update.effective_chat.id, updates, seconds)
+    _session.start()
+    what = f"следующие {updates} обновлений" if updates else f"следующие {seconds:g} с"
+    logger.info("profile: запущен админом %s (%s)", update.effective_user.id, what)
+    await update.message.reply_text(f"🔬 Профилирую {what}. Результат пришлю файлом.")
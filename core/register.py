@@ -1,12 +1,14 @@
 # core/register.py
 
-import sqlite3
 from telegram import Update
 from telegram.ext import ContextTypes
-from core.sheets import add_user
-
-DB = "court_tracking.db"
+from core.outbox import notify
+from utils.db import run_write
+from utils.employees import directory
+from utils.metrics import track_handler
+from utils.storage import storage
 
+@track_handler
 async def register(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
     args = context.args
@@ -27,36 +29,28 @@ async def register(update: Update, context: ContextTypes.DEFAULT_TYPE):
     else:
         full_name = " ".join(args).strip()
 
-    # Сохраняем в SQLite
-    conn   = sqlite3.connect(DB)
-    cursor = conn.cursor()
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS employees (
-            user_id   INTEGER PRIMARY KEY,
-            full_name TEXT      NOT NULL
-        )
-    """)
-    conn.commit()
-
-    try:
-        cursor.execute(
-            "INSERT INTO employees (user_id, full_name) VALUES (?, ?)",
-            (user_id, full_name)
-        )
-        conn.commit()
-
-        # Добавляем в Google Sheets
-        add_user(full_name, user_id)
-
-        # Подтверждение
-        await update.message.reply_text(
-            f"✅ *Регистрация прошла успешно!*\nДобро пожаловать, *{full_name}*!",
-            parse_mode="Markdown"
-        )
-    except sqlite3.IntegrityError:
+    # Сохраняем в БД (таблицу создаёт init_db при старте), строка в лист
+    # «Пользователи» уходит через outbox
+    if not await run_write(_insert_employee, user_id, full_name):
         await update.message.reply_text(
             "⚠️ *Вы уже зарегистрированы.*",
             parse_mode="Markdown"
         )
-    finally:
-        conn.close()
+        return
+    directory.add(user_id, full_name)
+
+    # Подтверждение
+    await update.message.reply_text(
+        f"✅ *Регистрация прошла успешно!*\nДобро пожаловать, *{full_name}*!",
+        parse_mode="Markdown"
+    )
+
+
+def _insert_employee(user_id: int, full_name: str) -> bool:
+    """False — сотрудник с таким user_id уже есть."""
+    with storage.transaction() as s:
+        if not s.add_employee(user_id, full_name):
+            return False
+        s.enqueue("add_user", {"user_id": user_id, "full_name": full_name})
+    notify()
+    return True
@@ -1,15 +1,177 @@
 # core/report.py
 
+import os
+import atexit
+import shutil
+import asyncio
+import tempfile
+from collections import OrderedDict
 from telegram import Update
 from telegram.ext import ContextTypes
 from datetime import datetime
-import pandas as pd
-from io import BytesIO
 from core.sheets import get_trip_dataframe
+from utils.database import get_data_version, iter_trips_between
+from utils.db import run_read
+from utils.metrics import track_handler
 
 # ID админов, которые могут делать отчёт
 ADMIN_IDS = [414634622, 1745732977, 1010660322]
 
+# Источник данных отчёта: "sqlite" (по умолчанию) или "sheets" —
+# старый путь через лист «Поездки», оставлен как запасной
+REPORT_SOURCE = os.getenv("REPORT_SOURCE", "sqlite").lower()
+
+# Готовые отчёты: (start, end, версия данных) → (строк, путь к xlsx).
+# Версия меняется при любой правке trips/employees, поэтому устаревшая
+# запись просто перестаёт находиться и вытесняется по LRU. Сами файлы
+# лежат на диске (REPORT_CACHE_DIR или временный каталог процесса) и
+# удаляются при вытеснении: кэш не держит отчёты в памяти процесса.
+REPORT_CACHE_SIZE = 16
+REPORT_CACHE_DIR = os.getenv("REPORT_CACHE_DIR")
+_report_cache: OrderedDict[tuple, tuple[int, str | None]] = OrderedDict()
+_cache_dir: str | None = None
+# отчёты, которые сейчас собираются: повторный запрос ждёт ту же сборку
+_report_inflight: dict[tuple, asyncio.Future] = {}
+
+
+def load_trips_sheets(start_date: datetime | None, end_date: datetime | None):
+    """Запасной источник: весь лист «Поездки» с фильтрацией в памяти."""
+    import pandas as pd
+    df = get_trip_dataframe()
+    if df.empty:
+        return df
+
+    # в листе дата и время раздельно: собираем start/end целыми колонками
+    day = df["Дата"].astype(str) + " "
+    fmt = "%d.%m.%Y %H:%M"
+    start = pd.to_datetime(day + df["Начало поездки"].astype(str), format=fmt, errors="coerce")
+    end = pd.to_datetime(day + df["Конец поездки"].astype(str), format=fmt, errors="coerce")
+    # конец «после полуночи» — следующий день
+    end = end.where(~(end < start), end + pd.Timedelta(days=1))
+
+    df = pd.DataFrame({"ФИО": df["ФИО"], "Организация": df["Организация"],
+                       "start": start, "end": end})
+    date = df["start"].dt.normalize()
+    mask = pd.Series(True, index=df.index)
+    if start_date:
+        mask &= date >= start_date
+    if end_date:
+        mask &= date <= end_date
+    return df[mask]
+
+
+def build_report_file(start_date: datetime | None, end_date: datetime | None):
+    """
+    Отчёт за период во временный xlsx (см. trip_report_file).
+    Выполняется в пуле читателей: строки из БД идут пачками прямо в файл.
+    pandas/xlsxwriter импортируются здесь, а не при старте бота.
+    """
+    from core.report_builder import trip_report_file
+    if REPORT_SOURCE == "sheets":
+        df = load_trips_sheets(start_date, end_date)
+        chunks = [list(df.itertuples(index=False, name=None))] if not df.empty else []
+    else:
+        chunks = iter_trips_between(
+            start_date.date() if start_date else None,
+            end_date.date() if end_date else None,
+        )
+    return trip_report_file(chunks, "Отчёт")
+
+
+def _cache_dir_path() -> str:
+    """Каталог файлов кэша; временный удаляется при выходе."""
+    global _cache_dir
+    if _cache_dir is None:
+        if REPORT_CACHE_DIR:
+            os.makedirs(REPORT_CACHE_DIR, exist_ok=True)
+            _cache_dir = REPORT_CACHE_DIR
+        else:
+            _cache_dir = tempfile.mkdtemp(prefix="reports-")
+            atexit.register(shutil.rmtree, _cache_dir, True)
+    return _cache_dir
+
+
+def _build_report_path(start_date: datetime | None, end_date: datetime | None, directory: str):
+    """Отчёт в файл каталога кэша: (строк, путь); пустой отчёт — (0, None)."""
+    buf, rows = build_report_file(start_date, end_date)
+    with buf:
+        if not rows:
+            return rows, None
+        # копируется пачками: большой отчёт не поднимается в память целиком
+        with tempfile.NamedTemporaryFile(dir=directory, suffix=".xlsx", delete=False) as f:
+            shutil.copyfileobj(buf, f)
+        return rows, f.name
+
+
+def _discard(entry: tuple[int, str | None]):
+    path = entry[1]
+    if path:
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+
+
+def clear_report_cache():
+    """Сбрасывает готовые отчёты (бенчмарки, смена БД)."""
+    while _report_cache:
+        _discard(_report_cache.popitem()[1])
+
+
+async def _build_and_cache(key: tuple, start_date, end_date):
+    result = await run_read(_build_report_path, start_date, end_date, _cache_dir_path())
+    _report_cache[key] = result
+    while len(_report_cache) > REPORT_CACHE_SIZE:
+        _discard(_report_cache.popitem(last=False)[1])
+    return result
+
+
+async def get_report(start_date: datetime | None, end_date: datetime | None):
+    """
+    (число строк, путь к xlsx) за период. Повтор с теми же данными отдаётся
+    из кэша, одновременные одинаковые запросы делят одну сборку.
+    """
+    key = (start_date, end_date, await run_read(get_data_version))
+    if key in _report_cache:
+        _report_cache.move_to_end(key)
+        return _report_cache[key]
+
+    fut = _report_inflight.get(key)
+    if fut is None:
+        fut = asyncio.ensure_future(_build_and_cache(key, start_date, end_date))
+        _report_inflight[key] = fut
+        fut.add_done_callback(lambda _: _report_inflight.pop(key, None))
+    # shield: отмена одного ожидающего не прерывает сборку для остальных
+    return await asyncio.shield(fut)
+
+
+async def open_report(start_date: datetime | None, end_date: datetime | None):
+    """
+    (число строк, открытый на чтение xlsx или None). Файл закрывает вызывающий;
+    вытеснение из кэша открытый файл не портит.
+    Запасной источник Sheets не кэшируется: версию листа мы не знаем.
+    """
+    if REPORT_SOURCE == "sheets":
+        buf, rows = await run_read(build_report_file, start_date, end_date)
+        if not rows:
+            buf.close()
+            return rows, None
+        return rows, buf
+
+    while True:
+        rows, path = await get_report(start_date, end_date)
+        if path is None:
+            return rows, None
+        try:
+            return rows, open(path, "rb")
+        except FileNotFoundError:
+            # вытеснили, пока ждали сборку (или файл удалили снаружи) — собираем заново
+            for key, entry in list(_report_cache.items()):
+                if entry[1] == path:
+                    del _report_cache[key]
+
+
+@track_handler
 async def generate_report(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
     if user_id not in ADMIN_IDS:
@@ -28,61 +190,14 @@ async def generate_report(update: Update, context: ContextTypes.DEFAULT_TYPE):
     except ValueError:
         return await update.message.reply_text("📌 Формат: /report ДД.MM.ГГГГ [ДД.MM.ГГГГ]")
 
-    df = get_trip_dataframe()
-    if df.empty:
+    rows, data = await open_report(start_date, end_date)
+    if not rows:
+        if start_date or end_date:
+            return await update.message.reply_text("📭 Данных за указанный период нет.")
         return await update.message.reply_text("📭 Данных нет.")
 
-    # приводим «Дата» к datetime и отфильтровываем по диапазону
-    df["Дата"] = pd.to_datetime(df["Дата"], dayfirst=True, format="%d.%m.%Y", errors="coerce")
-    if start_date:
-        df = df[df["Дата"] >= start_date]
-    if end_date:
-        df = df[df["Дата"] <= end_date]
-
-    if df.empty:
-        return await update.message.reply_text("📭 Данных за указанный период нет.")
-
-    # рассчитываем продолжительность
-    def calc_duration(r):
-        s, e = r["Начало поездки"], r["Конец поездки"]
-        try:
-            ts = datetime.strptime(s, "%H:%M")
-            te = datetime.strptime(e, "%H:%M")
-        except:
-            return "-"
-        delta = te - ts
-        if delta.total_seconds() < 0:
-            delta += pd.Timedelta(days=1)
-        h, rem = divmod(int(delta.total_seconds()), 3600)
-        m, _ = divmod(rem, 60)
-        return f"{h:02d}:{m:02d}"
-
-    df["Продолжительность"] = df.apply(calc_duration, axis=1)
-
-    # Преобразуем дату в строку dd.mm.YYYY
-    df["Дата"] = df["Дата"].dt.strftime("%d.%m.%Y")
-
-    # Формируем итоговую таблицу
-    final = df[[
-        "ФИО",
-        "Организация",
-        "Дата",
-        "Начало поездки",
-        "Конец поездки",
-        "Продолжительность"
-    ]]
-
-    # Записываем в Excel
-    buf = BytesIO()
-    with pd.ExcelWriter(buf, engine="xlsxwriter") as writer:
-        final.to_excel(writer, index=False, sheet_name="Отчёт")
-        ws = writer.sheets["Отчёт"]
-        for idx, col in enumerate(final.columns):
-            width = max(final[col].astype(str).map(len).max(), len(col)) + 2
-            ws.set_column(idx, idx, width)
-    buf.seek(0)
-
     # Отправляем файл отчёта за весь период или указанный пользователем
     fname = f"report_{datetime.now().strftime('%d%m%Y_%H%M')}.xlsx"
-    await update.message.reply_document(document=buf, filename=fname)
+    with data:
+        await update.message.reply_document(document=data, filename=fname)
     await update.message.reply_text("📄 Готово.")
@@ -0,0 +1,189 @@
+# core/report_builder.py
+
+"""
+Сборка табличных отчётов по поездкам.
+
+Общая часть для /report, календаря (core/calendar.py) и
+scripts/export_report.py: сдвиг начала к рабочему дню, продолжительность,
+форматирование дат/времени и запись в Excel с автошириной колонок.
+Всё считается целыми колонками pandas/NumPy, без apply и strptime
+на каждую строку — на истории в сотни тысяч поездок это секунды, а не минуты.
+Длинные выгрузки пишутся потоково (write_excel_stream / trip_report_file):
+пачки строк из курсора сразу уходят в xlsx, память не растёт с историей.
+"""
+
+from collections.abc import Iterable, Iterator
+from tempfile import SpooledTemporaryFile
+
+import numpy as np
+import pandas as pd
+import xlsxwriter
+
+REPORT_COLUMNS = [
+    "ФИО",
+    "Организация",
+    "Дата",
+    "Начало поездки",
+    "Конец поездки",
+    "Продолжительность",
+]
+
+WORKDAY_START_HOUR = 9
+
+SPOOL_MAX_BYTES = 8 * 1024 * 1024   # готовый xlsx до этого размера не трогает диск
+
+
+def clip_to_workday(start: pd.Series) -> pd.Series:
+    """Начало раньше 09:00 сдвигается на 09:00 того же дня."""
+    day_start = start.dt.normalize() + pd.Timedelta(hours=WORKDAY_START_HOUR)
+    return start.where(~(start < day_start), day_start)
+
+
+# готовые строки 'ЧЧ:ММ' для минут суток: strftime на каждую строку в разы медленнее
+_HHMM = np.array([f"{m // 60:02d}:{m % 60:02d}" for m in range(24 * 60)], dtype=object)
+
+
+def _hhmm(minutes: np.ndarray) -> np.ndarray:
+    """Минуты → 'ЧЧ:ММ' через таблицу; больше суток — арифметикой строк."""
+    out = np.empty(len(minutes), dtype=object)
+    small = minutes < len(_HHMM)
+    out[small] = _HHMM[minutes[small]]
+    if not small.all():
+        big = pd.Series(minutes[~small])
+        out[~small] = ((big // 60).astype(str).str.zfill(2) + ":"
+                       + (big % 60).astype(str).str.zfill(2)).to_numpy()
+    return out
+
+
+def _fill(index: pd.Index, valid: pd.Series, values: np.ndarray, missing: str) -> pd.Series:
+    out = pd.Series(missing, index=index, dtype=object)
+    out[valid] = values
+    return out
+
+
+def format_date(ts: pd.Series, missing: str = "") -> pd.Series:
+    """datetime → 'ДД.ММ.ГГГГ'; strftime только по уникальным дням."""
+    days = ts.dt.normalize()
+    unique = pd.DatetimeIndex(days.dropna().unique())
+    return days.map(pd.Series(unique.strftime("%d.%m.%Y"), index=unique)).fillna(missing)
+
+
+def format_time(ts: pd.Series, missing: str = "") -> pd.Series:
+    """datetime → 'ЧЧ:ММ'."""
+    valid = ts.notna()
+    minutes = (ts.dt.hour * 60 + ts.dt.minute)[valid].to_numpy(dtype=np.int64)
+    return _fill(ts.index, valid, _hhmm(minutes), missing)
+
+
+def format_duration(delta: pd.Series, missing: str = "-") -> pd.Series:
+    """Timedelta → 'ЧЧ:ММ' (часы могут быть больше 24); пусто/отрицательно → missing."""
+    valid = delta.notna() & (delta >= pd.Timedelta(0))
+    minutes = (delta[valid] // pd.Timedelta(minutes=1)).to_numpy(dtype=np.int64)
+    return _fill(delta.index, valid, _hhmm(minutes), missing)
+
+
+def build_trip_report(
+    trips: pd.DataFrame,
+    clip_start: bool = False,
+    open_end: str = "",
+) -> pd.DataFrame:
+    """
+    Итоговая таблица отчёта из колонок ФИО, Организация, start, end
+    (datetime; end пустой у незавершённых поездок).
+
+    clip_start — сдвигать ли начало к 09:00; open_end — что писать
+    в «Конец поездки», пока поездка не закрыта.
+    """
+    start = pd.to_datetime(trips["start"])
+    end = pd.to_datetime(trips["end"])
+    if clip_start:
+        start = clip_to_workday(start)
+
+    return pd.DataFrame({
+        "ФИО":               trips["ФИО"],
+        "Организация":       trips["Организация"],
+        "Дата":              format_date(start),
+        "Начало поездки":    format_time(start),
+        "Конец поездки":     format_time(end, missing=open_end),
+        "Продолжительность": format_duration(end - start),
+    }, columns=REPORT_COLUMNS)
+
+
+def _longest(df: pd.DataFrame) -> list[int]:
+    """Длина самого длинного значения в каждой колонке."""
+    return [
+        int(df[col].astype(str).str.len().max()) if len(df) else 0
+        for col in df.columns
+    ]
+
+
+def column_widths(df: pd.DataFrame, padding: int = 2) -> list[int]:
+    """Ширина колонок Excel: длина самого длинного значения или заголовка + padding."""
+    return [
+        max(longest, len(str(col))) + padding
+        for col, longest in zip(df.columns, _longest(df))
+    ]
+
+
+def write_excel(df: pd.DataFrame, target, sheet_name: str):
+    """Пишет df в xlsx (путь или файловый объект) с подобранной шириной колонок."""
+    with pd.ExcelWriter(target, engine="xlsxwriter") as writer:
+        df.to_excel(writer, sheet_name=sheet_name, index=False)
+        ws = writer.sheets[sheet_name]
+        for idx, width in enumerate(column_widths(df)):
+            ws.set_column(idx, idx, width)
+
+
+def write_excel_stream(frames: Iterable[pd.DataFrame], target, sheet_name: str,
+                       columns: list[str], padding: int = 2) -> int:
+    """
+    Потоковая запись в xlsx: строки из пачек frames уходят на диск сразу
+    (constant_memory у xlsxwriter), в памяти только текущая пачка.
+    Ширина колонок копится по ходу и выставляется в конце.
+    Возвращает число записанных строк данных.
+    """
+    workbook = xlsxwriter.Workbook(target, {"constant_memory": True})
+    ws = workbook.add_worksheet(sheet_name)
+    ws.write_row(0, 0, columns)
+    widths = [len(col) for col in columns]
+    row = 0
+    for df in frames:
+        for values in df[columns].itertuples(index=False, name=None):
+            row += 1
+            ws.write_row(row, 0, values)
+        widths = [max(w, longest) for w, longest in zip(widths, _longest(df[columns]))]
+    for idx, width in enumerate(widths):
+        ws.set_column(idx, idx, width + padding)
+    workbook.close()
+    return row
+
+
+def trip_report_frames(chunks: Iterable[list[tuple]], clip_start: bool = False,
+                       open_end: str = "") -> Iterator[pd.DataFrame]:
+    """Пачки строк (ФИО, Организация, start, end) → пачки готовой таблицы отчёта."""
+    for rows in chunks:
+        yield build_trip_report(
+            pd.DataFrame(rows, columns=["ФИО", "Организация", "start", "end"]),
+            clip_start=clip_start,
+            open_end=open_end,
+        )
+
+
+def trip_report_file(chunks: Iterable[list[tuple]], sheet_name: str,
+                     clip_start: bool = False, open_end: str = ""):
+    """
+    Отчёт по поездкам из пачек строк — например, из курсора SQLite через
+    utils.db.iter_chunks — во временный файл: до SPOOL_MAX_BYTES в памяти,
+    дальше на диске. Возвращает (файл, открытый на чтение с начала, число строк).
+    """
+    buf = SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES)
+    try:
+        count = write_excel_stream(
+            trip_report_frames(chunks, clip_start, open_end),
+            buf, sheet_name, REPORT_COLUMNS,
+        )
+    except BaseException:
+        buf.close()
+        raise
+    buf.seek(0)
+    return buf, count
@@ -0,0 +1,243 @@
+# core/sheet_mirror.py
+
+"""
+Локальная копия листа Google Sheets в SQLite.
+
+Лист «Поездки» почти только дописывается, поэтому вместо полного
+get_all_records() на каждое чтение храним его строки в таблице sheet_rows
+и помним, сколько строк уже забрали (sheet_sync.synced_rows):
+- sync() догружает только новые строки одним ranged get (A{n+1}:F);
+- verify_recent() сверяет хэш последних CHECK_ROWS строк с листом и
+  переносит правки, сделанные руками; если лист укоротился (строки удалены),
+  зеркало перечитывается целиком;
+- наши собственные записи (append, дополнение E:F) кладутся в зеркало сразу
+  (write-through), без повторного чтения.
+
+Методы зеркала вызываются из фоновых потоков (outbox, планировщик, отчёт
+из листа); запись в SQLite при этом идёт через поток-писатель
+(utils.db.call_write), а функции, которые он выполняет, замок зеркала
+не берут.
+"""
+
+import json
+import hashlib
+import logging
+import threading
+import time
+from collections.abc import Callable
+
+import gspread
+
+from utils.db import call_write, get_connection, transaction
+
+logger = logging.getLogger(__name__)
+
+
+def _trim(values: list) -> list[str]:
+    """Строка листа без хвостовых пустых ячеек — так её отдаёт API."""
+    values = ["" if v is None else str(v) for v in values]
+    while values and values[-1] == "":
+        values.pop()
+    return values
+
+
+def _digest(rows: list[list[str]]) -> str:
+    return hashlib.sha1(json.dumps(rows, ensure_ascii=False).encode()).hexdigest()
+
+
+class SheetMirror:
+    """Зеркало одного листа: первая строка — заголовок, дальше данные."""
+
+    CHECK_ROWS = 200   # сколько последних строк сверяем в verify_recent
+    MAX_AGE    = 60    # сек.: чтение более старого зеркала сначала вызывает sync()
+
+    def __init__(self, title: str, last_col: str,
+                 open_sheet: Callable[[], gspread.Worksheet]):
+        self.title = title
+        self.last_col = last_col
+        self._open_sheet = open_sheet
+        self._lock = threading.RLock()
+
+    # --- состояние ---------------------------------------------------------
+
+    def _state(self) -> tuple[int, float]:
+        row = get_connection().execute(
+            "SELECT synced_rows, synced_at FROM sheet_sync WHERE sheet = ?",
+            (self.title,)
+        ).fetchone()
+        return (row[0], row[1]) if row else (0, 0.0)
+
+    def _store(self, conn, first_row: int, rows: list[list]):
+        conn.executemany(
+            "INSERT OR REPLACE INTO sheet_rows (sheet, row, data) VALUES (?, ?, ?)",
+            [
+                (self.title, first_row + i, json.dumps(_trim(values), ensure_ascii=False))
+                for i, values in enumerate(rows)
+            ]
+        )
+
+    def _set_state(self, conn, synced_rows: int, synced_at: float | None = None):
+        conn.execute("INSERT OR IGNORE INTO sheet_sync (sheet) VALUES (?)", (self.title,))
+        conn.execute(
+            "UPDATE sheet_sync SET synced_rows = ?, synced_at = COALESCE(?, synced_at) "
+            "WHERE sheet = ?",
+            (synced_rows, synced_at, self.title)
+        )
+
+    def _local_rows(self, first: int, last: int) -> list[list[str]]:
+        found = dict(get_connection().execute(
+            "SELECT row, data FROM sheet_rows WHERE sheet = ? AND row BETWEEN ? AND ?",
+            (self.title, first, last)
+        ).fetchall())
+        return [json.loads(found[r]) if r in found else [] for r in range(first, last + 1)]
+
+    # --- синхронизация с листом ---------------------------------------------
+
+    def sync(self) -> int:
+        """Догружает строки, появившиеся после synced_rows. Возвращает их число."""
+        with self._lock:
+            synced, _ = self._state()
+            try:
+                rows = self._open_sheet().get(f"A{synced + 1}:{self.last_col}")
+            except gspread.exceptions.APIError as e:
+                # данные доходят до конца сетки листа — новых строк нет
+                if "exceeds grid limits" not in str(e):
+                    raise
+                rows = []
+            call_write(self._save_rows, synced + 1, rows, synced + len(rows), time.time())
+            if rows:
+                logger.info("sheet_mirror: %s — догружено %d строк (всего %d)",
+                            self.title, len(rows), synced + len(rows))
+            return len(rows)
+
+    def resync(self):
+        """Полная перезагрузка зеркала (лист укоротился или перестроен)."""
+        with self._lock:
+            call_write(self._clear)
+            self.sync()
+
+    def verify_recent(self) -> int:
+        """
+        Сверяет последние CHECK_ROWS строк с листом по хэшу и переносит
+        расхождения. Возвращает число исправленных строк.
+        """
+        with self._lock:
+            synced, _ = self._state()
+            if not synced:
+                return 0
+            first = max(1, synced - self.CHECK_ROWS + 1)
+            local = self._local_rows(first, synced)
+            remote = [_trim(r) for r in self._open_sheet().get(f"A{first}:{self.last_col}{synced}")]
+            # API не отдаёт хвостовые пустые строки
+            remote += [[]] * (len(local) - len(remote))
+            if _digest(remote) == _digest(local):
+                return 0
+
+            # строки пропали с конца — вероятно, удаление со сдвигом: перечитываем всё
+            if not remote[-1] and local[-1]:
+                logger.warning("sheet_mirror: %s укоротился, полная перезагрузка", self.title)
+                self.resync()
+                return len(local)
+
+            changed = [
+                (first + i, r) for i, (r, l) in enumerate(zip(remote, local)) if r != l
+            ]
+            call_write(self._save_changed, changed)
+            logger.info("sheet_mirror: %s — перенесено %d правок", self.title, len(changed))
+            return len(changed)
+
+    def refresh(self):
+        """Плановое обновление: новые строки + сверка хвоста."""
+        self.sync()
+        self.verify_recent()
+
+    # --- запись наших изменений (write-through) ------------------------------
+
+    def put_rows(self, first_row: int, rows: list[list]):
+        """Строки, только что записанные в лист нами (append_row(s))."""
+        with self._lock:
+            call_write(self._put_rows, first_row, rows)
+
+    def put_cells(self, row: int, first_col: int, values: list):
+        """Ячейки строки row начиная с колонки first_col (0 — колонка A)."""
+        with self._lock:
+            call_write(self._put_cells, row, first_col, values)
+
+    # --- записи в SQLite (выполняются в потоке-писателе) ----------------------
+
+    def _save_rows(self, first_row: int, rows: list[list], synced_rows: int, synced_at: float):
+        with transaction() as conn:
+            self._store(conn, first_row, rows)
+            self._set_state(conn, synced_rows, synced_at)
+
+    def _save_changed(self, changed: list[tuple[int, list[str]]]):
+        with transaction() as conn:
+            for row, values in changed:
+                self._store(conn, row, [values])
+
+    def _clear(self):
+        with transaction() as conn:
+            conn.execute("DELETE FROM sheet_rows WHERE sheet = ?", (self.title,))
+            self._set_state(conn, 0)
+
+    def _put_rows(self, first_row: int, rows: list[list]):
+        with transaction() as conn:
+            synced, _ = self._state()
+            self._store(conn, first_row, rows)
+            # двигаем счётчик, только если между ними нет чужих строк
+            last_row = first_row + len(rows) - 1
+            if first_row <= synced + 1 and last_row > synced:
+                self._set_state(conn, last_row)
+
+    def _put_cells(self, row: int, first_col: int, values: list):
+        with transaction() as conn:
+            current = self._local_rows(row, row)[0]
+            current += [""] * (first_col + len(values) - len(current))
+            current[first_col:first_col + len(values)] = values
+            self._store(conn, row, [current])
+
+    # --- чтение ------------------------------------------------------------
+
+    def recent_records(self, count: int) -> list[tuple[int, dict]]:
+        """Последние count строк данных копии как (номер строки, {заголовок: значение}); без sync."""
+        synced, _ = self._state()
+        if synced < 2:
+            return []
+        header = self._local_rows(1, 1)[0]
+        first = max(2, synced - count + 1)
+        return [
+            (first + i, dict(zip(header, values + [""] * (len(header) - len(values)))))
+            for i, values in enumerate(self._local_rows(first, synced))
+        ]
+
+    def records(self, max_age: float | None = None) -> list[tuple[int, dict]]:
+        """
+        Строки данных как (номер строки, {заголовок: значение}) — аналог
+        get_all_records() с номерами строк. Если зеркало старше max_age
+        (по умолчанию MAX_AGE), сначала догружает новые строки.
+        """
+        max_age = self.MAX_AGE if max_age is None else max_age
+        _, synced_at = self._state()
+        if time.time() - synced_at > max_age:
+            try:
+                self.sync()
+            except Exception as e:
+                logger.warning("sheet_mirror: %s — не удалось догрузить, читаем копию: %s",
+                               self.title, e)
+
+        rows = get_connection().execute(
+            "SELECT row, data FROM sheet_rows WHERE sheet = ? ORDER BY row",
+            (self.title,)
+        ).fetchall()
+        if not rows or rows[0][0] != 1:
+            return []
+        header = json.loads(rows[0][1])
+        result = []
+        for row, data in rows[1:]:
+            values = json.loads(data)
+            values += [""] * (len(header) - len(values))
+            result.append((row, dict(zip(header, values))))
+        # как get_all_records: хвостовые пустые строки не считаются
+        while result and not any(result[-1][1].values()):
+            result.pop()
+        return result
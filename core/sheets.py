@@ -1,111 +1,366 @@
 # core/sheets.py
 
 import os
+import re
 import json
+import time
+import logging
+import threading
+import functools
 import gspread
-import pandas as pd
 from oauth2client.service_account import ServiceAccountCredentials
-from datetime import datetime, timedelta
+from requests.adapters import HTTPAdapter
+from datetime import datetime, timedelta, timezone
 from dotenv import load_dotenv
 
+from core.sheet_mirror import SheetMirror
+from utils.metrics import SHEETS_ERRORS, SHEETS_SECONDS
+
+logger = logging.getLogger(__name__)
+
 # Подгружаем .env
 load_dotenv()
 GOOGLE_SHEETS_JSON = os.getenv("GOOGLE_SHEETS_JSON")
 SPREADSHEET_ID     = os.getenv("SPREADSHEET_ID")
-if not GOOGLE_SHEETS_JSON or not SPREADSHEET_ID:
-    raise ValueError("Не заданы GOOGLE_SHEETS_JSON или SPREADSHEET_ID в .env")
 
-# Авторизация в Google Sheets
-creds_dict = json.loads(GOOGLE_SHEETS_JSON)
-scope = [
+SCOPE = [
     "https://www.googleapis.com/auth/spreadsheets",
     "https://www.googleapis.com/auth/drive"
 ]
-creds = ServiceAccountCredentials.from_json_keyfile_dict(creds_dict, scope)
-client = gspread.authorize(creds)
+
+
+class SheetsSession:
+    """
+    Долгоживущая сессия Google Sheets: один авторизованный клиент,
+    одно keep-alive HTTP-соединение, кэш открытых листов и фоновое
+    обновление access token'а до его истечения.
+
+    Авторизация откладывается до первого обращения (или до прогрева
+    в фоновом потоке, см. start_background_refresh), так что импорт
+    модуля ничего не стоит и не падает без настроек.
+    """
+
+    REFRESH_MARGIN = 5 * 60   # сек. до истечения токена, когда обновляем
+    POOL_SIZE      = 8        # соединений в пуле (outbox, отчёты, sync)
+
+    def __init__(self, creds_json: str, spreadsheet_id: str):
+        self._creds_json = creds_json
+        self._spreadsheet_id = spreadsheet_id
+        self._lock = threading.RLock()
+        self._client = None
+        self._spreadsheet = None
+        self._worksheets: dict[str, gspread.Worksheet] = {}
+        self._stop = threading.Event()
+        self._refresher: threading.Thread | None = None
+
+    @property
+    def client(self) -> gspread.Client:
+        with self._lock:
+            if self._client is None:
+                if not self._creds_json or not self._spreadsheet_id:
+                    raise ValueError("Не заданы GOOGLE_SHEETS_JSON или SPREADSHEET_ID в .env")
+                creds = ServiceAccountCredentials.from_json_keyfile_dict(
+                    json.loads(self._creds_json), SCOPE
+                )
+                client = gspread.authorize(creds)
+                # переиспользуем TCP/TLS-соединения между запросами
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.POOL_SIZE)
+                client.http_client.session.mount("https://", adapter)
+                self._client = client
+            return self._client
+
+    def spreadsheet(self) -> gspread.Spreadsheet:
+        with self._lock:
+            if self._spreadsheet is None:
+                self._spreadsheet = self.client.open_by_key(self._spreadsheet_id)
+            return self._spreadsheet
+
+    def worksheet(self, name: str = None) -> gspread.Worksheet:
+        """Лист по имени (None — первый лист) из кэша открытых листов."""
+        with self._lock:
+            if name not in self._worksheets:
+                # кэш пуст или лист создан после загрузки — перечитываем список
+                self._load_worksheets()
+            try:
+                return self._worksheets[name]
+            except KeyError:
+                raise gspread.exceptions.WorksheetNotFound(name) from None
+
+    def _load_worksheets(self):
+        self._worksheets = {}
+        for i, ws in enumerate(self.spreadsheet().worksheets()):
+            self._worksheets.setdefault(ws.title, ws)
+            if i == 0:
+                self._worksheets[None] = ws
+
+    def invalidate(self):
+        """Сбрасывает кэш листов (лист удалён/переименован)."""
+        with self._lock:
+            self._spreadsheet = None
+            self._worksheets.clear()
+
+    # --- проактивное обновление токена ---------------------------------------
+
+    def _seconds_until_refresh(self) -> float:
+        auth = self.client.http_client.auth
+        if not auth.token or auth.expiry is None:
+            return 0
+        now = datetime.now(timezone.utc).replace(tzinfo=None)  # expiry — naive UTC
+        return (auth.expiry - now).total_seconds() - self.REFRESH_MARGIN
+
+    def configured(self) -> bool:
+        return bool(self._creds_json and self._spreadsheet_id)
+
+    def warm_up(self):
+        """Авторизация и список листов заранее, до первого запроса пользователя."""
+        with self._lock:
+            if not self._worksheets:
+                self._load_worksheets()
+
+    def _refresh_loop(self):
+        try:
+            self.warm_up()
+            logger.info("sheets: сессия готова")
+        except Exception as e:
+            logger.warning("sheets: прогрев не удался, попробуем при первом запросе: %s", e)
+        while not self._stop.is_set():
+            wait = self._seconds_until_refresh()
+            if wait <= 0:
+                try:
+                    self.client.http_client.login()
+                    logger.info("sheets: access token обновлён")
+                    continue
+                except Exception as e:
+                    logger.warning("sheets: не удалось обновить токен: %s", e)
+                    wait = 60
+            self._stop.wait(min(wait, 10 * 60))
+
+    def start_background_refresh(self):
+        """
+        Фоновый поток: сначала прогревает сессию (параллельно со стартом
+        бота), затем обновляет токен заранее, а не посреди запроса.
+        """
+        if not self.configured():
+            logger.warning("sheets: GOOGLE_SHEETS_JSON/SPREADSHEET_ID не заданы, "
+                           "Google Sheets недоступен")
+            return
+        if self._refresher is None or not self._refresher.is_alive():
+            self._stop.clear()
+            self._refresher = threading.Thread(
+                target=self._refresh_loop, daemon=True, name="SheetsTokenRefresh"
+            )
+            self._refresher.start()
+
+    def stop(self):
+        self._stop.set()
+
+
+session = SheetsSession(GOOGLE_SHEETS_JSON, SPREADSHEET_ID)
 
 def _open_sheet(name: str = None):
-    ss = client.open_by_key(SPREADSHEET_ID)
-    return ss.worksheet(name) if name else ss.sheet1
+    return session.worksheet(name)
+
+# локальная копия «Поездок»: чтения идут из SQLite, а не из API
+trips_mirror = SheetMirror("Поездки", "F", lambda: _open_sheet("Поездки"))
+
+def _is_stale_handle(e: gspread.exceptions.APIError) -> bool:
+    msg = str(e)
+    return "Unable to parse range" in msg or "No grid with id" in msg
+
+def _retry_on_stale(func):
+    """
+    Если закэшированный лист пропал/переименован — сбросить кэш и повторить.
+    Заодно считает вызовы, ошибки и время (bot_sheets_* в /metrics).
+    """
+    name = func.__name__
 
-def add_user(full_name: str, user_id: int):
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            try:
+                return func(*args, **kwargs)
+            except gspread.exceptions.APIError as e:
+                if not _is_stale_handle(e):
+                    raise
+                logger.warning("sheets: кэш листов устарел (%s), перечитываем", e)
+                session.invalidate()
+                return func(*args, **kwargs)
+        except Exception:
+            SHEETS_ERRORS.inc(function=name)
+            raise
+        finally:
+            SHEETS_SECONDS.observe(time.perf_counter() - start, function=name)
+    return wrapper
+
+_RANGE_ROWS = re.compile(r"![A-Z]+(\d+)(?::[A-Z]+(\d+))?$")
+
+def _appended_rows(response: dict) -> list[int]:
+    """Номера строк, которые занял append_row(s), из ответа API (updatedRange)."""
+    rng = response.get("updates", {}).get("updatedRange", "")
+    m = _RANGE_ROWS.search(rng)
+    if not m:
+        return []
+    first = int(m.group(1))
+    last = int(m.group(2) or first)
+    return list(range(first, last + 1))
+
+def _duration_str(duration: timedelta) -> str:
+    secs = int(duration.total_seconds())
+    h, rem = divmod(secs, 3600)
+    m, s = divmod(rem, 60)
+    return f"{h}:{m:02d}" + (f":{s:02d}" if s else "")
+
+@_retry_on_stale
+def add_users(users: list[tuple[str, int]]):
+    """Дописывает сотрудников (ФИО, user_id) одним запросом (для очереди outbox)."""
+    if not users:
+        return
     try:
         sheet = _open_sheet("Пользователи")
     except gspread.exceptions.WorksheetNotFound:
         sheet = _open_sheet()
-    sheet.append_row([full_name, str(user_id)], value_input_option="USER_ENTERED")
-    print(f"[sheets] add_user: {full_name}, {user_id}")
+    sheet.append_rows([[full_name, str(user_id)] for full_name, user_id in users],
+                      value_input_option="USER_ENTERED")
+    logger.info("sheets: add_users %d строк", len(users))
 
-def add_trip(full_name: str, org_name: str, start_dt: datetime):
-    sheet = _open_sheet("Поездки")
-    date_str = start_dt.strftime("%d.%m.%Y")
-    time_str = start_dt.strftime("%H:%M")
-    sheet.append_row(
-        [full_name, org_name, date_str, time_str, "", ""],
-        value_input_option="USER_ENTERED"
-    )
-    print(f"[sheets] add_trip: {full_name}, {org_name}, {date_str} {time_str}")
-
-def end_trip_in_sheet(
-    full_name: str,
-    org_name:   str,
-    start_dt:   datetime,
-    end_dt:     datetime,
-    duration:   timedelta
-):
+@_retry_on_stale
+def add_trips(trips: list[tuple[str, str, datetime]]) -> list[int]:
     """
-    Находит последнюю (по времени) незавершённую поездку этого пользователя
-    с тем же org и date, и дополняет её.
+    Добавляет несколько поездок одним запросом (для очереди outbox).
+    Возвращает номера занятых строк в том же порядке.
     """
+    if not trips:
+        return []
     sheet = _open_sheet("Поездки")
-    records = sheet.get_all_records()  # список словарей без заголовка
+    values = [
+        [full_name, org_name, start_dt.strftime("%d.%m.%Y"), start_dt.strftime("%H:%M"), "", ""]
+        for full_name, org_name, start_dt in trips
+    ]
+    resp = sheet.append_rows(values, value_input_option="USER_ENTERED")
+    rows = _appended_rows(resp)
+    if len(rows) != len(trips):
+        # строки в листе уже есть, но чьи — неизвестно: повтор outbox найдёт
+        # их в зеркале (find_trip_rows), а не допишет второй раз
+        logger.error("sheets: add_trips — %d строк, а в ответе %r",
+                     len(trips), resp.get("updates", {}).get("updatedRange"))
+        raise RuntimeError(f"add_trips: ответ API не совпал с числом строк ({len(trips)})")
+    trips_mirror.put_rows(rows[0], values)
+    logger.info("sheets: add_trips %d строк → rows %s", len(trips), rows)
+    return rows
 
-    date_str = start_dt.strftime("%d.%m.%Y")
-    end_str = end_dt.strftime("%H:%M")
-    secs = int(duration.total_seconds())
-    h, rem = divmod(secs, 3600)
-    m, s = divmod(rem, 60)
-    dur_str = f"{h}:{m:02d}" + (f":{s:02d}" if s else "")
+RESUME_ROWS = 500   # сколько последних строк «Поездок» смотрит find_trip_rows
 
-    total = len(records)
+def find_trip_rows(trips: list[tuple[str, str, datetime]]) -> list[int | None]:
+    """
+    Строки, которые поездки уже занимают в листе, — для повтора add_trips
+    после сбоя: запрос мог дойти до листа, а номера строк не записаться.
+    Догружает копию листа и ищет с конца незавершённую строку с теми же
+    ФИО, организацией, датой и временем начала. None — строки нет.
+    """
+    trips_mirror.sync()
+    records = trips_mirror.recent_records(RESUME_ROWS)
+    found, taken = [], set()
+    for full_name, org_name, start_dt in trips:
+        date_str, time_str = start_dt.strftime("%d.%m.%Y"), start_dt.strftime("%H:%M")
+        row = next((
+            idx for idx, rec in reversed(records)
+            if idx not in taken
+            and rec.get("ФИО") == full_name
+            and rec.get("Организация") == org_name
+            and rec.get("Дата") == date_str
+            and rec.get("Начало поездки") == time_str
+            and not rec.get("Конец поездки")
+        ), None)
+        if row:
+            taken.add(row)
+        found.append(row)
+    return found
 
-    # Перебираем с конца: rev_idx=0 для самой свежей записи
-    for rev_idx, row in enumerate(reversed(records)):
-        idx = total + 1 - rev_idx  # реальный номер строки в таблице
+def _find_open_row(records, full_name: str, org_name: str, start_dt: datetime,
+                   taken: set[int]) -> int | None:
+    """Последняя незавершённая поездка пользователя с тем же org и date."""
+    date_str = start_dt.strftime("%d.%m.%Y")
+    for idx, rec in reversed(records):
         if (
-            row.get("ФИО") == full_name and
-            row.get("Организация") == org_name and
-            row.get("Дата") == date_str and
-            not row.get("Конец поездки")
+            idx not in taken and
+            rec.get("ФИО") == full_name and
+            rec.get("Организация") == org_name and
+            rec.get("Дата") == date_str and
+            not rec.get("Конец поездки")
         ):
-            sheet.update_cell(idx, 5, end_str)
-            sheet.update_cell(idx, 6, dur_str)
-            print(f"[sheets] end_trip_in_sheet: updated row {idx} → end={end_str}, dur={dur_str}")
-            return
+            return idx
+    return None
 
-    print(f"[sheets] WARN: Не найдена открытая поездка для {full_name} в {org_name} {date_str}")
+@_retry_on_stale
+def end_trips_in_sheet(trips: list[tuple[str, str, datetime, datetime, timedelta, int | None]]):
+    """
+    Дополняет строки поездок временем окончания и длительностью —
+    все одним batch_update. Элементы: (ФИО, организация, начало, конец,
+    длительность, номер строки). Если номер строки известен (сохранён
+    при add_trips) — лист не читается. Иначе (старые поездки) строка
+    ищется в локальной копии листа (trips_mirror), тоже без скачивания.
+    """
+    data, cells, taken = [], [], set()
+    records = None
+    for full_name, org_name, start_dt, end_dt, duration, row in trips:
+        if not row:
+            if records is None:
+                records = trips_mirror.records()
+            row = _find_open_row(records, full_name, org_name, start_dt, taken)
+            if not row:
+                logger.warning("sheets: не найдена открытая поездка для %s в %s %s",
+                               full_name, org_name, start_dt.strftime('%d.%m.%Y'))
+                continue
+        taken.add(row)
+        values = [end_dt.strftime("%H:%M"), _duration_str(duration)]
+        data.append({"range": f"E{row}:F{row}", "values": [values]})
+        cells.append((row, values))
 
-def add_plan(full_name: str, org_name: str, plan_date: datetime.date, plan_time: str):
-    sheet = _open_sheet("Календарь")
-    date_str = plan_date.strftime("%d.%m.%Y")
-    rows = sheet.get_all_values()
-    for idx, row in enumerate(rows[1:], start=2):
-        try:
-            cell_date = datetime.strptime(row[0], "%d.%m.%Y").date()
-        except:
-            continue
-        if cell_date > plan_date:
-            sheet.insert_row([date_str, full_name, org_name, plan_time], idx)
-            return
-    sheet.append_row(
-        [date_str, full_name, org_name, plan_time],
-        value_input_option="USER_ENTERED"
-    )
+    if not data:
+        return
+    _open_sheet("Поездки").batch_update(data, value_input_option="USER_ENTERED")
+    for row, values in cells:
+        trips_mirror.put_cells(row, 4, values)
+    logger.info("sheets: end_trips_in_sheet, строки %s", [row for row, _ in cells])
 
-def get_trip_dataframe() -> pd.DataFrame:
-    sheet = _open_sheet("Поездки")
-    return pd.DataFrame(sheet.get_all_records())
+@_retry_on_stale
+def get_calendar_values() -> list[list[str]]:
+    """Весь лист «Календарь» как есть (для разового импорта в plans)."""
+    return _open_sheet("Календарь").get_all_values()
 
-def get_calendar_dataframe() -> pd.DataFrame:
+@_retry_on_stale
+def write_plan_rows(first_row: int, rows: list[list[str]], clear_to: int | None = None):
+    """
+    Проекция календаря: строки rows с first_row одной пакетной записью.
+    clear_to — очистить строки после записанных до этой включительно.
+    """
     sheet = _open_sheet("Календарь")
-    return pd.DataFrame(sheet.get_all_records())
+    last = first_row + len(rows) - 1
+    data = [{"range": f"A{first_row}:D{last}", "values": rows}] if rows else []
+    if clear_to and clear_to > last:
+        data.append({
+            "range": f"A{last + 1}:D{clear_to}",
+            "values": [[""] * 4 for _ in range(clear_to - last)],
+        })
+    if not data:
+        return
+    if last > sheet.row_count:
+        sheet.add_rows(last - sheet.row_count)
+    sheet.batch_update(data, value_input_option="USER_ENTERED")
+    logger.info("sheets: write_plan_rows, строки %d..%d", first_row, last)
+
+@_retry_on_stale
+def insert_plan_rows(row: int, rows: list[list[str]]):
+    """Проекция календаря: вставляет rows перед строкой row, строки ниже сдвигаются."""
+    sheet = _open_sheet("Календарь")
+    if row > sheet.row_count:
+        sheet.add_rows(row - sheet.row_count)
+    sheet.insert_rows(rows, row, value_input_option="USER_ENTERED")
+    logger.info("sheets: insert_plan_rows, строки %d..%d", row, row + len(rows) - 1)
+
+@_retry_on_stale
+def get_trip_dataframe():
+    import pandas as pd  # pandas грузим только для отчётов
+    # из локальной копии; с листа догружаются только новые строки
+    return pd.DataFrame([rec for _, rec in trips_mirror.records()])
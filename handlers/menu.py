@@ -13,7 +13,9 @@ from core.calendar import start_plan, handle_plan_datetime, show_calendar
 from core.register import register
 from core.report import generate_report, ADMIN_IDS
 from utils.database import is_registered
+from utils.metrics import track_handler
 
+@track_handler
 async def handle_main_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
     text = update.message.text
@@ -1,9 +1,20 @@
+import asyncio
+import logging
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.cron import CronTrigger
+from apscheduler.triggers.interval import IntervalTrigger
 import pytz
+from core.sheets import trips_mirror
 from utils.database import close_expired_trips
+from sync_users import sync_users_job
 
-def start_scheduler():
+logger = logging.getLogger(__name__)
+
+async def refresh_trips_mirror():
+    # новые строки и правки листа «Поездки» → локальная копия
+    await asyncio.to_thread(trips_mirror.refresh)
+
+def start_scheduler() -> AsyncIOScheduler:
     moscow_tz = pytz.timezone("Europe/Moscow")
     scheduler = AsyncIOScheduler(timezone=moscow_tz)
 
@@ -19,5 +30,18 @@ def start_scheduler():
         trigger=CronTrigger(day_of_week='fri', hour=16, minute=45, timezone=moscow_tz)
     )
 
+    # сверка локальной копии «Поездок» с листом
+    scheduler.add_job(
+        refresh_trips_mirror,
+        trigger=IntervalTrigger(minutes=5, timezone=moscow_tz)
+    )
+
+    # лист «Пользователи» ← employees (только разница, одной записью)
+    scheduler.add_job(
+        sync_users_job,
+        trigger=IntervalTrigger(hours=1, timezone=moscow_tz)
+    )
+
     scheduler.start()
-    print("✅ Планировщик успешно запущен.")
+    logger.info("✅ Планировщик успешно запущен.")
+    return scheduler
@@ -0,0 +1,149 @@
+# scripts/bench_report.py
+#
+# Замер сборки отчёта на длинной истории: построчный вариант (apply +
+# strptime, как было в /report) против core.report_builder.
+# Печатает время и пропускную способность (строк/с) для обоих.
+#
+# С --export сравнивает пиковую память выгрузки из SQLite: DataFrame +
+# ExcelWriter в BytesIO против потоковой записи (trip_report_file).
+#
+#   python -m scripts.bench_report [--rows 100000] [--xlsx] [--export]
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from io import BytesIO
+
+import numpy as np
+import pandas as pd
+
+from core.report_builder import build_trip_report, column_widths, trip_report_file, write_excel
+from scripts.check_indexes import build_db
+from utils.db import iter_chunks
+
+EXPORT_SQL = (
+    "SELECT e.full_name, t.organization_name, t.start_datetime, t.end_datetime "
+    "FROM trips t JOIN employees e ON e.user_id = t.user_id ORDER BY t.start_datetime"
+)
+
+
+def synthetic_trips(n: int, seed: int = 1) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    start = (
+        pd.Timestamp("2020-01-01 08:00")
+        + pd.to_timedelta(rng.integers(0, 5 * 365, n), unit="D")
+        + pd.to_timedelta(rng.integers(0, 9 * 60, n), unit="m")
+    )
+    end = pd.Series(start + pd.to_timedelta(rng.integers(10, 8 * 60, n), unit="m"))
+    end[rng.random(n) < 0.01] = pd.NaT   # незавершённые
+    return pd.DataFrame({
+        "ФИО": rng.choice([f"Сотрудник {i}" for i in range(300)], n),
+        "Организация": rng.choice(["Арбитражный суд", "Мосгорсуд", "Нагатинский районный суд"], n),
+        "start": start,
+        "end": end,
+    })
+
+
+def rowwise_report(trips: pd.DataFrame) -> pd.DataFrame:
+    """Прежний вариант из core/report.py — для сравнения."""
+    df = pd.DataFrame({
+        "ФИО": trips["ФИО"],
+        "Организация": trips["Организация"],
+        "Дата": trips["start"].dt.strftime("%d.%m.%Y"),
+        "Начало поездки": trips["start"].dt.strftime("%H:%M"),
+        "Конец поездки": trips["end"].dt.strftime("%H:%M").fillna(""),
+    })
+
+    def calc_duration(r):
+        s, e = r["Начало поездки"], r["Конец поездки"]
+        try:
+            ts = datetime.strptime(s, "%H:%M")
+            te = datetime.strptime(e, "%H:%M")
+        except ValueError:
+            return "-"
+        delta = te - ts
+        if delta.total_seconds() < 0:
+            delta += pd.Timedelta(days=1)
+        h, rem = divmod(int(delta.total_seconds()), 3600)
+        m, _ = divmod(rem, 60)
+        return f"{h:02d}:{m:02d}"
+
+    df["Продолжительность"] = df.apply(calc_duration, axis=1)
+    for col in df.columns:
+        max(df[col].astype(str).map(len).max(), len(col))
+    return df
+
+
+def vectorized_report(trips: pd.DataFrame) -> pd.DataFrame:
+    df = build_trip_report(trips)
+    column_widths(df)
+    return df
+
+
+def _measure(title: str, func, trips: pd.DataFrame) -> float:
+    t0 = time.perf_counter()
+    func(trips)
+    elapsed = time.perf_counter() - t0
+    print(f"{title:<14} {elapsed:8.3f} с  {len(trips) / elapsed:12,.0f} строк/с")
+    return elapsed
+
+
+def export_in_memory(conn):
+    trips = pd.DataFrame(conn.execute(EXPORT_SQL).fetchall(),
+                         columns=["ФИО", "Организация", "start", "end"])
+    buf = BytesIO()
+    write_excel(build_trip_report(trips), buf, "Отчёт")
+    return buf
+
+
+def export_streaming(conn):
+    buf, _ = trip_report_file(iter_chunks(conn.execute(EXPORT_SQL), 5000), "Отчёт")
+    buf.close()
+
+
+def _measure_peak(title: str, func, conn):
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    func(conn)
+    elapsed = time.perf_counter() - t0
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{title:<14} {elapsed:8.3f} с  пик {peak / 2**20:8.1f} МиБ")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Замер сборки отчёта по поездкам")
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--xlsx", action="store_true", help="замерить и запись в xlsx")
+    parser.add_argument("--export", action="store_true",
+                        help="сравнить пиковую память выгрузки из SQLite")
+    args = parser.parse_args()
+
+    trips = synthetic_trips(args.rows)
+    print(f"Поездок: {len(trips)}")
+    old = _measure("построчно", rowwise_report, trips)
+    new = _measure("векторно", vectorized_report, trips)
+    print(f"ускорение ×{old / new:.1f}")
+
+    if args.xlsx:
+        final = build_trip_report(trips)
+        t0 = time.perf_counter()
+        write_excel(final, BytesIO(), "Отчёт")
+        print(f"{'запись xlsx':<14} {time.perf_counter() - t0:8.3f} с")
+
+    if args.export:
+        with tempfile.TemporaryDirectory() as tmp:
+            conn = build_db(os.path.join(tmp, "bench.db"), args.rows, 300)
+            print(f"Выгрузка из SQLite, {args.rows} поездок:")
+            _measure_peak("в памяти", export_in_memory, conn)
+            _measure_peak("потоково", export_streaming, conn)
+            conn.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
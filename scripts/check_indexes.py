@@ -0,0 +1,125 @@
+# scripts/check_indexes.py
+#
+# Проверка, что горячие запросы по trips идут по индексам.
+# Строит синтетическую БД (по умолчанию во временной папке), применяет
+# миграции и для каждого запроса печатает план и время с индексом
+# и без него (NOT INDEXED). Запросы берутся из utils/storage.py — те же,
+# что выполняет Session. Код выхода 1, если запрос сканирует trips.
+#
+#   python -m scripts.check_indexes [--trips 200000] [--users 300]
+
+import argparse
+import os
+import random
+import re
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+from utils.db import connect
+from utils.migrations import migrate
+from utils.storage import (
+    LAST_COMPLETED_SQL, OPEN_TRIP_SQL, OPEN_TRIPS_SQL, trips_between_query,
+)
+
+# (название, SQL из utils/storage.py, параметры: "user" — id сотрудника,
+# "range" — период отчёта, None — без параметров)
+REPORT_MONTH = (date(2021, 3, 1), date(2021, 3, 31))
+HOT_QUERIES = [
+    ("save_trip_start / end_trip: открытая поездка пользователя", OPEN_TRIP_SQL, "user"),
+    ("fetch_last_completed", LAST_COMPLETED_SQL, "user"),
+    ("close_expired_trips: все открытые с ФИО", OPEN_TRIPS_SQL, None),
+    ("/report: поездки за месяц", trips_between_query(*REPORT_MONTH)[0], "range"),
+]
+
+
+def not_indexed(sql: str) -> str:
+    """Тот же запрос, но trips без индексов — для сравнения времени."""
+    return re.sub(r"\bFROM trips( t)?\b", r"\g<0> NOT INDEXED", sql, count=1)
+
+
+def scans_trips(plan: list[str]) -> bool:
+    """
+    В плане есть проход по всей таблице trips. SCAN по индексу допустим:
+    idx_trips_in_progress частичный и содержит только открытые поездки.
+    """
+    return any(re.match(r"SCAN (trips|t)\b(?! USING (COVERING )?INDEX)", row) for row in plan)
+
+
+def build_db(path: str, n_trips: int, n_users: int):
+    conn = connect(path)
+    migrate(conn)
+    conn.executemany(
+        "INSERT INTO employees (user_id, full_name) VALUES (?, ?)",
+        [(uid, f"Сотрудник {uid}") for uid in range(1, n_users + 1)]
+    )
+    start = datetime(2020, 1, 1, 9, 0)
+    rows = []
+    for i in range(n_trips):
+        sd = start + timedelta(minutes=17 * i)
+        rows.append((
+            random.randint(1, n_users), "org", "Суд",
+            sd.strftime("%Y-%m-%d %H:%M:%S"),
+            (sd + timedelta(hours=2)).strftime("%Y-%m-%d %H:%M:%S"),
+            "completed",
+        ))
+    conn.executemany(
+        "INSERT INTO trips (user_id, organization_id, organization_name, "
+        "start_datetime, end_datetime, status) VALUES (?, ?, ?, ?, ?, ?)",
+        rows
+    )
+    # у каждого десятого сотрудника есть открытая поездка
+    conn.executemany(
+        "INSERT INTO trips (user_id, organization_id, organization_name, "
+        "start_datetime, status) VALUES (?, 'org', 'Суд', ?, 'in_progress')",
+        [(uid, "2030-01-01 09:00:00") for uid in range(1, n_users + 1, 10)]
+    )
+    conn.commit()
+    conn.execute("ANALYZE")
+    return conn
+
+
+def _time(conn, sql, params, repeat) -> float:
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        conn.execute(sql, params).fetchall()
+    return (time.perf_counter() - t0) / repeat * 1000
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Проверка индексов для горячих запросов")
+    parser.add_argument("--trips", type=int, default=200_000)
+    parser.add_argument("--users", type=int, default=300)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        print(f"Строим БД: {args.trips} поездок, {args.users} сотрудников…")
+        conn = build_db(path, args.trips, args.users)
+
+        ok = True
+        for title, sql, kind in HOT_QUERIES:
+            if kind == "user":
+                params = (args.users // 2,)
+            elif kind == "range":
+                params = trips_between_query(*REPORT_MONTH)[1]
+            else:
+                params = ()
+            plan = [row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + sql, params)]
+            uses_index = not scans_trips(plan)
+            ok &= uses_index
+            t_idx = _time(conn, sql, params, args.repeat)
+            t_scan = _time(conn, not_indexed(sql), params, args.repeat)
+            mark = "✅" if uses_index else "❌"
+            print(f"{mark} {title}\n    план: {' | '.join(plan)}\n"
+                  f"    {t_idx:.3f} мс с индексом / {t_scan:.3f} мс без "
+                  f"(×{t_scan / max(t_idx, 1e-6):.0f})")
+        conn.close()
+
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,147 @@
+# scripts/check_storage.py
+#
+# Проверка хранилища (utils/storage.py) на настоящей БД: применяет схему
+# и прогоняет все операции сессии — сотрудники, поездки, авто-закрытие,
+# планы, config, outbox, версии данных — на временных сотрудниках с
+# отрицательными user_id. Всё идёт в одной транзакции, которая в конце
+# откатывается, так что БД остаётся как была (в PostgreSQL сдвигаются
+# только последовательности). Код выхода 1, если какая-то проверка упала.
+#
+# SQLite (по умолчанию) проверяется во временном файле, PostgreSQL —
+# на сервере из DATABASE_URL, лучше отдельной тестовой базе:
+#
+#   python -m scripts.check_storage
+#   STORAGE_BACKEND=postgres DATABASE_URL=postgresql://localhost/court_test \
+#       python -m scripts.check_storage
+
+import os
+import sys
+import tempfile
+from datetime import date, datetime
+
+from utils import db
+from utils.storage import storage
+
+USER, OTHER = -900_001, -900_002
+START = datetime(2001, 1, 3, 10, 0)
+END = datetime(2001, 1, 3, 12, 30)
+
+_failed = 0
+
+
+def check(title: str, ok: bool, detail=""):
+    global _failed
+    _failed += not ok
+    print(f"{'✅' if ok else '❌'} {title}" + (f": {detail}" if detail and not ok else ""))
+
+
+def run_checks(s):
+    trips_v0, employees_v0 = s.data_version()
+
+    # сотрудники
+    check("add_employee: новый", s.add_employee(USER, "Проверка Хранилища"))
+    check("add_employee: повторный → False", not s.add_employee(USER, "Дубль"))
+    s.add_employee(OTHER, "Проверка Вторая")
+    check("employee_names", s.employee_names().get(USER) == "Проверка Хранилища")
+    check("employees_by_name", ("Проверка Хранилища", USER) in s.employees_by_name())
+    check("employees_version растёт", s.employees_version() != employees_v0)
+
+    # config
+    s.set_config("CHECK_STORAGE", "1")
+    s.set_config("CHECK_STORAGE", "2")
+    check("set_config/get_config (upsert)", s.get_config("CHECK_STORAGE") == "2")
+    check("get_config: нет ключа → None", s.get_config("CHECK_STORAGE_MISSING") is None)
+
+    # поездка пользователя
+    trip_id = s.insert_trip(USER, "org", "Проверочный суд", START)
+    check("insert_trip → id", isinstance(trip_id, int))
+    row = s.open_trip(USER)
+    check("open_trip", row is not None and tuple(row) == (trip_id, "Проверочный суд", START), row)
+    if storage.backend == "postgres":
+        check("insert_trip: вторая открытая → None (уникальный индекс)",
+              s.insert_trip(USER, "org", "Дубль", START) is None)
+    check("data_version: trips растёт", s.data_version()[0] != trips_v0)
+
+    open_before, pending_before = s.status_counts()
+    s.enqueue("check_storage", {"trip_id": trip_id, "name": "Проверка"})
+    s.enqueue_many("check_storage", [{"n": 1}, {"n": 2}])
+    check("status_counts: открытые и outbox",
+          s.status_counts() == (open_before, pending_before + 3), s.status_counts())
+
+    s.set_sheet_rows([(42, trip_id)])
+    check("set_sheet_rows/sheet_rows", s.sheet_rows([trip_id]) == {trip_id: 42})
+
+    check("complete_trip", s.complete_trip(trip_id, END))
+    check("complete_trip: уже закрыта → False", not s.complete_trip(trip_id, END))
+    last = s.last_completed(USER)
+    check("last_completed", last is not None and tuple(last) == ("Проверочный суд", START), last)
+
+    chunks = list(s.trips_between(START.date(), START.date(), 1))
+    found = [r for chunk in chunks for r in chunk if r[0] == "Проверка Хранилища"]
+    check("trips_between: период и пачки",
+          len(found) == 1 and tuple(found[0][2:]) == (START, END), found)
+    check("trips_between: вне периода",
+          not any(r[0] == "Проверка Хранилища" for chunk in
+                  s.trips_between(date(2001, 1, 4), None, 100) for r in chunk))
+
+    # авто-закрытие
+    s.insert_trip(OTHER, "org", "Второй суд", START)
+    opened = [r for r in s.open_trips() if r[3] == "Проверка Вторая"]
+    check("open_trips с ФИО", len(opened) == 1, opened)
+    s.complete_trips([(END, opened[0][0])])
+    check("complete_trips", s.open_trip(OTHER) is None)
+    check("complete_open_trip: нет открытой → False", not s.complete_open_trip(OTHER, END))
+
+    # планы
+    keys_before = set(s.sheet_plan_keys())
+    p1 = s.insert_plan(USER, "2001-01-05", "Проверка Хранилища", "Суд", "10:00")
+    p2 = s.insert_plan(USER, "2001-01-04", "Проверка Хранилища", "Суд", "Весь день")
+    check("new_plan_keys", set(s.new_plan_keys([p1, p2])) == {("2001-01-05", p1), ("2001-01-04", p2)})
+    found = sorted(tuple(r) for r in s.plan_rows([p1, p2]))
+    check("plan_rows", found == sorted([(p1, "2001-01-05", "Проверка Хранилища", "Суд", "10:00"),
+                                        (p2, "2001-01-04", "Проверка Хранилища", "Суд", "Весь день")]),
+          found)
+    s.mark_plans_in_sheet([p1, p2])
+    check("mark_plans_in_sheet", not s.new_plan_keys([p1, p2]))
+    check("sheet_plan_keys", set(s.sheet_plan_keys()) - keys_before == {("2001-01-05", p1), ("2001-01-04", p2)})
+    s.import_plans([("2001-01-06", "Проверка Хранилища", "Суд", "09:00")])
+    check("import_plans/calendar_rows",
+          ("2001-01-06", "Проверка Хранилища", "Суд", "09:00") in [tuple(r) for r in s.calendar_rows()])
+
+    # outbox
+    mine = [r for r in s.outbox_batch(10**6) if r[1] == "check_storage"]
+    check("outbox_batch", len(mine) == 3, mine)
+    ids = [r[0] for r in mine]
+    s.outbox_retry([(1, 123.0, "ошибка", 0, ids[0])])
+    retried = [r for r in s.outbox_batch(10**6) if r[0] == ids[0]]
+    check("outbox_retry", retried and tuple(retried[0][3:]) == (1, 123.0), retried)
+    s.outbox_delete(ids)
+    check("outbox_delete", not [r for r in s.outbox_batch(10**6) if r[1] == "check_storage"])
+
+    # пустые списки id: в PostgreSQL «IN ()» — синтаксическая ошибка
+    s.mark_plans_in_sheet([])
+    s.outbox_delete([])
+    check("пустые списки id",
+          (s.sheet_rows([]), s.new_plan_keys([]), s.plan_rows([])) == ({}, [], []))
+
+
+def main() -> int:
+    with tempfile.TemporaryDirectory() as tmp:
+        if storage.backend == "sqlite":
+            db.DB_PATH = os.path.join(tmp, "check.db")
+        print(f"Хранилище: {storage.backend}, схема версии {storage.migrate()}")
+        with storage.session() as s:
+            try:
+                run_checks(s)
+            finally:
+                s.rollback()
+        # отдельной сессией: в PostgreSQL захват блокировки коммитит транзакцию
+        with storage.session() as s, s.outbox_lock() as locked:
+            check("outbox_lock", locked)
+        storage.close()
+    print("Все проверки пройдены" if not _failed else f"Провалено проверок: {_failed}")
+    return 1 if _failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
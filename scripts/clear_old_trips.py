@@ -8,9 +8,10 @@ cursor = conn.cursor()
 # Удалим все поездки, начавшиеся ДО 30 июня 2025 включительно
 cutoff = datetime(2025, 6, 30, 23, 59, 59)
 
+# время в trips хранится как 'YYYY-MM-DD HH:MM:SS' — сравниваем строки (по индексу)
 cursor.execute(
-    "DELETE FROM trips WHERE datetime(start_datetime) <= ?",
-    (cutoff.isoformat(),)
+    "DELETE FROM trips WHERE start_datetime <= ?",
+    (cutoff.strftime("%Y-%m-%d %H:%M:%S"),)
 )
 
 deleted = cursor.rowcount
@@ -8,7 +8,8 @@ cursor.execute('''
     SELECT id, user_id, organization_name, start_datetime, end_datetime, status
     FROM trips
     WHERE status = 'completed'
-      AND (date(start_datetime) = '2025-06-30' OR date(end_datetime) = '2025-06-30')
+      AND ((start_datetime >= '2025-06-30' AND start_datetime < '2025-07-01')
+        OR (end_datetime >= '2025-06-30' AND end_datetime < '2025-07-01'))
     ORDER BY start_datetime
 ''')
 
@@ -1,5 +1,5 @@
 import sqlite3
-from datetime import datetime
+from datetime import date, timedelta
 
 DB_PATH = "court_tracking.db"
 
@@ -8,13 +8,15 @@ def delete_trips_on_date(target_date_str: str):
     Удаляет из таблицы trips все поездки, у которых дата старта равна target_date.
     Формат target_date_str: 'YYYY-MM-DD'
     """
+    day = date.fromisoformat(target_date_str)
     conn = sqlite3.connect(DB_PATH)
     cursor = conn.cursor()
 
+    # диапазон [день, следующий день) идёт по индексу, в отличие от date(...)
     cursor.execute("""
         DELETE FROM trips
-        WHERE date(start_datetime) = ?
-    """, (target_date_str,))
+        WHERE start_datetime >= ? AND start_datetime < ?
+    """, (day.isoformat(), (day + timedelta(days=1)).isoformat()))
 
     deleted = cursor.rowcount
     conn.commit()
@@ -1,10 +1,12 @@
 import sqlite3
 import pandas as pd
+from datetime import date, timedelta
 
 DB_PATH = "court_tracking.db"
 TARGET_DATE = "2025-07-01"  # формат YYYY-MM-DD
 
 def export_trips_on_date(target_date: str):
+    day = date.fromisoformat(target_date)
     # Подключаемся к БД
     conn = sqlite3.connect(DB_PATH)
     # Читаем в DataFrame
@@ -19,8 +21,8 @@ def export_trips_on_date(target_date: str):
             t.status
         FROM trips t
         JOIN employees e ON t.user_id = e.user_id
-        WHERE date(t.start_datetime) = ?
-    """, conn, params=(target_date,))
+        WHERE t.start_datetime >= ? AND t.start_datetime < ?
+    """, conn, params=(day.isoformat(), (day + timedelta(days=1)).isoformat()))
     conn.close()
 
     if df.empty:
@@ -5,7 +5,7 @@ cursor = conn.cursor()
 
 cursor.execute('''
     UPDATE trips
-    SET end_datetime = '2025-06-30T09:50:00+03:00'
+    SET end_datetime = '2025-06-30 09:50:00'
     WHERE id = 23
 ''')
 
@@ -16,7 +16,7 @@ cursor.execute('''
     UPDATE trips
     SET end_datetime = ?, status = 'completed'
     WHERE status = 'in_progress'
-''', (now.isoformat(),))
+''', (now.strftime("%Y-%m-%d %H:%M:%S"),))  # канонический формат trips
 
 affected = cursor.rowcount
 conn.commit()
@@ -42,7 +42,11 @@ for _, row in df.iterrows():
         cursor.execute('''
             INSERT OR IGNORE INTO trips (user_id, organization_name, start_datetime, end_datetime)
             VALUES (?, ?, ?, ?)
-        ''', (user_id, org, start.isoformat(), end.isoformat()))
+        ''', (
+            user_id, org,
+            start.strftime("%Y-%m-%d %H:%M:%S"),
+            end.strftime("%Y-%m-%d %H:%M:%S"),
+        ))
         restored += 1
     else:
         not_found.append(full_name)
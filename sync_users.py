@@ -1,56 +1,80 @@
 # sync_users.py
 
-import os
-import sqlite3
-import json
+"""
+Синхронизация листа «Пользователи» с таблицей employees.
+
+Лист читается один раз, сравнивается с тем, каким он должен быть
+(шапка + сотрудники по алфавиту), и все отличия — новые, изменённые
+и лишние строки — записываются одним batch_update. Лист при этом
+ни в какой момент не пустеет, а если расхождений нет, записей нет вовсе.
+
+Запускается как скрипт (python sync_users.py) или по расписанию
+из бота (scheduler.py → sync_users_job).
+"""
+
+import asyncio
+import logging
 
 import gspread
-from oauth2client.service_account import ServiceAccountCredentials
-
-# 1) Загрузим настройки из .env
-from dotenv import load_dotenv
-load_dotenv()
-GOOGLE_SHEETS_JSON = os.getenv("GOOGLE_SHEETS_JSON")
-SPREADSHEET_ID     = os.getenv("SPREADSHEET_ID")
-DB_PATH            = "court_tracking.db"
-
-if not GOOGLE_SHEETS_JSON or not SPREADSHEET_ID:
-    raise RuntimeError("Не задана конфигурация Google Sheets в .env")
-
-# 2) Авторизуемся в Google Sheets
-creds_dict = json.loads(GOOGLE_SHEETS_JSON)
-scope = [
-    "https://www.googleapis.com/auth/spreadsheets",
-    "https://www.googleapis.com/auth/drive"
-]
-creds  = ServiceAccountCredentials.from_json_keyfile_dict(creds_dict, scope)
-gc     = gspread.authorize(creds)
-
-# 3) Открываем лист «Пользователи»
-sh    = gc.open_by_key(SPREADSHEET_ID)
-try:
-    ws = sh.worksheet("Пользователи")
-except gspread.exceptions.WorksheetNotFound:
-    # если листа нет — создаём его
-    ws = sh.add_worksheet(title="Пользователи", rows="1000", cols="3")
-
-def sync_users():
-    # 4) Считаем из SQLite всех пользователей
-    conn = sqlite3.connect(DB_PATH)
-    rows = conn.execute(
-        "SELECT full_name, user_id FROM employees ORDER BY full_name"
-    ).fetchall()
-    conn.close()
-
-    # 5) Очищаем лист и прописываем шапку
-    ws.clear()
-    ws.append_row(["ФИО", "Telegram ID"], value_input_option="USER_ENTERED")
-
-    # 6) Проставляем всех пользователей
-    for full_name, user_id in rows:
-        ws.append_row([full_name, str(user_id)], value_input_option="USER_ENTERED")
-
-    print(f"[sync_users] Синхронизировано {len(rows)} записей")
+
+from core.sheets import session
+from utils.log import setup_logging
+from utils.storage import storage
+
+logger = logging.getLogger(__name__)
+
+SHEET_TITLE = "Пользователи"
+HEADER = ["ФИО", "Telegram ID"]
+
+
+def _open_users_sheet() -> gspread.Worksheet:
+    try:
+        return session.worksheet(SHEET_TITLE)
+    except gspread.exceptions.WorksheetNotFound:
+        # если листа нет — создаём его
+        ws = session.spreadsheet().add_worksheet(title=SHEET_TITLE, rows="1000", cols="3")
+        session.invalidate()
+        return ws
+
+
+def _diff(current: list[list[str]], desired: list[list[str]]) -> list[dict]:
+    """Диапазоны A{n}:B{n} для строк, которые отличаются (лишние — очищаются)."""
+    data = []
+    for i in range(max(len(current), len(desired))):
+        have = (current[i] + ["", ""])[:2] if i < len(current) else ["", ""]
+        want = desired[i] if i < len(desired) else ["", ""]
+        if have != want:
+            data.append({"range": f"A{i + 1}:B{i + 1}", "values": [want]})
+    return data
+
+
+def sync_users() -> int:
+    """Приводит лист к employees. Возвращает число изменённых строк."""
+    # 1) Считаем из БД всех пользователей
+    with storage.session() as s:
+        rows = s.employees_by_name()
+    desired = [HEADER] + [[full_name, str(user_id)] for full_name, user_id in rows]
+
+    # 2) Один раз читаем лист и считаем разницу
+    ws = _open_users_sheet()
+    data = _diff(ws.get_all_values(), desired)
+
+    # 3) Все вставки, правки и удаления — одной записью
+    if data:
+        ws.batch_update(data, value_input_option="USER_ENTERED")
+
+    logger.info("sync_users: %d сотрудников, обновлено строк: %d", len(rows), len(data))
+    return len(data)
+
+
+async def sync_users_job():
+    """Плановая синхронизация из бота: работа с API вне event loop."""
+    try:
+        await asyncio.to_thread(sync_users)
+    except Exception:
+        logger.exception("sync_users: ошибка синхронизации")
+
 
 if __name__ == "__main__":
+    setup_logging()
     sync_users()
@@ -0,0 +1,60 @@
+# tests/conftest.py
+
+"""
+Общие фикстуры: свежая SQLite во временном каталоге на каждый тест и
+таблица Google в памяти (benchmarks/fakes.py) вместо настоящей.
+
+    python -m pytest -q
+"""
+
+import os
+
+# рабочее время не должно зависеть от момента запуска
+os.environ.setdefault("DEBUG_MODE", "1")
+
+import pytest
+
+from benchmarks.fakes import install_sheets, spreadsheet_for
+from core.report import clear_report_cache
+from utils import db
+from utils.database import init_db
+from utils.employees import directory
+
+EMPLOYEES = {1: "Иванов Иван", 2: "Петров Пётр", 3: "Сидорова Анна"}
+
+
+@pytest.fixture
+def database(tmp_path, monkeypatch):
+    """Пустая БД по текущей схеме с сотрудниками EMPLOYEES; outbox пуст."""
+    monkeypatch.setattr(db, "DB_PATH", str(tmp_path / "test.db"))
+    init_db()
+    conn = db.get_connection()
+    with conn:
+        conn.executemany("INSERT INTO employees (user_id, full_name) VALUES (?, ?)",
+                         EMPLOYEES.items())
+        # разовый импорт «Календаря» (init_db ставит его в outbox) проверяется отдельно
+        conn.execute("DELETE FROM sheets_outbox")
+        conn.execute("INSERT OR REPLACE INTO config (key, value) VALUES ('PLANS_IMPORTED', '1')")
+    directory.close()
+    directory.load()
+    clear_report_cache()
+    yield conn
+    clear_report_cache()
+    directory.close()
+    db.close_connection()
+
+
+@pytest.fixture
+def book(database):
+    """Таблица в памяти, согласованная с БД, вместо core.sheets.session."""
+    book = spreadsheet_for(database)
+    install_sheets(book)
+    return book
+
+
+def sheet(book, title: str):
+    return next(ws for ws in book.worksheets() if ws.title == title)
+
+
+def outbox_rows(conn) -> list[tuple]:
+    return conn.execute("SELECT op, attempts FROM sheets_outbox ORDER BY id").fetchall()
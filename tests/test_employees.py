@@ -0,0 +1,21 @@
+# tests/test_employees.py
+
+from utils.database import get_data_version
+from utils.employees import directory
+
+
+def test_employee_changes_bump_version(database):
+    before = get_data_version()
+    with database:
+        database.execute("UPDATE employees SET full_name = 'Иванов Илья' WHERE user_id = 1")
+    assert get_data_version()[1] > before[1]
+
+
+def test_directory_reloads_only_after_change(database):
+    assert directory.get_name(1) == "Иванов Иван"
+    assert not directory.refresh_if_changed()
+
+    with database:
+        database.execute("INSERT INTO employees (user_id, full_name) VALUES (4, 'Орлов Олег')")
+    assert directory.refresh_if_changed()
+    assert directory.get_name(4) == "Орлов Олег"
@@ -0,0 +1,62 @@
+# tests/test_metrics.py
+
+import asyncio
+import logging
+
+import pytest
+
+from utils.metrics import HANDLER_SECONDS, HANDLER_TOTAL, track_handler
+
+
+@track_handler
+async def menu_button(update, context):
+    return "button"
+
+
+@track_handler
+async def failing_button(update, context):
+    raise RuntimeError("boom")
+
+
+@track_handler
+async def menu(update, context):
+    if update == "press":
+        return await menu_button(update, context)
+    if update == "fail":
+        return await failing_button(update, context)
+    return "keyboard"
+
+
+def _count(handler: str, outcome: str = "ok") -> float:
+    return HANDLER_TOTAL._values.get((handler, outcome), 0)
+
+
+def _observed(handler: str) -> int:
+    state = HANDLER_SECONDS._values.get((handler,))
+    return state[-1] if state else 0
+
+
+def test_nested_handler_is_counted_once(caplog):
+    before = _count("menu"), _count("menu_button"), _observed("menu_button")
+    with caplog.at_level(logging.INFO, logger="utils.metrics"):
+        assert asyncio.run(menu("press", None)) == "button"
+
+    # нажатие кнопки меню — один вызов, под именем хендлера кнопки
+    assert _count("menu") == before[0]
+    assert _count("menu_button") == before[1] + 1
+    assert _observed("menu_button") == before[2] + 1
+    assert [r.getMessage() for r in caplog.records].count("handled") == 1
+
+
+def test_menu_itself_is_counted_under_its_name():
+    before = _count("menu")
+    assert asyncio.run(menu("text", None)) == "keyboard"
+    assert _count("menu") == before + 1
+
+
+def test_nested_error_is_counted_once():
+    before = _count("failing_button", "error"), _count("menu", "error")
+    with pytest.raises(RuntimeError):
+        asyncio.run(menu("fail", None))
+    assert _count("failing_button", "error") == before[0] + 1
+    assert _count("menu", "error") == before[1]
@@ -0,0 +1,38 @@
+# tests/test_migrations.py
+
+from datetime import datetime
+
+from utils.db import connect
+from utils.migrations import MIGRATIONS, migrate
+
+
+def test_unparsed_timestamps_are_moved_aside(tmp_path):
+    conn = connect(str(tmp_path / "legacy.db"))
+    # БД старой версии: схема до приведения времени к одному виду
+    for number, apply in MIGRATIONS[:3]:
+        apply(conn.cursor())
+    conn.execute("PRAGMA user_version = 3")
+    conn.executemany(
+        "INSERT INTO trips (id, user_id, organization_name, start_datetime, end_datetime, status) "
+        "VALUES (?, 1, 'Суд', ?, ?, ?)",
+        [
+            (1, "2025-07-01T09:00:00+03:00", "2025-07-01 11:30:00.123456", "completed"),
+            (2, "вчера утром", None, "in_progress"),
+            (3, "2025-07-02 09:00:00", "??", "completed"),
+        ]
+    )
+    conn.commit()
+
+    migrate(conn)
+
+    # в DATETIME-колонках остались только разбираемые значения
+    assert conn.execute("SELECT id, start_datetime, end_datetime FROM trips").fetchall() == [
+        (1, datetime(2025, 7, 1, 9, 0), datetime(2025, 7, 1, 11, 30)),
+    ]
+    assert conn.execute(
+        "SELECT id, start_datetime, end_datetime, status FROM trips_unparsed ORDER BY id"
+    ).fetchall() == [
+        (2, "вчера утром", None, "in_progress"),
+        (3, "2025-07-02 09:00:00", "??", "completed"),
+    ]
+    conn.close()
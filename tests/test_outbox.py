@@ -0,0 +1,105 @@
+# tests/test_outbox.py
+
+from datetime import timedelta
+
+import pytest
+
+from conftest import outbox_rows, sheet
+from core import outbox, sheets
+from core.trip import _close_trip
+from utils.database import save_trip_start
+
+
+class Crash(BaseException):
+    """Процесс «упал» посреди доставки: не Exception, outbox её не ловит."""
+
+
+def _sheet_rows(conn) -> dict[int, int]:
+    return dict(conn.execute("SELECT user_id, sheet_row FROM trips"))
+
+
+def test_consecutive_ops_share_one_request(database, book):
+    for uid in (1, 2, 3):
+        save_trip_start(uid, "org", "Мосгорсуд")
+
+    assert outbox.drain_once() == 3
+    assert book.calls["Поездки.append_rows"] == 1
+    assert _sheet_rows(database) == {1: 2, 2: 3, 3: 4}
+    assert outbox_rows(database) == []
+
+
+def test_order_is_kept_across_op_types(database, book):
+    start = save_trip_start(1, "org", "Мосгорсуд")
+    _close_trip(1, start + timedelta(hours=2))
+    save_trip_start(2, "org", "Арбитраж")
+
+    assert outbox.drain_once() == 3
+    rows = sheet(book, "Поездки").rows
+    # конец поездки дописан в строку, которую занял add_trip перед ним
+    assert rows[1][:2] == ["Иванов Иван", "Мосгорсуд"] and rows[1][4] != ""
+    assert rows[2][:2] == ["Петров Пётр", "Арбитраж"] and rows[2][4] == ""
+
+
+def test_failure_stops_the_pass_and_keeps_the_head(database, book, monkeypatch):
+    start = save_trip_start(1, "org", "Мосгорсуд")
+    _close_trip(1, start + timedelta(hours=1))
+
+    def down(trips):
+        raise RuntimeError("Sheets недоступен")
+    real_add_trips = sheets.add_trips
+    monkeypatch.setattr(sheets, "add_trips", down)
+    assert outbox.drain_once() == 0
+    # end_trip за упавшим add_trip не отправлялся
+    assert outbox_rows(database) == [("add_trip", 1), ("end_trip", 0)]
+    assert book.calls["Поездки.batch_update"] == 0
+
+    monkeypatch.setattr(sheets, "add_trips", real_add_trips)
+    with database:
+        database.execute("UPDATE sheets_outbox SET next_attempt_at = 0")
+    assert outbox.drain_once() == 2
+    assert outbox_rows(database) == []
+    assert len(sheet(book, "Поездки").rows) == 2
+
+
+def test_retry_after_crash_does_not_append_twice(database, book, monkeypatch):
+    for uid in (1, 2):
+        save_trip_start(uid, "org", "Мосгорсуд")
+
+    def crash(*args):
+        raise Crash
+    # строки уже в листе, но ни копия листа, ни БД об этом не узнали
+    with monkeypatch.context() as m, pytest.raises(Crash):
+        m.setattr(sheets.trips_mirror, "put_rows", crash)
+        outbox.drain_once()
+    assert outbox_rows(database) == [("add_trip", 1), ("add_trip", 1)]
+
+    save_trip_start(3, "org", "Мосгорсуд")
+    assert outbox.drain_once() == 3
+    rows = sheet(book, "Поездки").rows
+    assert [r[0] for r in rows[1:]] == ["Иванов Иван", "Петров Пётр", "Сидорова Анна"]
+    assert _sheet_rows(database) == {1: 2, 2: 3, 3: 4}
+
+
+def test_registration_goes_through_outbox(database, book):
+    from core.register import _insert_employee
+
+    assert _insert_employee(10, "Новиков Олег")
+    assert not _insert_employee(10, "Дубль")
+    assert outbox_rows(database) == [("add_user", 0)]
+    assert outbox.drain_once() == 1
+    assert sheet(book, "Пользователи").rows[-1] == ["Новиков Олег", "10"]
+
+
+def test_failed_after_max_attempts(database, book, monkeypatch):
+    save_trip_start(1, "org", "Мосгорсуд")
+    with database:
+        database.execute("UPDATE sheets_outbox SET attempts = ?", (outbox.MAX_ATTEMPTS - 1,))
+
+    def down(trips):
+        raise RuntimeError("Sheets недоступен")
+    monkeypatch.setattr(sheets, "add_trips", down)
+    assert outbox.drain_once() == 0
+    failed = database.execute("SELECT failed FROM sheets_outbox").fetchone()[0]
+    assert failed == 1
+    # отброшенная запись больше не блокирует очередь
+    assert database.execute("SELECT COUNT(*) FROM sheets_outbox WHERE failed = 0").fetchone()[0] == 0
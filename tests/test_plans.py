@@ -0,0 +1,115 @@
+# tests/test_plans.py
+
+from datetime import date
+
+from conftest import sheet
+from core import outbox, plans, sheets
+from utils.database import init_db, save_plan
+
+
+def _config(conn, key: str):
+    row = conn.execute("SELECT value FROM config WHERE key = ?", (key,)).fetchone()
+    return row[0] if row else None
+
+
+def test_plans_are_inserted_in_date_order(database, book):
+    calendar = sheet(book, "Календарь")
+    calendar.rows.append(["заметка", "", "", ""])
+
+    save_plan(1, "Мосгорсуд", date(2026, 11, 10), "10:00")
+    assert outbox.drain_once() == 1
+    save_plan(2, "Арбитраж", date(2026, 11, 20), "11:00")
+    save_plan(3, "Мосгорсуд", date(2026, 11, 1), "09:00")
+    save_plan(1, "Арбитраж", date(2026, 11, 10), "15:00")
+    assert outbox.drain_once() == 3
+
+    assert [r[:3] for r in calendar.rows[1:]] == [
+        ["01.11.2026", "Сидорова Анна", "Мосгорсуд"],
+        ["10.11.2026", "Иванов Иван", "Мосгорсуд"],
+        ["10.11.2026", "Иванов Иван", "Арбитраж"],
+        ["20.11.2026", "Петров Пётр", "Арбитраж"],
+        ["заметка", "", ""],
+    ]
+    # вставки на месте: лист не читается и не переписывается;
+    # планы 10.11 и 20.11 встают на одно место — одна вставка на двоих
+    assert book.calls["Календарь.insert_rows"] == 3
+    assert book.calls["Календарь.get_all_values"] == 0
+    assert book.calls["Календарь.batch_update"] == 0
+    assert database.execute("SELECT COUNT(*) FROM plans WHERE in_sheet = 0").fetchone()[0] == 0
+
+
+def test_import_keeps_notes_and_waits_for_sheet(database, book, monkeypatch):
+    calendar = sheet(book, "Календарь")
+    calendar.rows += [
+        ["05.11.2026", "Иванов Иван", "Мосгорсуд", "10:00"],
+        ["позвонить в канцелярию", "", "", ""],
+        ["01.11.2026", "Петров Пётр", "Арбитраж", "12:00"],
+    ]
+    with database:
+        database.execute("DELETE FROM config WHERE key = 'PLANS_IMPORTED'")
+    init_db()
+
+    def down(*args, **kwargs):
+        raise RuntimeError("Sheets недоступен")
+    with monkeypatch.context() as m:
+        m.setattr(sheets, "write_plan_rows", down)
+        assert outbox.drain_once() == 0
+    # лист не переписан — импорт не засчитан и повторится целиком
+    assert _config(database, "PLANS_IMPORTED") is None
+    assert database.execute("SELECT COUNT(*) FROM plans").fetchone()[0] == 0
+
+    with database:
+        database.execute("UPDATE sheets_outbox SET next_attempt_at = 0")
+    assert outbox.drain_once() == 1
+    assert _config(database, "PLANS_IMPORTED") == "1"
+    assert [r[0] for r in calendar.rows[1:4]] == [
+        "01.11.2026", "05.11.2026", "позвонить в канцелярию",
+    ]
+    assert database.execute(
+        "SELECT plan_date, in_sheet FROM plans ORDER BY plan_date"
+    ).fetchall() == [("2026-11-01", 1), ("2026-11-05", 1)]
+
+    # новый план встаёт между импортированными
+    save_plan(3, "Мосгорсуд", date(2026, 11, 3), "14:00")
+    assert outbox.drain_once() == 1
+    assert [r[0] for r in calendar.rows[1:5]] == [
+        "01.11.2026", "03.11.2026", "05.11.2026", "позвонить в канцелярию",
+    ]
+
+
+def test_plans_placed_by_another_instance_are_seen(database, book):
+    calendar = sheet(book, "Календарь")
+    save_plan(1, "Мосгорсуд", date(2026, 11, 10), "10:00")
+    assert outbox.drain_once() == 1
+
+    # другой экземпляр с общей БД вывел план раньше по дате
+    with database:
+        database.execute(
+            "INSERT INTO plans (plan_date, full_name, org_name, plan_time, in_sheet) "
+            "VALUES ('2026-11-05', 'Петров Пётр', 'Арбитраж', '12:00', 1)"
+        )
+    calendar.insert_rows([["05.11.2026", "Петров Пётр", "Арбитраж", "12:00"]], 2)
+
+    save_plan(3, "Мосгорсуд", date(2026, 11, 7), "09:00")
+    assert outbox.drain_once() == 1
+    assert [r[0] for r in calendar.rows[1:]] == ["05.11.2026", "07.11.2026", "10.11.2026"]
+
+
+def test_import_done_elsewhere_is_not_repeated(database, book):
+    with database:
+        database.execute("DELETE FROM config WHERE key = 'PLANS_IMPORTED'")
+    init_db()
+    # пока очередь ждала, импорт выполнил другой экземпляр
+    with database:
+        database.execute("INSERT INTO config (key, value) VALUES ('PLANS_IMPORTED', '1')")
+
+    assert outbox.drain_once() == 1
+    assert book.calls["Календарь.get_all_values"] == 0
+
+
+def test_calendar_file(database):
+    assert plans.calendar_file() is None
+
+    save_plan(1, "Мосгорсуд", date(2026, 11, 10), "10:00")
+    buf = plans.calendar_file()
+    assert buf.read(2) == b"PK"   # xlsx — zip-архив
@@ -0,0 +1,51 @@
+# tests/test_report_cache.py
+
+import asyncio
+import io
+from datetime import timedelta
+
+from core import report
+from core.trip import _close_trip
+from utils.database import get_data_version, save_trip_start
+
+
+def test_trip_changes_bump_version(database):
+    before = get_data_version()
+    start = save_trip_start(1, "org", "Мосгорсуд")
+    after_start = get_data_version()
+    assert after_start[0] > before[0]
+    assert after_start[1] == before[1]
+
+    _close_trip(1, start + timedelta(hours=1))
+    assert get_data_version()[0] > after_start[0]
+
+
+def test_sheet_row_does_not_bump_version(database):
+    save_trip_start(1, "org", "Мосгорсуд")
+    before = get_data_version()
+    with database:
+        database.execute("UPDATE trips SET sheet_row = 2")
+    # отметка outbox не меняет отчёт — кэш не сбрасывается
+    assert get_data_version() == before
+
+
+def test_report_cache_follows_version(database, monkeypatch):
+    builds = []
+
+    def build(start_date, end_date):
+        builds.append((start_date, end_date))
+        return io.BytesIO(b"xlsx"), 1
+    monkeypatch.setattr(report, "build_report_file", build)
+
+    async def fetch():
+        rows, f = await report.open_report(None, None)
+        with f:
+            return rows, f.read()
+
+    assert asyncio.run(fetch()) == (1, b"xlsx")
+    assert asyncio.run(fetch()) == (1, b"xlsx")
+    assert len(builds) == 1
+
+    save_trip_start(1, "org", "Мосгорсуд")
+    asyncio.run(fetch())
+    assert len(builds) == 2
@@ -0,0 +1,39 @@
+# tests/test_sheet_mirror.py
+
+from conftest import sheet
+from core import outbox
+from core.sheets import trips_mirror
+from utils.database import save_trip_start
+
+
+def _names(records) -> list[str]:
+    return [rec["ФИО"] for _, rec in records]
+
+
+def _mirrored(database, book):
+    for uid in (1, 2, 3):
+        save_trip_start(uid, "org", "Мосгорсуд")
+    assert outbox.drain_once() == 3
+    trips_mirror.sync()
+    return sheet(book, "Поездки")
+
+
+def test_verify_recent_carries_manual_edits(database, book):
+    trips = _mirrored(database, book)
+    trips.rows[2][1] = "Арбитраж"
+
+    assert trips_mirror.verify_recent() == 1
+    assert [rec["Организация"] for _, rec in trips_mirror.recent_records(10)] == [
+        "Мосгорсуд", "Арбитраж", "Мосгорсуд",
+    ]
+    assert trips_mirror.verify_recent() == 0
+
+
+def test_verify_recent_reloads_after_rows_deleted(database, book):
+    trips = _mirrored(database, book)
+    # удаление строки со сдвигом: хвост копии больше не совпадает с листом
+    del trips.rows[1]
+
+    trips_mirror.verify_recent()
+    assert _names(trips_mirror.recent_records(10)) == ["Петров Пётр", "Сидорова Анна"]
+    assert [row for row, _ in trips_mirror.recent_records(10)] == [2, 3]
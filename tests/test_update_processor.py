@@ -0,0 +1,65 @@
+# tests/test_update_processor.py
+
+import asyncio
+
+from benchmarks.fakes import FakeBot, message_update
+from utils.updates import PerUserUpdateProcessor
+
+
+def _run(processor: PerUserUpdateProcessor, jobs: list[tuple[object, object]]):
+    async def main():
+        # задачи создаются в порядке прихода, как в Application
+        tasks = [asyncio.ensure_future(processor.process_update(u, c)) for u, c in jobs]
+        await asyncio.wait_for(asyncio.gather(*tasks), timeout=5)
+    asyncio.run(main())
+
+
+def test_one_user_is_processed_in_order():
+    bot, log = FakeBot(), []
+
+    async def handler(name: str, delay: float):
+        log.append(f"{name}:start")
+        await asyncio.sleep(delay)
+        log.append(f"{name}:end")
+
+    processor = PerUserUpdateProcessor(8)
+    _run(processor, [
+        (message_update(bot, 1, "🏦 Возврат", 1), handler("first", 0.05)),
+        (message_update(bot, 1, "Мосгорсуд", 2), handler("second", 0)),
+        (message_update(bot, 1, "/report", 3), handler("third", 0)),
+    ])
+    assert log == ["first:start", "first:end", "second:start", "second:end",
+                   "third:start", "third:end"]
+    # у пользователя нет обновлений в работе — замок удалён
+    assert processor._locks == {} and processor._pending == {}
+
+
+def test_different_users_run_concurrently():
+    bot = FakeBot()
+    first_started = asyncio.Event()
+
+    async def waiting():
+        # дождётся, только если второй пользователь не стоит за первым
+        await asyncio.wait_for(first_started.wait(), timeout=1)
+
+    async def signalling():
+        first_started.set()
+
+    processor = PerUserUpdateProcessor(8)
+    _run(processor, [
+        (message_update(bot, 1, "🏦 Возврат", 1), waiting()),
+        (message_update(bot, 2, "🏦 Возврат", 2), signalling()),
+    ])
+    assert processor._locks == {}
+
+
+def test_update_without_user_is_not_serialized():
+    done = []
+
+    async def handler():
+        done.append(True)
+
+    processor = PerUserUpdateProcessor(8)
+    _run(processor, [(object(), handler()), (object(), handler())])
+    assert done == [True, True]
+    assert processor._locks == {}
@@ -0,0 +1,43 @@
+# tests/test_webserver.py
+
+import asyncio
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from benchmarks.fakes import FakeBot
+from webserver import webhook_handler
+
+
+def _post(body: bytes, headers: dict | None = None, secret: str | None = None):
+    app = SimpleNamespace(bot=FakeBot(), update_queue=asyncio.Queue())
+    handle = webhook_handler(app, secret)
+    status, _, _ = asyncio.run(handle("POST", headers or {}, body))
+    return status, app.update_queue
+
+
+def test_update_is_queued():
+    body = json.dumps({"update_id": 7, "message": {
+        "message_id": 1, "date": 0, "text": "/start",
+        "chat": {"id": 1, "type": "private"},
+    }}).encode()
+    status, queue = _post(body)
+    assert status == 200
+    assert queue.get_nowait().update_id == 7
+
+
+@pytest.mark.parametrize("body", [
+    b"not json", b"[1, 2]", b"42", b"null", b"{}", b'{"foo": 1}',
+    b'{"update_id": 1, "message": 5}',
+])
+def test_malformed_body_is_rejected(body):
+    status, queue = _post(body)
+    assert status == 400
+    assert queue.empty()
+
+
+def test_wrong_secret_is_rejected():
+    status, queue = _post(b'{"update_id": 1}', {"x-telegram-bot-api-secret-token": "x"}, "s")
+    assert status == 403
+    assert queue.empty()
@@ -1,53 +1,32 @@
-import sqlite3
 import os
-from datetime import datetime, date, time, timedelta
+import logging
+from datetime import datetime, date, time
 from dotenv import load_dotenv
-from core.sheets import end_trip_in_sheet  # <-- теперь доступна синхронно
+from core.outbox import notify
+from utils.db import get_connection, run_write
+from utils.migrations import migrate
+from utils.employees import directory
+from utils.storage import storage
+from utils.metrics import CLOSE_EXPIRED_CLOSED, CLOSE_EXPIRED_LAST, CLOSE_EXPIRED_RUNS
 
 load_dotenv()
 
-DB_PATH = 'court_tracking.db'
+logger = logging.getLogger(__name__)
+
 WORKDAY_START      = time(9, 0)
 WORKDAY_END_WEEK   = time(18, 0)
 WORKDAY_END_FRIDAY = time(16, 45)
 
 def init_db():
-    conn = sqlite3.connect(DB_PATH)
-    cur  = conn.cursor()
-    # таблица пользователей
-    cur.execute('''
-        CREATE TABLE IF NOT EXISTS employees (
-            user_id    INTEGER PRIMARY KEY,
-            full_name  TEXT      NOT NULL
-        )
-    ''')
-    # таблица поездок
-    cur.execute('''
-        CREATE TABLE IF NOT EXISTS trips (
-            id                INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id           INTEGER,
-            organization_id   TEXT,
-            organization_name TEXT,
-            start_datetime    DATETIME,
-            end_datetime      DATETIME,
-            status            TEXT,
-            FOREIGN KEY(user_id) REFERENCES employees(user_id)
-        )
-    ''')
-    # таблица конфигурации
-    cur.execute('''
-        CREATE TABLE IF NOT EXISTS config (
-            key   TEXT PRIMARY KEY,
-            value TEXT NOT NULL
-        )
-    ''')
-    # по умолчанию — рабочий режим
-    cur.execute('''
-        INSERT OR IGNORE INTO config (key, value)
-        VALUES ('DEBUG_MODE', 'false')
-    ''')
-    conn.commit()
-    conn.close()
+    """Создаёт/обновляет схему хранилища (utils/storage.py)."""
+    storage.migrate()
+    if storage.backend != "sqlite":
+        # зеркало листа «Поездки» — кэш экземпляра, всегда в локальной SQLite
+        migrate(get_connection())
+    with storage.transaction() as s:
+        if not s.get_config("PLANS_IMPORTED"):
+            # разовый импорт листа «Календарь» — первым делом в outbox (core/plans.py)
+            s.enqueue("import_plans", {})
 
 def get_now() -> datetime:
     """Текущее время без секунд/микр."""
@@ -57,20 +36,13 @@ def get_debug_mode() -> bool:
     env = os.getenv("DEBUG_MODE")
     if env is not None:
         return env.lower() in ("1", "true", "yes")
-    conn = sqlite3.connect(DB_PATH)
-    row  = conn.execute(
-        "SELECT value FROM config WHERE key='DEBUG_MODE'"
-    ).fetchone()
-    conn.close()
-    return bool(row and row[0].lower() == 'true')
+    with storage.session() as s:
+        value = s.get_config("DEBUG_MODE")
+    return bool(value and value.lower() == 'true')
 
 def is_registered(user_id: int) -> bool:
-    conn = sqlite3.connect(DB_PATH)
-    ok   = conn.execute(
-        "SELECT 1 FROM employees WHERE user_id = ?", (user_id,)
-    ).fetchone() is not None
-    conn.close()
-    return ok
+    # справочник в памяти — без запроса к БД на каждое сообщение
+    return directory.is_registered(user_id)
 
 def adjust_to_work_hours(dt: datetime) -> datetime | None:
     wd = dt.weekday()  # 0–4 = Пн–Пт
@@ -84,125 +56,130 @@ def adjust_to_work_hours(dt: datetime) -> datetime | None:
         return dt
     return None
 
-def save_trip_start(user_id: int, org_id: str, org_name: str) -> bool:
+def save_trip_start(user_id: int, org_id: str, org_name: str) -> datetime | None:
+    """
+    Открывает поездку и в той же транзакции ставит в очередь строку
+    для Google Sheets. Возвращает время старта или None, если поездка
+    уже открыта или сейчас нерабочее время.
+    """
     raw = get_now()
     debug = get_debug_mode()
     now = raw if debug else adjust_to_work_hours(raw)
     if not now:
-        return False
-
-    conn = sqlite3.connect(DB_PATH)
-    cur  = conn.cursor()
-    # нет ли уже in_progress
-    cur.execute(
-        "SELECT 1 FROM trips WHERE user_id = ? AND status = 'in_progress'",
-        (user_id,)
-    )
-    if cur.fetchone():
-        conn.close()
-        return False
-
-    cur.execute('''
-        INSERT INTO trips
-          (user_id, organization_id, organization_name, start_datetime, status)
-        VALUES (?, ?, ?, ?, 'in_progress')
-    ''', (user_id, org_id, org_name, now))
-    conn.commit()
-    conn.close()
-    return True
+        return None
+
+    with storage.transaction() as s:
+        # нет ли уже in_progress
+        if s.open_trip(user_id) is not None:
+            return None
+        trip_id = s.insert_trip(user_id, org_id, org_name, now)
+        if trip_id is None:
+            # открыта параллельно (другой экземпляр бота, PostgreSQL)
+            return None
+        s.enqueue("add_trip", {
+            "trip_id":   trip_id,
+            "full_name": directory.get_name(user_id),
+            "org_name":  org_name,
+            "start":     now.isoformat(),
+        })
+    notify()
+    return now
+
+def save_plan(user_id: int, org_name: str, plan_date: date, plan_time: str):
+    """
+    Сохраняет план в plans и в той же транзакции ставит в очередь
+    его вывод в лист «Календарь» (см. core/plans.py).
+    """
+    with storage.transaction() as s:
+        plan_id = s.insert_plan(user_id, plan_date.isoformat(),
+                                directory.get_name(user_id), org_name, plan_time)
+        s.enqueue("add_plan", {"plan_id": plan_id})
+    notify()
 
 def end_trip_local(user_id: int) -> tuple[bool, datetime|None]:
     now = get_now()
-    conn = sqlite3.connect(DB_PATH)
-    cur  = conn.cursor()
-    cur.execute('''
-        UPDATE trips
-        SET end_datetime = ?, status = 'completed'
-        WHERE user_id = ? AND status = 'in_progress'
-    ''', (now, user_id))
-    ok = cur.rowcount > 0
-    conn.commit()
-    conn.close()
+    with storage.transaction() as s:
+        ok = s.complete_open_trip(user_id, now)
     return ok, (now if ok else None)
 
 def fetch_last_completed(user_id: int) -> tuple[str, datetime]:
-    conn = sqlite3.connect(DB_PATH)
-    cur  = conn.cursor()
-    cur.execute('''
-        SELECT organization_name, start_datetime
-        FROM trips
-        WHERE user_id = ? AND status = 'completed'
-        ORDER BY start_datetime DESC LIMIT 1
-    ''', (user_id,))
-    org_name, start_dt = cur.fetchone()
-    conn.close()
-    if isinstance(start_dt, str):
-        try:
-            start_dt = datetime.fromisoformat(start_dt)
-        except:
-            start_dt = datetime.strptime(start_dt, "%Y-%m-%d %H:%M:%S")
+    with storage.session() as s:
+        org_name, start_dt = s.last_completed(user_id)
     return org_name, start_dt
 
-def close_expired_trips():
+def get_data_version() -> tuple[int, int]:
+    """
+    Версия данных для отчётов: счётчики изменений trips и employees
+    (ведутся триггерами, см. utils/migrations.py и utils/pg_storage.py).
+    Меняется при любой вставке/правке поездки или сотрудника.
+    """
+    with storage.session() as s:
+        return s.data_version()
+
+def get_status_counts() -> tuple[int, int]:
+    """(открытых поездок, записей outbox в очереди) — для /metrics."""
+    with storage.session() as s:
+        return s.status_counts()
+
+def iter_trips_between(start: date | None = None, end: date | None = None,
+                       chunk_size: int = 5000):
+    """
+    Поездки с ФИО для отчёта пачками по chunk_size строк: (full_name,
+    organization_name, start_datetime, end_datetime). Период [start, end]
+    включительно фильтруется в WHERE по индексу idx_trips_start — читаем
+    только нужный диапазон и не держим его в памяти целиком.
+    """
+    with storage.session() as s:
+        yield from s.trips_between(start, end, chunk_size)
+
+async def close_expired_trips():
     """
     Авто‑закрытие по расписанию — доводим in_progress
     до границы рабочего дня (или до now, если в DEBUG).
-    После этого сразу дополняем строку в Google Sheets.
+    Строки в Google Sheets дополняются через очередь outbox.
+    Сама работа с БД идёт в потоке-писателе, loop не блокируется.
+    Итог запуска — в bot_close_expired_* (/metrics).
     """
+    try:
+        closed = await run_write(_close_expired_trips)
+    except Exception:
+        CLOSE_EXPIRED_RUNS.inc(outcome="error")
+        raise
+    CLOSE_EXPIRED_RUNS.inc(outcome="closed" if closed else "nothing")
+    CLOSE_EXPIRED_CLOSED.inc(closed)
+    CLOSE_EXPIRED_LAST.set(datetime.now().timestamp())
+
+def _close_expired_trips() -> int:
     now   = get_now()
     debug = get_debug_mode()
-    conn  = sqlite3.connect(DB_PATH)
-    cur   = conn.cursor()
-
-    # теперь сразу берём user_id и org_name вместе с id
-    cur.execute("""
-        SELECT id, user_id, organization_name, start_datetime
-        FROM trips
-        WHERE status = 'in_progress'
-    """)
-    rows = cur.fetchall()
-    cnt = 0
-
-    for trip_id, user_id, org_name, start_str in rows:
-        # парсим время старта
-        try:
-            sd = datetime.fromisoformat(start_str)
-        except ValueError:
-            sd = datetime.strptime(start_str, "%Y-%m-%d %H:%M:%S")
-
-        # вычисляем конец
-        if not debug:
-            wd   = sd.weekday()
-            endt = WORKDAY_END_FRIDAY if wd == 4 else WORKDAY_END_WEEK
-            boundary = datetime.combine(sd.date(), endt)
-            end_dt = boundary if now >= boundary else now
-        else:
-            end_dt = now
-
-        # обновляем БД
-        cur.execute(
-            "UPDATE trips SET end_datetime = ?, status = 'completed' WHERE id = ?",
-            (end_dt, trip_id)
-        )
-        if cur.rowcount > 0:
-            # достаём ФИО
-            user_cur = conn.cursor()
-            user_cur.execute(
-                "SELECT full_name FROM employees WHERE user_id = ?", (user_id,)
-            )
-            full_name = user_cur.fetchone()[0]
-
-            # длительность
-            duration = end_dt - sd
-
-            # дополняем Google Sheets
-            try:
-                end_trip_in_sheet(full_name, org_name, sd, end_dt, duration)
-            except Exception as e:
-                print(f"[db][ERROR] end_trip_in_sheet failed for trip {trip_id}: {e}")
-
-            cnt += 1
-
-    conn.commit()
-    conn.close()
-    print(f"[db ] [{now.strftime('%Y-%m-%d %H:%M')}] Авто‑закрыто {cnt} поездок.")
+    with storage.transaction() as s:
+        # все открытые поездки сразу с ФИО — один запрос по частичному индексу
+        rows = s.open_trips()
+
+        # start_datetime уже datetime (конвертер DATETIME в utils/db.py, TIMESTAMP в PostgreSQL);
+        # границы считаем за один проход
+        updates, payloads = [], []
+        for trip_id, org_name, sd, full_name in rows:
+            if not debug:
+                endt = WORKDAY_END_FRIDAY if sd.weekday() == 4 else WORKDAY_END_WEEK
+                boundary = datetime.combine(sd.date(), endt)
+                end_dt = boundary if now >= boundary else now
+            else:
+                end_dt = now
+            updates.append((end_dt, trip_id))
+            payloads.append({
+                "trip_id":   trip_id,
+                "full_name": full_name,
+                "org_name":  org_name,
+                "start":     sd.isoformat(),
+                "end":       end_dt.isoformat(),
+                "duration":  int((end_dt - sd).total_seconds()),
+            })
+
+        s.complete_trips(updates)
+        # все дополнения строк листа — одной пачкой; outbox склеит их в один batch_update
+        s.enqueue_many("end_trip", payloads)
+
+    notify()
+    logger.info("db: [%s] авто‑закрыто %d поездок", now.strftime('%Y-%m-%d %H:%M'), len(rows))
+    return len(rows)
@@ -0,0 +1,203 @@
+# utils/db.py
+
+"""
+Единая точка подключения к SQLite.
+
+Каждый поток получает своё долгоживущее соединение (sqlite3-соединения
+нельзя делить между потоками), настроенное один раз: WAL, чтобы читатели
+(отчёты, скрипты, sync_users.py) не блокировали запись поездок,
+synchronous=NORMAL, busy timeout и увеличенный кэш подготовленных запросов.
+Путь к БД задаётся переменной окружения DB_PATH.
+
+Из async-хендлеров к БД ходим только через run_write/run_read: запись идёт
+в одном выделенном потоке (SQLite всё равно пишет по одному), чтение — в
+небольшом пуле, так что event loop не встаёт, даже если запись ждёт
+чужую блокировку. Фоновые потоки (outbox, зеркало листа) пишут через
+тот же поток — call_write; сами они только читают и ходят в Google.
+
+Время в колонках DATETIME хранится в одном формате — московское локальное
+'YYYY-MM-DD HH:MM:SS' (TIMESTAMP_FORMAT): строки сравниваются и сортируются
+как время, поэтому диапазонные условия идут по индексу. Адаптер и конвертер
+ниже переводят datetime туда и обратно без разбора в каждом месте чтения.
+"""
+
+import os
+import time
+import asyncio
+import sqlite3
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime
+
+import pytz
+from dotenv import load_dotenv
+
+from utils.metrics import SQL_SECONDS, statement_label
+
+load_dotenv()
+
+DB_PATH = os.getenv("DB_PATH", "court_tracking.db")
+
+BUSY_TIMEOUT_MS = 5000   # сколько ждём чужую блокировку записи
+STATEMENT_CACHE = 256    # подготовленных запросов на соединение (по умолчанию 128)
+READER_THREADS  = int(os.getenv("DB_READER_THREADS", "4"))
+
+MOSCOW_TZ        = pytz.timezone("Europe/Moscow")
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+_local = threading.local()
+
+
+def to_db_timestamp(dt: datetime) -> str:
+    """datetime → каноническая строка (aware-время переводится в МСК)."""
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(MOSCOW_TZ).replace(tzinfo=None)
+    return dt.isoformat(" ", "seconds")
+
+
+def parse_db_timestamp(value: str) -> datetime:
+    """
+    Строка из БД → naive московское datetime. Понимает и старые форматы
+    ('T', смещение +03:00, микросекунды) — нужно для миграции и скриптов.
+    """
+    dt = datetime.fromisoformat(value)
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(MOSCOW_TZ).replace(tzinfo=None)
+    return dt.replace(microsecond=0)
+
+
+sqlite3.register_adapter(datetime, to_db_timestamp)
+sqlite3.register_converter("DATETIME", lambda raw: parse_db_timestamp(raw.decode()))
+
+
+class TimedCursor(sqlite3.Cursor):
+    """Курсор, который пишет время execute/executemany в bot_sql_seconds."""
+
+    def execute(self, sql, parameters=()):
+        start = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            SQL_SECONDS.observe(time.perf_counter() - start, statement=statement_label(sql))
+
+    def executemany(self, sql, seq_of_parameters):
+        start = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            SQL_SECONDS.observe(time.perf_counter() - start, statement=statement_label(sql))
+
+
+class TimedConnection(sqlite3.Connection):
+    """
+    Соединение с замером запросов. Connection.execute в CPython идёт мимо
+    Python-метода курсора, поэтому переопределяем и его: все запросы —
+    и conn.execute, и conn.cursor().execute — проходят через TimedCursor.
+    """
+
+    def cursor(self, factory=TimedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+
+def connect(path: str | None = None, check_same_thread: bool = True) -> sqlite3.Connection:
+    """Новое соединение с нужными PRAGMA (для скриптов и отдельных потоков)."""
+    conn = sqlite3.connect(
+        path or DB_PATH,
+        check_same_thread=check_same_thread,
+        timeout=BUSY_TIMEOUT_MS / 1000,
+        cached_statements=STATEMENT_CACHE,
+        # колонки DATETIME сразу приходят как datetime
+        detect_types=sqlite3.PARSE_DECLTYPES,
+        # время каждого запроса → /metrics (utils/metrics.py)
+        factory=TimedConnection,
+    )
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+    return conn
+
+
+def get_connection() -> sqlite3.Connection:
+    """Соединение текущего потока; создаётся при первом обращении."""
+    conn = getattr(_local, "conn", None)
+    if conn is None or _local.path != DB_PATH:
+        if conn is not None:
+            conn.close()
+        conn = _local.conn = connect(DB_PATH)
+        _local.path = DB_PATH
+    return conn
+
+
+@contextmanager
+def transaction():
+    """
+    Пишущая транзакция: BEGIN IMMEDIATE сразу берёт блокировку записи,
+    чтобы проверка и вставка не разъехались и не ловили SQLITE_BUSY
+    на повышении блокировки. Коммит при успехе, откат при исключении.
+    """
+    conn = get_connection()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield conn
+    except BaseException:
+        conn.rollback()
+        raise
+    else:
+        conn.commit()
+
+
+def iter_chunks(cur: sqlite3.Cursor, size: int):
+    """Отдаёт результат запроса пачками по size строк (fetchmany), не держа всё в памяти."""
+    while True:
+        rows = cur.fetchmany(size)
+        if not rows:
+            return
+        yield rows
+
+
+def close_connection():
+    """Закрывает соединение текущего потока (скрипты, завершение работы)."""
+    conn = getattr(_local, "conn", None)
+    if conn is not None:
+        conn.close()
+        _local.conn = None
+
+
+# --- асинхронный доступ -----------------------------------------------------
+
+WRITER_THREAD = "sqlite-writer"
+
+_writer  = ThreadPoolExecutor(max_workers=1, thread_name_prefix=WRITER_THREAD)
+_readers = ThreadPoolExecutor(max_workers=READER_THREADS, thread_name_prefix="sqlite-reader")
+
+
+async def run_write(func, *args, **kwargs):
+    """Выполняет func(*args) в потоке-писателе и ждёт результат, не блокируя loop."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_writer, functools.partial(func, *args, **kwargs))
+
+
+def call_write(func, *args, **kwargs):
+    """
+    Синхронный run_write для кода, который уже работает в фоновом потоке:
+    ждёт, пока поток-писатель выполнит func(*args). В самом писателе
+    выполняет сразу. Функции писателя не должны ждать замков, которые
+    держит вызывающий, иначе взаимная блокировка.
+    """
+    if threading.current_thread().name.startswith(WRITER_THREAD):
+        return func(*args, **kwargs)
+    return _writer.submit(func, *args, **kwargs).result()
+
+
+async def run_read(func, *args, **kwargs):
+    """Выполняет читающую func(*args) в пуле читателей."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_readers, functools.partial(func, *args, **kwargs))
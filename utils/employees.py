@@ -0,0 +1,95 @@
+# utils/employees.py
+
+"""
+Справочник сотрудников в памяти: user_id → ФИО.
+
+Загружается один раз при старте, /register дописывает в него сам, а фоновая
+задача раз в REFRESH_INTERVAL секунд проверяет, не менялась ли таблица
+employees снаружи (скрипты, ручные правки, другие экземпляры бота на общей
+PostgreSQL). Проверка дешёвая: один счётчик изменений employees, который
+ведут триггеры (см. utils/migrations.py и utils/pg_storage.py), и только
+при его изменении — полное перечитывание. Поэтому is_registered и поиск
+ФИО на каждом сообщении не трогают БД.
+"""
+
+import asyncio
+import logging
+import threading
+
+from utils.storage import storage
+
+logger = logging.getLogger(__name__)
+
+REFRESH_INTERVAL = 30  # сек.
+
+
+class EmployeeDirectory:
+    def __init__(self):
+        self._names: dict[int, str] = {}
+        self._loaded = False
+        self._lock = threading.Lock()
+        self._version = None
+
+    def load(self):
+        with self._lock:
+            with storage.session() as s:
+                self._version = s.employees_version()
+                self._names = s.employee_names()
+            self._loaded = True
+        logger.info("employees: загружено %d сотрудников", len(self._names))
+
+    def refresh_if_changed(self) -> bool:
+        """Перечитывает справочник, если employees менялась. True — если перечитали."""
+        if not self._loaded:
+            self.load()
+            return True
+        with storage.session() as s:
+            if s.employees_version() == self._version:
+                return False
+        self.load()
+        return True
+
+    def _ensure_loaded(self):
+        if not self._loaded:
+            self.load()
+
+    def is_registered(self, user_id: int) -> bool:
+        self._ensure_loaded()
+        return user_id in self._names
+
+    def get_name(self, user_id: int) -> str | None:
+        self._ensure_loaded()
+        return self._names.get(user_id)
+
+    def add(self, user_id: int, full_name: str):
+        """Вызывается после успешного INSERT в employees (core/register.py)."""
+        self._names[user_id] = full_name
+
+    def close(self):
+        """Забывает загруженный справочник: следующее обращение перечитает его."""
+        with self._lock:
+            self._names = {}
+            self._loaded = False
+            self._version = None
+
+
+directory = EmployeeDirectory()
+
+_task: asyncio.Task | None = None
+
+
+async def _refresh_loop():
+    while True:
+        await asyncio.sleep(REFRESH_INTERVAL)
+        try:
+            await asyncio.to_thread(directory.refresh_if_changed)
+        except Exception:
+            logger.exception("employees: ошибка при обновлении справочника")
+
+
+def start_refresher() -> asyncio.Task:
+    """Запускает фоновую проверку изменений (вызывается из post_init)."""
+    global _task
+    if _task is None or _task.done():
+        _task = asyncio.get_running_loop().create_task(_refresh_loop())
+    return _task
@@ -0,0 +1,135 @@
+# utils/log.py
+
+"""
+Логирование бота: неблокирующее и со структурными полями.
+
+Все логгеры пишут в QueueHandler — запись в очередь стоит микросекунды,
+а форматирование и вывод (stdout, файл LOG_FILE) делает QueueListener
+в своём потоке. Так вывод логов не задерживает event loop и хендлеры.
+
+К каждой записи добавляются поля из контекста (contextvars) — user_id
+и handler текущего апдейта (их выставляет utils.metrics.track_handler),
+а также всё, что передано через extra= (duration_ms, outcome, …).
+
+Настройка через переменные окружения:
+    LOG_LEVEL   — общий уровень (INFO);
+    LOG_LEVELS  — уровни по модулям: "core.sheets=DEBUG,httpx=WARNING";
+    LOG_FORMAT  — "text" (по умолчанию) или "json" (одна JSON-строка на запись);
+    LOG_FILE    — дополнительно писать в файл.
+"""
+
+import os
+import sys
+import json
+import queue
+import atexit
+import logging
+import contextvars
+from logging.handlers import QueueHandler, QueueListener
+
+LOG_LEVEL  = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_LEVELS = os.getenv("LOG_LEVELS", "")
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text").lower()
+LOG_FILE   = os.getenv("LOG_FILE")
+
+# httpx пишет INFO на каждый запрос к Bot API (в polling — раз в 10 с)
+DEFAULT_LEVELS = {"httpx": "WARNING", "apscheduler": "WARNING"}
+
+# структурные поля, которые выводятся, если есть в записи
+FIELDS = ("user_id", "handler", "duration_ms", "outcome")
+
+user_id_var: contextvars.ContextVar[int | None] = contextvars.ContextVar("user_id", default=None)
+handler_var: contextvars.ContextVar[str | None] = contextvars.ContextVar("handler", default=None)
+
+_listener: QueueListener | None = None
+
+
+class ContextFilter(logging.Filter):
+    """Дописывает в запись user_id/handler текущего апдейта (в потоке вызова)."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if getattr(record, "user_id", None) is None:
+            record.user_id = user_id_var.get()
+        if getattr(record, "handler", None) is None:
+            record.handler = handler_var.get()
+        return True
+
+
+class TextFormatter(logging.Formatter):
+    """Обычная строка лога + структурные поля в виде key=value."""
+
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s %(name)s: %(message)s",
+                         datefmt="%Y-%m-%d %H:%M:%S")
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        fields = " ".join(
+            f"{name}={value}" for name in FIELDS
+            if (value := getattr(record, name, None)) is not None
+        )
+        return f"{line} [{fields}]" if fields else line
+
+
+class JsonFormatter(logging.Formatter):
+    """Одна JSON-строка на запись — для сборщиков логов."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            "ts":     self.formatTime(record, "%Y-%m-%dT%H:%M:%S"),
+            "level":  record.levelname,
+            "logger": record.name,
+            "msg":    record.getMessage(),
+        }
+        for name in FIELDS:
+            value = getattr(record, name, None)
+            if value is not None:
+                data[name] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            data["exc"] = record.exc_text
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+def _parse_levels(spec: str) -> dict[str, str]:
+    levels = dict(DEFAULT_LEVELS)
+    for item in spec.split(","):
+        name, sep, level = item.strip().partition("=")
+        if sep and name.strip():
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def setup_logging():
+    """
+    Настраивает корневой логгер: QueueHandler → QueueListener → stdout/файл.
+    Повторный вызов ничего не делает.
+    """
+    global _listener
+    if _listener is not None:
+        return
+
+    formatter = JsonFormatter() if LOG_FORMAT == "json" else TextFormatter()
+    outputs: list[logging.Handler] = [logging.StreamHandler(sys.stdout)]
+    if LOG_FILE:
+        outputs.append(logging.FileHandler(LOG_FILE, encoding="utf-8"))
+    for handler in outputs:
+        handler.setFormatter(formatter)
+
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    queue_handler = QueueHandler(log_queue)
+    queue_handler.addFilter(ContextFilter())
+
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(LOG_LEVEL)
+    for name, level in _parse_levels(LOG_LEVELS).items():
+        logging.getLogger(name).setLevel(level)
+
+    _listener = QueueListener(log_queue, *outputs, respect_handler_level=True)
+    _listener.start()
+    # при выходе — дописать всё, что осталось в очереди
+    atexit.register(_listener.stop)
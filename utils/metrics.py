@@ -0,0 +1,252 @@
+# utils/metrics.py
+
+"""
+Метрики в текстовом формате Prometheus (отдаются на /metrics, см. webserver.py).
+
+Маленький реестр без внешних зависимостей: счётчики, gauge и гистограммы
+с метками. Всё потокобезопасно — наблюдения приходят и из event loop,
+и из потоков (SQLite-писатель/читатели, outbox, обновление зеркала).
+
+Что меряем:
+- bot_handler_seconds / bot_handler_total — хендлеры (@track_handler);
+- bot_sheets_call_seconds / bot_sheets_errors_total — функции core.sheets;
+- bot_sql_seconds — выполнение SQL по тексту запроса (utils/db.py);
+- bot_open_trips, bot_outbox_pending — считаются при запросе /metrics;
+- bot_close_expired_* — итоги авто-закрытия по расписанию.
+"""
+
+import re
+import time
+import contextvars
+import math
+import logging
+import threading
+import functools
+from contextlib import contextmanager
+
+from utils.log import handler_var, user_id_var
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+_registry: list["_Metric"] = []
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: tuple[str, ...], values: tuple, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _number(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, doc: str, labelnames: tuple[str, ...] = ()):
+        self.name = name
+        self.doc = doc
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values: dict[tuple, object] = {}
+        _registry.append(self)
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(labels.get(n, "") for n in self.labelnames)
+
+    def _samples(self) -> list[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        with self._lock:
+            samples = self._samples()
+        head = f"# HELP {self.name} {self.doc}\n# TYPE {self.name} {self.kind}\n"
+        return head + "".join(line + "\n" for line in samples)
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def _samples(self):
+        return [
+            f"{self.name}{_labels(self.labelnames, key)} {_number(v)}"
+            for key, v in self._values.items()
+        ]
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def _samples(self):
+        return [
+            f"{self.name}{_labels(self.labelnames, key)} {_number(v)}"
+            for key, v in self._values.items()
+        ]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, doc: str, labelnames: tuple[str, ...] = (),
+                 buckets: tuple[float, ...] = DEFAULT_BUCKETS):
+        super().__init__(name, doc, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # [счётчики по корзинам..., сумма, количество]
+                state = self._values[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[i] += 1
+                    break
+            state[-2] += value
+            state[-1] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def _samples(self):
+        lines = []
+        for key, state in self._values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets, state):
+                cumulative += count
+                le = f'le="{_number(bound)}"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {_number(state[-2])}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {state[-1]}")
+        return lines
+
+
+def render() -> str:
+    """Все метрики в текстовом формате Prometheus."""
+    return "".join(m.render() for m in _registry)
+
+
+# --- метрики бота ---------------------------------------------------------------
+
+HANDLER_SECONDS = Histogram(
+    "bot_handler_seconds", "Время обработки апдейта хендлером", ("handler",)
+)
+HANDLER_TOTAL = Counter(
+    "bot_handler_total", "Вызовы хендлеров по исходу", ("handler", "outcome")
+)
+UPDATES_IN_PROGRESS = Gauge(
+    "bot_updates_in_progress", "Обновления в обработке (включая ждущие своей очереди)"
+)
+SHEETS_SECONDS = Histogram(
+    "bot_sheets_call_seconds", "Длительность вызовов core.sheets", ("function",)
+)
+SHEETS_ERRORS = Counter(
+    "bot_sheets_errors_total", "Ошибки вызовов core.sheets", ("function",)
+)
+SQL_SECONDS = Histogram(
+    "bot_sql_seconds", "Выполнение SQL-запросов (execute/executemany)", ("statement",),
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1, 5),
+)
+OPEN_TRIPS = Gauge("bot_open_trips", "Незавершённые поездки (status = in_progress)")
+OUTBOX_PENDING = Gauge("bot_outbox_pending", "Записи outbox, ждущие отправки в Google Sheets")
+CLOSE_EXPIRED_RUNS = Counter(
+    "bot_close_expired_runs_total", "Запуски авто-закрытия по исходу", ("outcome",)
+)
+CLOSE_EXPIRED_CLOSED = Counter(
+    "bot_close_expired_trips_total", "Поездки, закрытые авто-закрытием"
+)
+CLOSE_EXPIRED_LAST = Gauge(
+    "bot_close_expired_last_run_timestamp", "Время последнего авто-закрытия (unix)"
+)
+
+
+# имя хендлера текущего учитываемого вызова; вложенный вызов его подменяет
+_tracked: contextvars.ContextVar[list[str] | None] = contextvars.ContextVar(
+    "tracked_handler", default=None
+)
+
+
+def track_handler(func):
+    """
+    Декоратор async-хендлера: длительность и исход в HANDLER_*, плюс
+    user_id/handler в контекст логов (utils/log.py) и одна строка лога
+    с duration_ms на вызов.
+
+    Вложенный вызов (handle_main_menu → end_trip) отдельно не учитывается:
+    обновление считается один раз, под именем хендлера, который его
+    на самом деле обработал.
+    """
+    name = func.__name__
+
+    @functools.wraps(func)
+    async def wrapper(update, *args, **kwargs):
+        tracked = _tracked.get()
+        if tracked is not None:
+            tracked[0] = name
+            handler_token = handler_var.set(name)
+            try:
+                return await func(update, *args, **kwargs)
+            finally:
+                handler_var.reset(handler_token)
+
+        tracked = [name]
+        tracked_token = _tracked.set(tracked)
+        user = getattr(update, "effective_user", None)
+        user_token = user_id_var.set(user.id if user else None)
+        handler_token = handler_var.set(name)
+        start = time.perf_counter()
+        outcome = "ok"
+        try:
+            return await func(update, *args, **kwargs)
+        except Exception:
+            outcome = "error"
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            handler_var.set(tracked[0])
+            HANDLER_SECONDS.observe(elapsed, handler=tracked[0])
+            HANDLER_TOTAL.inc(handler=tracked[0], outcome=outcome)
+            logger.info("handled", extra={
+                "duration_ms": round(elapsed * 1000, 1), "outcome": outcome,
+            })
+            handler_var.reset(handler_token)
+            user_id_var.reset(user_token)
+            _tracked.reset(tracked_token)
+    return wrapper
+
+
+_SPACES = re.compile(r"\s+")
+_PLACEHOLDERS = re.compile(r"\?(?:\s*,\s*\?)+")
+
+
+@functools.lru_cache(maxsize=512)
+def statement_label(sql: str) -> str:
+    """Текст запроса как метка: без лишних пробелов, списки (?, ?, …) свёрнуты."""
+    sql = _SPACES.sub(" ", sql).strip()
+    sql = _PLACEHOLDERS.sub("?…", sql)
+    return sql if len(sql) <= 120 else sql[:117] + "..."
@@ -0,0 +1,263 @@
+# utils/migrations.py
+
+"""
+Версионированные миграции схемы SQLite.
+
+Текущая версия хранится в PRAGMA user_version. При старте (init_db)
+применяются по порядку все миграции с номером больше текущего, каждая —
+в своей транзакции вместе с обновлением user_version. Новую миграцию
+добавляем в конец MIGRATIONS; уже выпущенные не меняем.
+"""
+
+import logging
+import sqlite3
+
+from utils.db import parse_db_timestamp, to_db_timestamp
+
+logger = logging.getLogger(__name__)
+
+
+def _add_column(cur: sqlite3.Cursor, table: str, column: str, decl: str):
+    cols = {row[1] for row in cur.execute(f"PRAGMA table_info({table})")}
+    if column not in cols:
+        cur.execute(f"ALTER TABLE {table} ADD COLUMN {column} {decl}")
+
+
+def _m001_base_schema(cur: sqlite3.Cursor):
+    # таблица пользователей
+    cur.execute('''
+        CREATE TABLE IF NOT EXISTS employees (
+            user_id    INTEGER PRIMARY KEY,
+            full_name  TEXT      NOT NULL
+        )
+    ''')
+    # таблица поездок
+    cur.execute('''
+        CREATE TABLE IF NOT EXISTS trips (
+            id                INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id           INTEGER,
+            organization_id   TEXT,
+            organization_name TEXT,
+            start_datetime    DATETIME,
+            end_datetime      DATETIME,
+            status            TEXT,
+            FOREIGN KEY(user_id) REFERENCES employees(user_id)
+        )
+    ''')
+    # таблица конфигурации
+    cur.execute('''
+        CREATE TABLE IF NOT EXISTS config (
+            key   TEXT PRIMARY KEY,
+            value TEXT NOT NULL
+        )
+    ''')
+    # очередь записей в Google Sheets (см. core/outbox.py)
+    cur.execute('''
+        CREATE TABLE IF NOT EXISTS sheets_outbox (
+            id              INTEGER PRIMARY KEY AUTOINCREMENT,
+            op              TEXT    NOT NULL,
+            payload         TEXT    NOT NULL,
+            attempts        INTEGER NOT NULL DEFAULT 0,
+            next_attempt_at REAL    NOT NULL DEFAULT 0,
+            last_error      TEXT,
+            failed          INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    # по умолчанию — рабочий режим
+    cur.execute('''
+        INSERT OR IGNORE INTO config (key, value)
+        VALUES ('DEBUG_MODE', 'false')
+    ''')
+
+
+def _m002_missing_columns(cur: sqlite3.Cursor):
+    # is_active ждёт scripts/export_report.py, но код его нигде не создавал
+    _add_column(cur, "employees", "is_active", "INTEGER NOT NULL DEFAULT 1")
+    # номер строки в листе «Поездки» (core/sheets.end_trips_in_sheet)
+    _add_column(cur, "trips", "sheet_row", "INTEGER")
+
+
+def _m003_trip_indexes(cur: sqlite3.Cursor):
+    # открытые поездки: save_trip_start/end_trip (user_id + in_progress)
+    # и полный обход в close_expired_trips читают только этот маленький индекс
+    cur.execute('''
+        CREATE INDEX IF NOT EXISTS idx_trips_in_progress
+        ON trips(user_id) WHERE status = 'in_progress'
+    ''')
+    # история пользователя: fetch_last_completed (ORDER BY start_datetime DESC)
+    cur.execute('''
+        CREATE INDEX IF NOT EXISTS idx_trips_user_status_start
+        ON trips(user_id, status, start_datetime)
+    ''')
+
+
+def _m004_canonical_timestamps(cur: sqlite3.Cursor):
+    # В trips исторически смешаны форматы: адаптер sqlite3 ('2025-07-01 09:00:00'),
+    # ISO с 'T', смещением +03:00 и микросекундами (скрипты, старые версии бота).
+    # Приводим всё к одному виду, чтобы читать без разбора и фильтровать по индексу.
+    # Конвертер DATETIME (utils/db.py) падает на неразобранном значении, а такая
+    # строка ломала бы каждую выборку с ней (отчёт, автозакрытие). Поэтому
+    # поездки с неразобранным временем переносятся как есть в trips_unparsed:
+    # там колонки TEXT, их можно поправить вручную и вернуть.
+    cur.execute('''
+        CREATE TABLE IF NOT EXISTS trips_unparsed (
+            id                INTEGER PRIMARY KEY,
+            user_id           INTEGER,
+            organization_id   TEXT,
+            organization_name TEXT,
+            start_datetime    TEXT,
+            end_datetime      TEXT,
+            status            TEXT,
+            sheet_row         INTEGER
+        )
+    ''')
+    rows = cur.execute(
+        "SELECT id, CAST(start_datetime AS TEXT), CAST(end_datetime AS TEXT) FROM trips"
+    ).fetchall()
+    updates, unparsed = [], []
+    for trip_id, start, end in rows:
+        try:
+            fixed = [
+                None if value is None else to_db_timestamp(parse_db_timestamp(value))
+                for value in (start, end)
+            ]
+        except ValueError:
+            logger.error("migrations: поездка %s — не разобрано время (%r, %r), "
+                         "перенесена в trips_unparsed", trip_id, start, end)
+            unparsed.append((trip_id,))
+            continue
+        if fixed != [start, end]:
+            updates.append((*fixed, trip_id))
+    cur.executemany(
+        "UPDATE trips SET start_datetime = ?, end_datetime = ? WHERE id = ?", updates
+    )
+    cur.executemany('''
+        INSERT INTO trips_unparsed
+        SELECT id, user_id, organization_id, organization_name,
+               CAST(start_datetime AS TEXT), CAST(end_datetime AS TEXT), status, sheet_row
+        FROM trips WHERE id = ?
+    ''', unparsed)
+    cur.executemany("DELETE FROM trips WHERE id = ?", unparsed)
+    # выборки по периоду (отчёты, скрипты) по всем сотрудникам
+    cur.execute('''
+        CREATE INDEX IF NOT EXISTS idx_trips_start
+        ON trips(start_datetime)
+    ''')
+
+
+def _m005_employees_version(cur: sqlite3.Cursor):
+    # счётчик изменений employees для справочника в памяти (utils/employees.py)
+    cur.execute('''
+        INSERT OR IGNORE INTO config (key, value)
+        VALUES ('EMPLOYEES_VERSION', '0')
+    ''')
+    for event in ("INSERT", "UPDATE", "DELETE"):
+        cur.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_employees_version_{event.lower()}
+            AFTER {event} ON employees
+            BEGIN
+                UPDATE config SET value = CAST(value AS INTEGER) + 1
+                WHERE key = 'EMPLOYEES_VERSION';
+            END
+        ''')
+
+
+def _m006_trips_version(cur: sqlite3.Cursor):
+    # счётчик изменений trips — часть ключа кэша отчётов (core/report.py).
+    # sheet_row не считается: это служебная отметка outbox, в отчёт не попадает
+    cur.execute('''
+        INSERT OR IGNORE INTO config (key, value)
+        VALUES ('TRIPS_VERSION', '0')
+    ''')
+    events = {
+        "insert": "INSERT",
+        "update": "UPDATE OF user_id, organization_id, organization_name, "
+                  "start_datetime, end_datetime, status",
+        "delete": "DELETE",
+    }
+    for name, event in events.items():
+        cur.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_trips_version_{name}
+            AFTER {event} ON trips
+            BEGIN
+                UPDATE config SET value = CAST(value AS INTEGER) + 1
+                WHERE key = 'TRIPS_VERSION';
+            END
+        ''')
+
+
+def _m007_sheet_mirror(cur: sqlite3.Cursor):
+    # локальная копия листов Google Sheets (core/sheet_mirror.py)
+    cur.execute('''
+        CREATE TABLE IF NOT EXISTS sheet_rows (
+            sheet TEXT    NOT NULL,
+            row   INTEGER NOT NULL,
+            data  TEXT    NOT NULL,
+            PRIMARY KEY (sheet, row)
+        ) WITHOUT ROWID
+    ''')
+    cur.execute('''
+        CREATE TABLE IF NOT EXISTS sheet_sync (
+            sheet       TEXT PRIMARY KEY,
+            synced_rows INTEGER NOT NULL DEFAULT 0,
+            synced_at   REAL    NOT NULL DEFAULT 0
+        )
+    ''')
+
+
+def _m008_plans(cur: sqlite3.Cursor):
+    # планы поездок; лист «Календарь» строится из них (core/plans.py)
+    cur.execute('''
+        CREATE TABLE IF NOT EXISTS plans (
+            id         INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id    INTEGER,
+            plan_date  TEXT    NOT NULL,
+            full_name  TEXT    NOT NULL,
+            org_name   TEXT    NOT NULL,
+            plan_time  TEXT    NOT NULL,
+            in_sheet   INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    # порядок листа — (plan_date, id); rowid входит в индекс неявно
+    cur.execute('''
+        CREATE INDEX IF NOT EXISTS idx_plans_date
+        ON plans(plan_date)
+    ''')
+
+
+MIGRATIONS = [
+    (1, _m001_base_schema),
+    (2, _m002_missing_columns),
+    (3, _m003_trip_indexes),
+    (4, _m004_canonical_timestamps),
+    (5, _m005_employees_version),
+    (6, _m006_trips_version),
+    (7, _m007_sheet_mirror),
+    (8, _m008_plans),
+]
+
+
+def get_version(conn: sqlite3.Connection) -> int:
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(conn: sqlite3.Connection) -> int:
+    """Применяет недостающие миграции. Возвращает итоговую версию схемы."""
+    version = get_version(conn)
+    for number, apply in MIGRATIONS:
+        if number <= version:
+            continue
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            apply(conn.cursor())
+            conn.execute(f"PRAGMA user_version = {number}")
+        except BaseException:
+            conn.rollback()
+            raise
+        conn.commit()
+        logger.info("migrations: схема обновлена до версии %d (%s)",
+                    number, apply.__name__)
+        version = number
+    # обновляем статистику планировщика для новых индексов
+    conn.execute("PRAGMA optimize")
+    return version
@@ -0,0 +1,331 @@
+# utils/pg_storage.py
+
+"""
+PostgreSQL-бэкенд хранилища (STORAGE_BACKEND=postgres, см. utils/storage.py).
+
+Одна общая БД для нескольких экземпляров бота:
+- соединения берутся из пула (psycopg2 ThreadedConnectionPool, размер —
+  PG_POOL_MIN/PG_POOL_MAX) и возвращаются в него после каждой сессии;
+  если свободных нет, сессия ждёт (до PG_POOL_TIMEOUT сек.), а не падает.
+  Одновременно соединения держат: поток-писатель, пул читателей
+  (DB_READER_THREADS), разбор outbox (он же во время доставки открывает
+  вторую сессию) и фоновые задачи (справочник сотрудников, sync_users) —
+  PG_POOL_MAX должен быть не меньше DB_READER_THREADS + 5;
+- одна открытая поездка на сотрудника гарантируется уникальным частичным
+  индексом, а не только проверкой перед вставкой: два экземпляра не
+  откроют вторую поездку параллельно;
+- строки, которые закрываются (end_trip, авто-закрытие), блокируются
+  SELECT … FOR UPDATE;
+- outbox разбирает один экземпляр за раз (advisory lock), порядок
+  доставки в Google Sheets сохраняется;
+- счётчики изменений trips/employees (кэш отчётов, справочник
+  сотрудников) — последовательности, которые двигают триггеры: без
+  блокировки общей строки config на каждой записи.
+
+Время хранится в TIMESTAMP без пояса — московское локальное, как и
+в SQLite. Схема версионируется в таблице schema_version; новые миграции
+добавляются в конец PG_MIGRATIONS.
+
+Проверить на локальном сервере:
+    STORAGE_BACKEND=postgres DATABASE_URL=postgresql://localhost/court_test \\
+        python -m scripts.check_storage
+"""
+
+import os
+import time
+import logging
+import functools
+import threading
+from contextlib import contextmanager
+
+import psycopg2
+import psycopg2.extensions
+import psycopg2.pool
+
+from utils import db
+from utils.metrics import SQL_SECONDS, statement_label
+from utils.storage import Session, Storage
+
+logger = logging.getLogger(__name__)
+
+OUTBOX_LOCK_KEY = 0x6F7574626F78   # ключ advisory lock разборщика outbox
+MIGRATION_LOCK_KEY = 0x736368656D61
+POOL_TIMEOUT = float(os.getenv("PG_POOL_TIMEOUT", "30"))  # сек. ожидания соединения
+STREAM_ROWS = 5000                 # строк за один FETCH серверного курсора
+
+
+@functools.lru_cache(maxsize=512)
+def _sql(query: str) -> str:
+    # запросы Session пишутся с «?»; литеральных ? и % в них нет
+    return query.replace("?", "%s")
+
+
+class PostgresSession(Session):
+    def _observe(self, query: str, start: float):
+        SQL_SECONDS.observe(time.perf_counter() - start, statement=statement_label(query))
+
+    def _execute(self, query: str, params=()):
+        cur = self.conn.cursor()
+        start = time.perf_counter()
+        try:
+            cur.execute(_sql(query), tuple(params))
+        finally:
+            self._observe(query, start)
+        return cur
+
+    def _executemany(self, query: str, seq_of_params):
+        cur = self.conn.cursor()
+        start = time.perf_counter()
+        try:
+            cur.executemany(_sql(query), seq_of_params)
+        finally:
+            self._observe(query, start)
+        return cur
+
+    def _stream(self, query: str, params=()):
+        # серверный курсор: результат приходит пачками, а не целиком
+        cur = self.conn.cursor(name=f"stream_{id(self)}")
+        cur.itersize = STREAM_ROWS
+        cur.execute(_sql(query), tuple(params))
+        return cur
+
+    def _insert(self, query: str, params) -> int | None:
+        # ON CONFLICT DO NOTHING срабатывает и на частичный уникальный индекс
+        row = self._execute(query + " ON CONFLICT DO NOTHING RETURNING id", params).fetchone()
+        return row[0] if row else None
+
+    def _lock(self, table: str) -> str:
+        return f" FOR UPDATE OF {table}"
+
+    @contextmanager
+    def outbox_lock(self):
+        got = self._execute("SELECT pg_try_advisory_lock(?)", (OUTBOX_LOCK_KEY,)).fetchone()[0]
+        self.commit()
+        try:
+            yield got
+        finally:
+            if got:
+                self.rollback()
+                self._execute("SELECT pg_advisory_unlock(?)", (OUTBOX_LOCK_KEY,))
+                self.commit()
+
+    def data_version(self) -> tuple[int, int]:
+        # до первого nextval last_value уже 1 — отличаем по is_called
+        return tuple(self._execute(
+            "SELECT (SELECT CASE WHEN is_called THEN last_value ELSE 0 END FROM trips_version_seq), "
+            "(SELECT CASE WHEN is_called THEN last_value ELSE 0 END FROM employees_version_seq)"
+        ).fetchone())
+
+
+# --- схема ---------------------------------------------------------------------
+
+def _m001_base_schema(cur):
+    cur.execute('''
+        CREATE TABLE IF NOT EXISTS employees (
+            user_id    BIGINT  PRIMARY KEY,
+            full_name  TEXT    NOT NULL,
+            is_active  INTEGER NOT NULL DEFAULT 1
+        )
+    ''')
+    # внешнего ключа на employees нет: как и в SQLite (там он не проверяется),
+    # поездки могут пережить удаление сотрудника
+    cur.execute('''
+        CREATE TABLE IF NOT EXISTS trips (
+            id                BIGSERIAL PRIMARY KEY,
+            user_id           BIGINT,
+            organization_id   TEXT,
+            organization_name TEXT,
+            start_datetime    TIMESTAMP,
+            end_datetime      TIMESTAMP,
+            status            TEXT,
+            sheet_row         INTEGER
+        )
+    ''')
+    cur.execute('''
+        CREATE TABLE IF NOT EXISTS config (
+            key   TEXT PRIMARY KEY,
+            value TEXT NOT NULL
+        )
+    ''')
+    cur.execute('''
+        CREATE TABLE IF NOT EXISTS sheets_outbox (
+            id              BIGSERIAL        PRIMARY KEY,
+            op              TEXT             NOT NULL,
+            payload         TEXT             NOT NULL,
+            attempts        INTEGER          NOT NULL DEFAULT 0,
+            next_attempt_at DOUBLE PRECISION NOT NULL DEFAULT 0,
+            last_error      TEXT,
+            failed          INTEGER          NOT NULL DEFAULT 0
+        )
+    ''')
+    cur.execute('''
+        CREATE TABLE IF NOT EXISTS plans (
+            id         BIGSERIAL PRIMARY KEY,
+            user_id    BIGINT,
+            plan_date  TEXT    NOT NULL,
+            full_name  TEXT    NOT NULL,
+            org_name   TEXT    NOT NULL,
+            plan_time  TEXT    NOT NULL,
+            in_sheet   INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    cur.execute('''
+        INSERT INTO config (key, value) VALUES ('DEBUG_MODE', 'false')
+        ON CONFLICT DO NOTHING
+    ''')
+
+    # те же горячие пути, что в utils/migrations.py; открытая поездка — уникальна
+    cur.execute('''
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_trips_in_progress
+        ON trips(user_id) WHERE status = 'in_progress'
+    ''')
+    cur.execute('''
+        CREATE INDEX IF NOT EXISTS idx_trips_user_status_start
+        ON trips(user_id, status, start_datetime)
+    ''')
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_trips_start ON trips(start_datetime)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_plans_date ON plans(plan_date, id)")
+    cur.execute('''
+        CREATE INDEX IF NOT EXISTS idx_outbox_pending
+        ON sheets_outbox(id) WHERE failed = 0
+    ''')
+
+    # счётчики изменений: последовательность двигается без блокировок строк
+    cur.execute("CREATE SEQUENCE IF NOT EXISTS trips_version_seq")
+    cur.execute("CREATE SEQUENCE IF NOT EXISTS employees_version_seq")
+    cur.execute('''
+        CREATE OR REPLACE FUNCTION bump_version() RETURNS trigger
+        LANGUAGE plpgsql AS $$
+        BEGIN
+            PERFORM nextval(TG_ARGV[0]::regclass);
+            RETURN NULL;
+        END
+        $$
+    ''')
+    cur.execute('''
+        CREATE TRIGGER trg_employees_version
+        AFTER INSERT OR UPDATE OR DELETE ON employees
+        FOR EACH STATEMENT EXECUTE FUNCTION bump_version('employees_version_seq')
+    ''')
+    # sheet_row — служебная отметка outbox, в отчёт не попадает
+    cur.execute('''
+        CREATE TRIGGER trg_trips_version
+        AFTER INSERT OR DELETE OR UPDATE OF user_id, organization_id, organization_name,
+                                           start_datetime, end_datetime, status
+        ON trips
+        FOR EACH STATEMENT EXECUTE FUNCTION bump_version('trips_version_seq')
+    ''')
+
+
+PG_MIGRATIONS = [
+    (1, _m001_base_schema),
+]
+
+
+class PostgresStorage(Storage):
+    backend = "postgres"
+
+    def __init__(self, dsn: str, minconn: int = 1, maxconn: int = 10):
+        if not dsn:
+            raise ValueError("STORAGE_BACKEND=postgres, но DATABASE_URL не задан")
+        self._dsn = dsn
+        self._minconn = minconn
+        self._maxconn = maxconn
+        self._pool: psycopg2.pool.ThreadedConnectionPool | None = None
+        self._lock = threading.Lock()
+        # getconn() на пустом пуле сразу бросает PoolError — очередь держим сами
+        self._slots = threading.BoundedSemaphore(maxconn)
+
+    @classmethod
+    def from_env(cls) -> "PostgresStorage":
+        maxconn = int(os.getenv("PG_POOL_MAX", "10"))
+        if maxconn < db.READER_THREADS + 5:
+            logger.warning("storage: PG_POOL_MAX=%d меньше DB_READER_THREADS + 5 = %d, "
+                           "сессии будут ждать соединений", maxconn, db.READER_THREADS + 5)
+        return cls(os.getenv("DATABASE_URL"), int(os.getenv("PG_POOL_MIN", "1")), maxconn)
+
+    def _get_pool(self) -> psycopg2.pool.ThreadedConnectionPool:
+        # подключаемся при первом запросе, а не при импорте
+        with self._lock:
+            if self._pool is None:
+                self._pool = psycopg2.pool.ThreadedConnectionPool(
+                    self._minconn, self._maxconn, self._dsn
+                )
+                logger.info("storage: пул PostgreSQL (%d–%d соединений)",
+                            self._minconn, self._maxconn)
+            return self._pool
+
+    @contextmanager
+    def _connection(self):
+        pool = self._get_pool()
+        if not self._slots.acquire(timeout=POOL_TIMEOUT):
+            raise psycopg2.pool.PoolError(
+                f"нет свободного соединения за {POOL_TIMEOUT:g} с (PG_POOL_MAX={self._maxconn})"
+            )
+        try:
+            conn = pool.getconn()
+            try:
+                yield conn
+            finally:
+                # в пул соединение возвращается без открытой транзакции;
+                # разорванное (рестарт сервера) — закрывается
+                if not conn.closed and (
+                    conn.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE
+                ):
+                    try:
+                        conn.rollback()
+                    except psycopg2.Error:
+                        pass
+                pool.putconn(conn, close=bool(conn.closed))
+        finally:
+            self._slots.release()
+
+    @contextmanager
+    def transaction(self):
+        with self._connection() as conn:
+            try:
+                yield PostgresSession(conn)
+            except BaseException:
+                if not conn.closed:
+                    conn.rollback()
+                raise
+            conn.commit()
+
+    @contextmanager
+    def session(self):
+        with self._connection() as conn:
+            yield PostgresSession(conn)
+
+    def migrate(self) -> int:
+        with self._connection() as conn:
+            cur = conn.cursor()
+            # экземпляры бота стартуют одновременно — миграции по одному
+            cur.execute("SELECT pg_advisory_lock(%s)", (MIGRATION_LOCK_KEY,))
+            try:
+                cur.execute("CREATE TABLE IF NOT EXISTS schema_version (version INTEGER NOT NULL)")
+                cur.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version")
+                version = cur.fetchone()[0]
+                conn.commit()
+                for number, apply in PG_MIGRATIONS:
+                    if number <= version:
+                        continue
+                    try:
+                        apply(cur)
+                        cur.execute("INSERT INTO schema_version (version) VALUES (%s)", (number,))
+                    except BaseException:
+                        conn.rollback()
+                        raise
+                    conn.commit()
+                    logger.info("storage: схема PostgreSQL обновлена до версии %d (%s)",
+                                number, apply.__name__)
+                    version = number
+            finally:
+                cur.execute("SELECT pg_advisory_unlock(%s)", (MIGRATION_LOCK_KEY,))
+                conn.commit()
+        return version
+
+    def close(self):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.closeall()
+                self._pool = None
@@ -0,0 +1,66 @@
+# utils/startup.py
+
+"""
+Замер холодного старта бота.
+
+bot.py отмечает этапы (mark): импорт модулей, готовность БД, post_init,
+первый ответ на getUpdates. Время считается от момента запуска
+интерпретатора (STARTED ставится в самом начале bot.py). Итог пишется
+в лог одной строкой и, если задана переменная STARTUP_METRICS_FILE,
+дописывается туда JSON-строкой — так запуски можно сравнивать между собой.
+"""
+
+import os
+import json
+import time
+import logging
+from datetime import datetime
+
+from telegram.request import HTTPXRequest
+
+logger = logging.getLogger(__name__)
+
+METRICS_FILE = os.getenv("STARTUP_METRICS_FILE")
+
+
+class StartupTimer:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.marks: dict[str, float] = {}
+
+    def reset(self, started: float):
+        """Точка отсчёта — perf_counter() из самого начала bot.py."""
+        self.started = started
+
+    def mark(self, name: str) -> float:
+        """Запоминает этап (только первый раз) и возвращает секунды от старта."""
+        if name not in self.marks:
+            self.marks[name] = time.perf_counter() - self.started
+        return self.marks[name]
+
+    def report(self):
+        line = ", ".join(f"{name} {sec:.3f} с" for name, sec in self.marks.items())
+        logger.info("startup: %s", line)
+        if METRICS_FILE:
+            record = {"at": datetime.now().isoformat(timespec="seconds"), **{
+                name: round(sec, 4) for name, sec in self.marks.items()
+            }}
+            with open(METRICS_FILE, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record) + "\n")
+
+
+timer = StartupTimer()
+
+
+class FirstUpdatesRequest(HTTPXRequest):
+    """
+    Запрос для getUpdates, который отмечает момент первого ответа
+    Telegram — бот с этого момента реально получает обновления.
+    """
+
+    async def do_request(self, *args, **kwargs):
+        result = await super().do_request(*args, **kwargs)
+        if "first_get_updates" not in timer.marks:
+            timer.mark("first_get_updates")
+            timer.report()
+        return result
@@ -0,0 +1,390 @@
+# utils/storage.py
+
+"""
+Хранилище данных бота за одним интерфейсом: сотрудники, поездки, планы,
+настройки (config) и очередь outbox.
+
+Бэкенд выбирается переменной STORAGE_BACKEND:
+- "sqlite" (по умолчанию) — файл DB_PATH, соединения и поток-писатель
+  из utils/db.py, схема — utils/migrations.py;
+- "postgres" — общая БД по DATABASE_URL с пулом соединений
+  (utils/pg_storage.py), когда экземпляров бота больше одного.
+
+Вся работа идёт через сессию:
+
+    with storage.transaction() as s:   # пишущая транзакция, коммит на выходе
+        ...
+    with storage.session() as s:       # чтение; commit/rollback — вручную
+        ...
+
+Сессия только читает и пишет строки; правила (рабочее время, полезная
+нагрузка outbox) остаются в вызывающем коде. Поэтому изменение поездки
+и постановка записи в outbox, как и раньше, идут одной транзакцией.
+
+Запросы Session написаны один раз, с плейсхолдерами «?», и годятся для
+обоих бэкендов; подкласс переопределяет только различия диалекта.
+
+Локальная SQLite нужна и в режиме postgres: в ней зеркало листа
+«Поездки» (core/sheet_mirror.py) — кэш конкретного экземпляра.
+"""
+
+import os
+import json
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from datetime import date, datetime, time, timedelta
+
+from dotenv import load_dotenv
+
+from utils import db
+from utils.migrations import migrate
+
+load_dotenv()
+
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "sqlite").lower()
+
+# Горячие запросы по trips. Отдельными константами, чтобы
+# scripts/check_indexes.py проверял планы именно этих запросов.
+OPEN_TRIP_SQL = (
+    "SELECT id, organization_name, start_datetime "
+    "FROM trips WHERE user_id = ? AND status = 'in_progress'"
+)
+OPEN_TRIPS_SQL = (
+    "SELECT t.id, t.organization_name, t.start_datetime, e.full_name "
+    "FROM trips t LEFT JOIN employees e ON e.user_id = t.user_id "
+    "WHERE t.status = 'in_progress'"
+)
+LAST_COMPLETED_SQL = (
+    "SELECT organization_name, start_datetime FROM trips "
+    "WHERE user_id = ? AND status = 'completed' "
+    "ORDER BY start_datetime DESC LIMIT 1"
+)
+
+
+def trips_between_query(start: date | None, end: date | None) -> tuple[str, list]:
+    """Запрос отчёта за период [start, end] включительно: (SQL, параметры)."""
+    sql = (
+        "SELECT e.full_name, t.organization_name, t.start_datetime, t.end_datetime "
+        "FROM trips t JOIN employees e ON e.user_id = t.user_id"
+    )
+    where, params = [], []
+    if start:
+        where.append("t.start_datetime >= ?")
+        params.append(datetime.combine(start, time.min))
+    if end:
+        where.append("t.start_datetime < ?")
+        params.append(datetime.combine(end + timedelta(days=1), time.min))
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    return sql + " ORDER BY t.start_datetime", params
+
+
+class Session:
+    """Операции над данными бота поверх одного соединения DB-API."""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    # --- диалект --------------------------------------------------------------
+
+    def _execute(self, sql: str, params=()):
+        return self.conn.execute(sql, params)
+
+    def _executemany(self, sql: str, seq_of_params):
+        return self.conn.executemany(sql, seq_of_params)
+
+    def _stream(self, sql: str, params=()):
+        """Курсор для чтения большого результата пачками."""
+        return self._execute(sql, params)
+
+    def _insert(self, sql: str, params) -> int | None:
+        """INSERT одной строки → её id (None, если строка не вставлена)."""
+        cur = self._execute(sql, params)
+        return cur.lastrowid if cur.rowcount else None
+
+    def _lock(self, table: str) -> str:
+        """Блокировка выбранных строк до конца транзакции (SQLite и так пишет по одному)."""
+        return ""
+
+    def commit(self):
+        self.conn.commit()
+
+    def rollback(self):
+        self.conn.rollback()
+
+    @contextmanager
+    def outbox_lock(self):
+        """True — эта сессия может разбирать outbox (в SQLite — всегда)."""
+        yield True
+
+    # --- config ---------------------------------------------------------------
+
+    def get_config(self, key: str) -> str | None:
+        row = self._execute("SELECT value FROM config WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def set_config(self, key: str, value: str):
+        self._execute(
+            "INSERT INTO config (key, value) VALUES (?, ?) "
+            "ON CONFLICT (key) DO UPDATE SET value = excluded.value",
+            (key, value)
+        )
+
+    def data_version(self) -> tuple[int, int]:
+        """Счётчики изменений (trips, employees), которые ведут триггеры."""
+        rows = dict(self._execute(
+            "SELECT key, value FROM config WHERE key IN ('TRIPS_VERSION', 'EMPLOYEES_VERSION')"
+        ).fetchall())
+        return int(rows.get("TRIPS_VERSION", 0)), int(rows.get("EMPLOYEES_VERSION", 0))
+
+    # --- сотрудники -----------------------------------------------------------
+
+    def add_employee(self, user_id: int, full_name: str) -> bool:
+        """False — такой user_id уже зарегистрирован."""
+        cur = self._execute(
+            "INSERT INTO employees (user_id, full_name) VALUES (?, ?) "
+            "ON CONFLICT (user_id) DO NOTHING",
+            (user_id, full_name)
+        )
+        return cur.rowcount > 0
+
+    def employee_names(self) -> dict[int, str]:
+        return dict(self._execute("SELECT user_id, full_name FROM employees").fetchall())
+
+    def employees_by_name(self) -> list[tuple[str, int]]:
+        return self._execute(
+            "SELECT full_name, user_id FROM employees ORDER BY full_name"
+        ).fetchall()
+
+    def employees_version(self) -> int:
+        return self.data_version()[1]
+
+    # --- поездки --------------------------------------------------------------
+
+    def open_trip(self, user_id: int) -> tuple[int, str, datetime] | None:
+        """Открытая поездка пользователя: (id, organization_name, start_datetime)."""
+        return self._execute(OPEN_TRIP_SQL + self._lock("trips"), (user_id,)).fetchone()
+
+    def insert_trip(self, user_id: int, org_id: str, org_name: str, start: datetime) -> int | None:
+        """Новая открытая поездка; None — у пользователя уже есть открытая."""
+        return self._insert(
+            "INSERT INTO trips "
+            "(user_id, organization_id, organization_name, start_datetime, status) "
+            "VALUES (?, ?, ?, ?, 'in_progress')",
+            (user_id, org_id, org_name, start)
+        )
+
+    def complete_trip(self, trip_id: int, end: datetime) -> bool:
+        cur = self._execute(
+            "UPDATE trips SET end_datetime = ?, status = 'completed' "
+            "WHERE id = ? AND status = 'in_progress'",
+            (end, trip_id)
+        )
+        return cur.rowcount > 0
+
+    def complete_open_trip(self, user_id: int, end: datetime) -> bool:
+        cur = self._execute(
+            "UPDATE trips SET end_datetime = ?, status = 'completed' "
+            "WHERE user_id = ? AND status = 'in_progress'",
+            (end, user_id)
+        )
+        return cur.rowcount > 0
+
+    def open_trips(self) -> list[tuple[int, str, datetime, str | None]]:
+        """Все открытые поездки с ФИО: (id, organization_name, start_datetime, full_name)."""
+        return self._execute(OPEN_TRIPS_SQL + self._lock("t")).fetchall()
+
+    def complete_trips(self, updates: list[tuple[datetime, int]]):
+        """Закрывает поездки пачкой: [(end_datetime, id), …]."""
+        self._executemany(
+            "UPDATE trips SET end_datetime = ?, status = 'completed' WHERE id = ?",
+            updates
+        )
+
+    def last_completed(self, user_id: int) -> tuple[str, datetime] | None:
+        return self._execute(LAST_COMPLETED_SQL, (user_id,)).fetchone()
+
+    def trips_between(self, start: date | None, end: date | None, chunk_size: int):
+        """
+        Поездки с ФИО пачками: (full_name, organization_name, start_datetime,
+        end_datetime), период [start, end] включительно — по индексу
+        idx_trips_start.
+        """
+        sql, params = trips_between_query(start, end)
+        yield from db.iter_chunks(self._stream(sql, params), chunk_size)
+
+    def status_counts(self) -> tuple[int, int]:
+        """(открытых поездок, записей outbox в очереди)."""
+        return tuple(self._execute(
+            "SELECT (SELECT COUNT(*) FROM trips WHERE status = 'in_progress'), "
+            "(SELECT COUNT(*) FROM sheets_outbox WHERE failed = 0)"
+        ).fetchone())
+
+    def set_sheet_rows(self, rows: list[tuple[int, int]]):
+        """Номера строк листа «Поездки»: [(sheet_row, trip_id), …]."""
+        self._executemany("UPDATE trips SET sheet_row = ? WHERE id = ?", rows)
+
+    def sheet_rows(self, trip_ids: list[int]) -> dict[int, int | None]:
+        if not trip_ids:
+            return {}
+        return dict(self._execute(
+            f"SELECT id, sheet_row FROM trips WHERE id IN ({_marks(trip_ids)})", trip_ids
+        ).fetchall())
+
+    # --- планы ----------------------------------------------------------------
+
+    def insert_plan(self, user_id: int, plan_date: str, full_name: str,
+                    org_name: str, plan_time: str) -> int:
+        return self._insert(
+            "INSERT INTO plans (user_id, plan_date, full_name, org_name, plan_time) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (user_id, plan_date, full_name, org_name, plan_time)
+        )
+
+    def import_plans(self, rows: list[tuple[str, str, str, str]]):
+        """Планы, уже стоящие в листе: [(plan_date, full_name, org_name, plan_time), …]."""
+        self._executemany(
+            "INSERT INTO plans (plan_date, full_name, org_name, plan_time, in_sheet) "
+            "VALUES (?, ?, ?, ?, 1)",
+            rows
+        )
+
+    def sheet_plan_keys(self) -> list[tuple[str, int]]:
+        """Ключи (plan_date, id) выведенных в лист планов, в порядке листа."""
+        return [tuple(r) for r in self._execute(
+            "SELECT plan_date, id FROM plans WHERE in_sheet = 1 ORDER BY plan_date, id"
+        )]
+
+    def new_plan_keys(self, plan_ids: list[int]) -> list[tuple[str, int]]:
+        """Ключи тех из plan_ids, что ещё не в листе."""
+        if not plan_ids:
+            return []
+        return [tuple(r) for r in self._execute(
+            f"SELECT plan_date, id FROM plans WHERE id IN ({_marks(plan_ids)}) AND in_sheet = 0",
+            plan_ids
+        )]
+
+    def plan_rows(self, plan_ids: list[int]) -> list[tuple]:
+        """Строки листа для планов: (id, plan_date, full_name, org_name, plan_time)."""
+        if not plan_ids:
+            return []
+        return self._execute(
+            "SELECT id, plan_date, full_name, org_name, plan_time FROM plans "
+            f"WHERE id IN ({_marks(plan_ids)})",
+            plan_ids
+        ).fetchall()
+
+    def mark_plans_in_sheet(self, plan_ids: list[int]):
+        if not plan_ids:
+            return
+        self._execute(f"UPDATE plans SET in_sheet = 1 WHERE id IN ({_marks(plan_ids)})", plan_ids)
+
+    def calendar_rows(self) -> list[tuple[str, str, str, str]]:
+        return self._execute(
+            "SELECT plan_date, full_name, org_name, plan_time FROM plans ORDER BY plan_date, id"
+        ).fetchall()
+
+    # --- outbox ---------------------------------------------------------------
+
+    def enqueue(self, op: str, payload: dict):
+        """Операция для Google Sheets в очередь — в транзакции вызывающего кода."""
+        self._execute(
+            "INSERT INTO sheets_outbox (op, payload) VALUES (?, ?)",
+            (op, json.dumps(payload, ensure_ascii=False))
+        )
+
+    def enqueue_many(self, op: str, payloads: list[dict]):
+        self._executemany(
+            "INSERT INTO sheets_outbox (op, payload) VALUES (?, ?)",
+            [(op, json.dumps(p, ensure_ascii=False)) for p in payloads]
+        )
+
+    def outbox_batch(self, limit: int) -> list[tuple]:
+        """Голова очереди: (id, op, payload, attempts, next_attempt_at)."""
+        return self._execute(
+            "SELECT id, op, payload, attempts, next_attempt_at "
+            "FROM sheets_outbox WHERE failed = 0 ORDER BY id LIMIT ?",
+            (limit,)
+        ).fetchall()
+
+    def outbox_delete(self, ids: list[int]):
+        if not ids:
+            return
+        self._execute(f"DELETE FROM sheets_outbox WHERE id IN ({_marks(ids)})", ids)
+
+    def outbox_attempt(self, ids: list[int]):
+        """Отметка «доставка начата»: attempts + 1 до запроса к API."""
+        if not ids:
+            return
+        self._execute(
+            f"UPDATE sheets_outbox SET attempts = attempts + 1 WHERE id IN ({_marks(ids)})", ids
+        )
+
+    def outbox_retry(self, rows: list[tuple[int, float, str, int, int]]):
+        """Неудачная доставка: [(attempts, next_attempt_at, last_error, failed, id), …]."""
+        self._executemany(
+            "UPDATE sheets_outbox "
+            "SET attempts = ?, next_attempt_at = ?, last_error = ?, failed = ? "
+            "WHERE id = ?",
+            rows
+        )
+
+
+def _marks(ids: list) -> str:
+    # пустой IN () понимает только SQLite — методы выше до него не доходят
+    return ",".join("?" * len(ids))
+
+
+class Storage(ABC):
+    """Бэкенд хранилища; без любого из абстрактных методов не создаётся."""
+
+    backend = ""
+
+    @abstractmethod
+    def transaction(self):
+        """Контекстный менеджер: Session в пишущей транзакции."""
+
+    @abstractmethod
+    def session(self):
+        """Контекстный менеджер: Session для чтения (и ручного commit)."""
+
+    @abstractmethod
+    def migrate(self) -> int:
+        """Создаёт/обновляет схему. Возвращает её версию."""
+
+    def close(self):
+        pass
+
+
+class SqliteStorage(Storage):
+    """SQLite: соединение текущего потока из utils/db.py."""
+
+    backend = "sqlite"
+
+    @contextmanager
+    def transaction(self):
+        with db.transaction() as conn:
+            yield Session(conn)
+
+    @contextmanager
+    def session(self):
+        yield Session(db.get_connection())
+
+    def migrate(self) -> int:
+        return migrate(db.get_connection())
+
+    def close(self):
+        db.close_connection()
+
+
+def create_storage(backend: str = STORAGE_BACKEND) -> Storage:
+    if backend == "sqlite":
+        return SqliteStorage()
+    if backend in ("postgres", "postgresql"):
+        # psycopg2 нужен только в этом режиме
+        from utils.pg_storage import PostgresStorage
+        return PostgresStorage.from_env()
+    raise ValueError(f"Неизвестный STORAGE_BACKEND: {backend!r} (sqlite или postgres)")
+
+
+storage = create_storage()
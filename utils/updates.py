@@ -0,0 +1,78 @@
+# utils/updates.py
+
+"""
+Параллельная обработка обновлений с порядком внутри одного пользователя.
+
+По умолчанию PTB разбирает обновления строго по одному: пока один
+сотрудник ждёт ответа на «🏦 Возврат», кнопки остальных стоят в очереди.
+PerUserUpdateProcessor (ApplicationBuilder.concurrent_updates, см. bot.py)
+пускает одновременно до MAX_CONCURRENT_UPDATES обновлений, но обновления
+одного пользователя идут по очереди, в порядке прихода: флаги в
+context.user_data (awaiting_custom_org, awaiting_plan_datetime, …) не
+читаются и не пишутся двумя хендлерами сразу.
+
+Замок — asyncio.Lock на user_id (у обновлений без пользователя — на чат).
+Задачи на обновления PTB создаёт в порядке получения, а asyncio.Lock
+отдаёт захват в порядке очереди, поэтому порядок сохраняется. Замок
+удаляется, как только у пользователя не остаётся обновлений в работе.
+"""
+
+import os
+import asyncio
+from typing import Any, Awaitable
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+from utils.metrics import UPDATES_IN_PROGRESS
+
+MAX_CONCURRENT_UPDATES = int(os.getenv("MAX_CONCURRENT_UPDATES", "64"))
+
+
+def serial_key(update: object) -> int | None:
+    """Ключ очереди: user_id, иначе id чата; None — обновление ни с кем не связано."""
+    if not isinstance(update, Update):
+        return None
+    if update.effective_user is not None:
+        return update.effective_user.id
+    if update.effective_chat is not None:
+        return update.effective_chat.id
+    return None
+
+
+class PerUserUpdateProcessor(BaseUpdateProcessor):
+    def __init__(self, max_concurrent_updates: int = MAX_CONCURRENT_UPDATES):
+        super().__init__(max_concurrent_updates)
+        self._locks: dict[int, asyncio.Lock] = {}
+        self._pending: dict[int, int] = {}  # обновлений в работе и в ожидании по ключу
+        self._running = 0
+
+    async def do_process_update(self, update: object, coroutine: Awaitable[Any]) -> None:
+        # слот семафора PTB уже занят: обновление, ждущее замка своего
+        # пользователя, держит его — поэтому лимит с запасом (64)
+        key = serial_key(update)
+        self._running += 1
+        UPDATES_IN_PROGRESS.set(self._running)
+        try:
+            if key is None:
+                await coroutine
+                return
+            lock = self._locks.setdefault(key, asyncio.Lock())
+            self._pending[key] = self._pending.get(key, 0) + 1
+            try:
+                async with lock:
+                    await coroutine
+            finally:
+                self._pending[key] -= 1
+                if not self._pending[key]:
+                    del self._pending[key]
+                    del self._locks[key]
+        finally:
+            self._running -= 1
+            UPDATES_IN_PROGRESS.set(self._running)
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
@@ -0,0 +1,178 @@
+# webserver.py
+
+"""
+HTTP-сервер бота на том же asyncio-loop, что и сам бот, — без Flask
+и отдельного потока.
+
+Отвечает на пинги UptimeRobot (/, /ping, /health) и отдаёт метрики
+Prometheus (/metrics) в любом режиме, а в режиме webhook ещё и принимает
+обновления Telegram (POST на WEBHOOK_PATH) и кладёт их в update_queue
+приложения. Сервер минимальный — HTTP/1.1
+без keep-alive, на asyncio.start_server, — зато без лишних зависимостей
+и потоков. Новые маршруты добавляются через WebServer.route.
+"""
+
+import asyncio
+import json
+import logging
+from collections.abc import Awaitable, Callable
+from http import HTTPStatus
+
+from telegram import Update
+from telegram.ext import Application
+
+from utils.database import get_status_counts
+from utils.db import run_read
+from utils.metrics import OPEN_TRIPS, OUTBOX_PENDING, render as render_metrics
+
+logger = logging.getLogger(__name__)
+
+MAX_BODY      = 1024 * 1024   # байт; обновления Telegram намного меньше
+READ_TIMEOUT  = 10            # сек. на чтение запроса
+
+# обработчик маршрута: (метод, заголовки, тело) → (статус, тело, content-type)
+Handler = Callable[[str, dict, bytes], Awaitable[tuple[int, bytes | str, str]]]
+
+
+class WebServer:
+    def __init__(self, host: str, port: int):
+        self.host = host
+        self.port = port
+        self._routes: dict[str, tuple[set[str], Handler]] = {}
+        self._server: asyncio.AbstractServer | None = None
+
+    def route(self, path: str, handler: Handler, methods=("GET", "HEAD")):
+        self._routes[path] = (set(methods), handler)
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._serve, self.host, self.port)
+        logger.info("webserver: слушаем %s:%d", self.host, self.port)
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def _read_request(self, reader: asyncio.StreamReader):
+        request_line = (await reader.readline()).decode("latin-1").strip()
+        method, target, _ = request_line.split(" ", 2)
+        headers = {}
+        while True:
+            line = (await reader.readline()).decode("latin-1").strip()
+            if not line:
+                break
+            name, _, value = line.partition(":")
+            headers[name.strip().lower()] = value.strip()
+        length = int(headers.get("content-length", 0) or 0)
+        if length > MAX_BODY:
+            raise ValueError("тело запроса слишком большое")
+        body = await reader.readexactly(length) if length else b""
+        return method.upper(), target.split("?", 1)[0], headers, body
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            try:
+                method, path, headers, body = await asyncio.wait_for(
+                    self._read_request(reader), READ_TIMEOUT
+                )
+            except (ValueError, asyncio.IncompleteReadError, asyncio.TimeoutError):
+                status, payload, ctype = 400, b"Bad Request", "text/plain"
+            else:
+                status, payload, ctype = await self._dispatch(method, path, headers, body)
+                if method == "HEAD":
+                    payload = b""
+            if isinstance(payload, str):
+                payload = payload.encode("utf-8")
+            writer.write(
+                f"HTTP/1.1 {status} {HTTPStatus(status).phrase}\r\n"
+                f"Content-Type: {ctype}\r\n"
+                f"Content-Length: {len(payload)}\r\n"
+                "Connection: close\r\n\r\n".encode("latin-1") + payload
+            )
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def _dispatch(self, method: str, path: str, headers: dict, body: bytes):
+        found = self._routes.get(path)
+        if found is None:
+            return 404, "Not Found", "text/plain"
+        methods, handler = found
+        if method not in methods:
+            return 405, "Method Not Allowed", "text/plain"
+        try:
+            return await handler(method, headers, body)
+        except Exception:
+            logger.exception("webserver: ошибка обработки %s %s", method, path)
+            return 500, "Internal Server Error", "text/plain"
+
+
+# --- маршруты бота ------------------------------------------------------------
+
+async def home(method: str, headers: dict, body: bytes):
+    # пинги UptimeRobot идут постоянно — только на уровне DEBUG
+    logger.debug("webserver: %s / — бот активен", method)
+    return 200, "Бот активен", "text/plain; charset=utf-8"
+
+
+async def ping(method: str, headers: dict, body: bytes):
+    logger.debug("webserver: GET /ping")
+    return 200, "Pong", "text/plain"
+
+
+def health_handler(checks: Callable[[], dict[str, bool]] | None) -> Handler:
+    """
+    /health: 200, только если все проверки checks() истинны (получение
+    обновлений, планировщик, …), иначе 503 — UptimeRobot увидит, что бот
+    завис, даже когда сам процесс жив. Тело — состояние каждой проверки.
+    """
+    async def handle(method: str, headers: dict, body: bytes):
+        state = checks() if checks else {}
+        ok = all(state.values())
+        text = "\n".join(f"{name}: {'ok' if alive else 'down'}" for name, alive in state.items())
+        if not ok:
+            logger.warning("health: %s", ", ".join(n for n, alive in state.items() if not alive))
+        return (200 if ok else 503), text or "ok", "text/plain"
+    return handle
+
+
+async def metrics(method: str, headers: dict, body: bytes):
+    """Метрики Prometheus (utils/metrics.py); gauge по БД считаются в момент запроса."""
+    open_trips, pending = await run_read(get_status_counts)
+    OPEN_TRIPS.set(open_trips)
+    OUTBOX_PENDING.set(pending)
+    return 200, render_metrics(), "text/plain; version=0.0.4; charset=utf-8"
+
+
+def webhook_handler(app: Application, secret: str | None) -> Handler:
+    """POST от Telegram → Update в очередь приложения."""
+    async def handle(method: str, headers: dict, body: bytes):
+        if secret and headers.get("x-telegram-bot-api-secret-token") != secret:
+            return 403, "Forbidden", "text/plain"
+        try:
+            payload = json.loads(body)
+            # валидный JSON, но не объект (список, число) — тоже мусор
+            update = Update.de_json(payload, app.bot) if isinstance(payload, dict) else None
+        except (ValueError, TypeError, AttributeError):
+            update = None
+        if update is None:
+            return 400, "Bad Request", "text/plain"
+        await app.update_queue.put(update)
+        return 200, "", "text/plain"
+    return handle
+
+
+def build_server(app: Application, host: str, port: int,
+                 webhook_path: str | None = None, secret: str | None = None,
+                 health_checks: Callable[[], dict[str, bool]] | None = None) -> WebServer:
+    server = WebServer(host, port)
+    server.route("/", home)
+    server.route("/ping", ping, methods=("GET",))
+    server.route("/health", health_handler(health_checks), methods=("GET", "HEAD"))
+    server.route("/metrics", metrics, methods=("GET",))
+    if webhook_path:
+        server.route(webhook_path, webhook_handler(app, secret), methods=("POST",))
+    return server